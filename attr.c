@@ -3,36 +3,150 @@
 #include <stdio.h>
 #include <stdlib.h>
 #include <string.h>
+#include <stdint.h>
 #include <math.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
 
 static float *g_attr = NULL;
 static unsigned char *g_present = NULL;
 static unsigned long g_max_id = 0;
 static unsigned long g_dim = 0;
+static void *g_mapped = NULL;
+static size_t g_mapped_len = 0;
+
+static int g_mode = ATTR_AUTO;
+static int g_sparse = 0;
+static unsigned long long *g_sp_ptr = NULL;
+static unsigned *g_sp_idx = NULL;
+static float *g_sp_val = NULL;
 
 static int parse_line_dim(const char *line, unsigned long *id, unsigned long *dim_out) {
-  char *tmp = strdup(line);
-  if (tmp == NULL) {
-    return 0;
+  const char *c = line;
+  char *end;
+  while (*c == ' ' || *c == '\t') {
+    c++;
   }
-  char *save = NULL;
-  char *tok = strtok_r(tmp, " \t\n\r", &save);
-  if (tok == NULL) {
-    free(tmp);
+  *id = strtoul(c, &end, 10);
+  if (end == c) {
     return 0;
   }
-  *id = strtoul(tok, NULL, 10);
+  c = end;
 
   unsigned long d = 0;
-  while ((tok = strtok_r(NULL, " \t\n\r", &save)) != NULL) {
+  while (*c != '\0') {
+    while (*c == ' ' || *c == '\t' || *c == '\n' || *c == '\r') {
+      c++;
+    }
+    if (*c == '\0') {
+      break;
+    }
     d++;
+    while (*c != '\0' && *c != ' ' && *c != '\t' && *c != '\n' && *c != '\r') {
+      c++;
+    }
   }
   *dim_out = d;
-  free(tmp);
   return (d > 0);
 }
 
-int load_attributes(const char *path) {
+static size_t bitmap_bytes(unsigned long rows) {
+  return (((rows + 7) / 8) + 7) & ~(size_t)7;
+}
+
+int is_attr_binary(const char *path) {
+  char magic[4];
+  FILE *f = fopen(path, "rb");
+  if (f == NULL) {
+    return 0;
+  }
+  int ok = (fread(magic, 1, 4, f) == 4 && memcmp(magic, ATTR_MAGIC, 4) == 0);
+  fclose(f);
+  return ok;
+}
+
+static int mmap_attributes(const char *path) {
+  int fd = open(path, O_RDONLY);
+  struct stat st;
+  if (fd < 0 || fstat(fd, &st) != 0 || (size_t)st.st_size < ATTR_HEADER_SIZE) {
+    if (fd >= 0) {
+      close(fd);
+    }
+    return 0;
+  }
+  void *base = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, fd, 0);
+  close(fd);
+  if (base == MAP_FAILED) {
+    return 0;
+  }
+
+  const unsigned char *hdr = base;
+  uint32_t version;
+  uint64_t rows, dim;
+  memcpy(&version, hdr + 4, 4);
+  memcpy(&rows, hdr + 8, 8);
+  memcpy(&dim, hdr + 16, 8);
+  size_t need = ATTR_HEADER_SIZE + bitmap_bytes(rows) + rows * dim * sizeof(float);
+  if (version != ATTR_VERSION || rows == 0 || dim == 0 || need > (size_t)st.st_size) {
+    fprintf(stderr, "invalid binary attribute file %s\n", path);
+    munmap(base, st.st_size);
+    return 0;
+  }
+
+  g_mapped = base;
+  g_mapped_len = st.st_size;
+  g_max_id = rows - 1;
+  g_dim = dim;
+  g_present = (unsigned char *)hdr + ATTR_HEADER_SIZE;
+  g_attr = (float *)(g_present + bitmap_bytes(rows));
+  return 1;
+}
+
+int write_attributes_binary(const char *path) {
+  unsigned char hdr[ATTR_HEADER_SIZE];
+  uint32_t version = ATTR_VERSION;
+  uint64_t rows = g_max_id + 1, dim = g_dim, reserved = 0;
+  FILE *f;
+  if (g_dim == 0 || (f = fopen(path, "wb")) == NULL) {
+    return 0;
+  }
+  memset(hdr, 0, sizeof(hdr));
+  memcpy(hdr, ATTR_MAGIC, 4);
+  memcpy(hdr + 4, &version, 4);
+  memcpy(hdr + 8, &rows, 8);
+  memcpy(hdr + 16, &dim, 8);
+  memcpy(hdr + 24, &reserved, 8);
+
+  int ok = (fwrite(hdr, 1, ATTR_HEADER_SIZE, f) == ATTR_HEADER_SIZE);
+  ok = ok && fwrite(g_present, 1, bitmap_bytes(rows), f) == bitmap_bytes(rows);
+  ok = ok && fwrite(g_attr, sizeof(float), rows * dim, f) == rows * dim;
+  ok = (fclose(f) == 0) && ok;
+  return ok;
+}
+
+int write_attributes_text(const char *path) {
+  unsigned long id, j;
+  FILE *f = fopen(path, "w");
+  if (f == NULL) {
+    return 0;
+  }
+  for (id = 0; id <= g_max_id && g_dim > 0; id++) {
+    const float *x = get_node_attributes(id);
+    if (x == NULL) {
+      continue;
+    }
+    fprintf(f, "%lu", id);
+    for (j = 0; j < g_dim; j++) {
+      fprintf(f, " %.9g", x[j]);
+    }
+    fprintf(f, "\n");
+  }
+  return fclose(f) == 0;
+}
+
+static int load_attributes_text(const char *path) {
   FILE *f = fopen(path, "r");
   if (f == NULL) {
     return 0;
@@ -79,7 +193,7 @@ int load_attributes(const char *path) {
   g_dim = dim;
   g_max_id = max_id;
   g_attr = calloc((g_max_id + 1) * g_dim, sizeof(float));
-  g_present = calloc(g_max_id + 1, sizeof(unsigned char));
+  g_present = calloc(bitmap_bytes(g_max_id + 1), sizeof(unsigned char));
   if (g_attr == NULL || g_present == NULL) {
     fprintf(stderr, "attribute allocation error\n");
     free(line);
@@ -108,7 +222,7 @@ int load_attributes(const char *path) {
       d++;
     }
     if (d == g_dim) {
-      g_present[id] = 1;
+      g_present[id >> 3] |= (unsigned char)(1u << (id & 7));
     }
   }
 
@@ -117,9 +231,77 @@ int load_attributes(const char *path) {
   return 1;
 }
 
+static void build_sparse(void) {
+  unsigned long id, j, rows = g_max_id + 1, present = 0;
+  unsigned long long nnz = 0;
+
+  for (id = 0; id < rows; id++) {
+    const float *x = get_node_attributes(id);
+    if (x == NULL) {
+      continue;
+    }
+    present++;
+    for (j = 0; j < g_dim; j++) {
+      nnz += (x[j] != 0.0f);
+    }
+  }
+
+  g_sparse = (g_mode == ATTR_SPARSE) ||
+             (g_mode == ATTR_AUTO && present > 0 && nnz <= ATTR_SPARSE_DENSITY * present * g_dim);
+  if (!g_sparse) {
+    return;
+  }
+
+  g_sp_ptr = malloc((rows + 1) * sizeof(unsigned long long));
+  g_sp_idx = malloc((nnz > 0 ? nnz : 1) * sizeof(unsigned));
+  g_sp_val = malloc((nnz > 0 ? nnz : 1) * sizeof(float));
+  g_sp_ptr[0] = 0;
+  nnz = 0;
+  for (id = 0; id < rows; id++) {
+    const float *x = get_node_attributes(id);
+    for (j = 0; x != NULL && j < g_dim; j++) {
+      if (x[j] != 0.0f) {
+        g_sp_idx[nnz] = (unsigned)j;
+        g_sp_val[nnz] = x[j];
+        nnz++;
+      }
+    }
+    g_sp_ptr[id + 1] = nnz;
+  }
+}
+
+void set_attr_mode(int mode) {
+  g_mode = mode;
+}
+
+int attr_is_sparse(void) {
+  return g_sparse;
+}
+
+int load_attributes(const char *path) {
+  int ok = is_attr_binary(path) ? mmap_attributes(path) : load_attributes_text(path);
+  if (ok) {
+    build_sparse();
+  }
+  return ok;
+}
+
 void free_attributes(void) {
-  free(g_attr);
-  free(g_present);
+  free(g_sp_ptr);
+  free(g_sp_idx);
+  free(g_sp_val);
+  g_sp_ptr = NULL;
+  g_sp_idx = NULL;
+  g_sp_val = NULL;
+  g_sparse = 0;
+  if (g_mapped != NULL) {
+    munmap(g_mapped, g_mapped_len);
+    g_mapped = NULL;
+    g_mapped_len = 0;
+  } else {
+    free(g_attr);
+    free(g_present);
+  }
   g_attr = NULL;
   g_present = NULL;
   g_max_id = 0;
@@ -130,55 +312,83 @@ unsigned long attr_dim(void) {
   return g_dim;
 }
 
+unsigned long attr_rows(void) {
+  return (g_dim == 0) ? 0 : g_max_id + 1;
+}
+
 const float *get_node_attributes(unsigned long original_node_id) {
-  if (g_dim == 0 || original_node_id > g_max_id || g_present[original_node_id] == 0) {
+  if (g_dim == 0 || original_node_id > g_max_id || (g_present[original_node_id >> 3] & (1u << (original_node_id & 7))) == 0) {
     return NULL;
   }
   return g_attr + original_node_id * g_dim;
 }
 
-long double attr_cosine_node_to_comm(adjlist *g, unsigned long node, const long double *comm_vec, unsigned long comm_size) {
-  if (g_dim == 0 || comm_size == 0) {
-    return 0.0L;
+unsigned long get_node_attributes_sparse(unsigned long original_node_id, const unsigned **idx, const float **val) {
+  if (!g_sparse || original_node_id > g_max_id) {
+    return 0;
+  }
+  unsigned long long b = g_sp_ptr[original_node_id];
+  *idx = g_sp_idx + b;
+  *val = g_sp_val + b;
+  return (unsigned long)(g_sp_ptr[original_node_id + 1] - b);
+}
+
+weight_t attr_dot_node_to_comm_sum(adjlist *g, unsigned long node, const attrsum_t *comm_vec) {
+  if (g_dim == 0) {
+    return 0.0;
   }
   unsigned long oid = (g->map == NULL) ? node : g->map[node];
+  unsigned long j;
+  weight_t dot = 0.0;
+  if (g_sparse) {
+    const unsigned *idx;
+    const float *val;
+    unsigned long nnz = get_node_attributes_sparse(oid, &idx, &val);
+    for (j = 0; j < nnz; j++) {
+      dot += (weight_t)val[j] * comm_vec[idx[j]];
+    }
+    return dot;
+  }
   const float *x = get_node_attributes(oid);
   if (x == NULL) {
-    return 0.0L;
+    return 0.0;
   }
 
-  long double dot = 0.0L;
-  long double nx = 0.0L;
-  long double nc = 0.0L;
-  unsigned long j;
   for (j = 0; j < g_dim; j++) {
-    long double cj = comm_vec[j] / (long double)comm_size;
-    long double xj = (long double)x[j];
-    dot += xj * cj;
-    nx += xj * xj;
-    nc += cj * cj;
+    dot += (weight_t)x[j] * comm_vec[j];
   }
-
-  if (nx <= 0.0L || nc <= 0.0L) {
-    return 0.0L;
-  }
-  return dot / (sqrtl(nx) * sqrtl(nc));
+  return dot;
 }
 
-long double attr_dot_node_to_comm_sum(adjlist *g, unsigned long node, const long double *comm_vec) {
-  if (g_dim == 0) {
-    return 0.0L;
-  }
+weight_t attr_node_norm2(adjlist *g, unsigned long node) {
   unsigned long oid = (g->map == NULL) ? node : g->map[node];
+  unsigned long j;
+  weight_t nx = 0.0;
+  if (g_sparse) {
+    const unsigned *idx;
+    const float *val;
+    unsigned long nnz = get_node_attributes_sparse(oid, &idx, &val);
+    for (j = 0; j < nnz; j++) {
+      nx += (weight_t)val[j] * val[j];
+    }
+    return nx;
+  }
   const float *x = get_node_attributes(oid);
   if (x == NULL) {
-    return 0.0L;
+    return 0.0;
   }
-
-  long double dot = 0.0L;
-  unsigned long j;
   for (j = 0; j < g_dim; j++) {
-    dot += (long double)x[j] * comm_vec[j];
+    nx += (weight_t)x[j] * x[j];
   }
-  return dot;
+  return nx;
+}
+
+unsigned long attr_node_cost(unsigned long original_node_id) {
+  if (g_sparse) {
+    if (original_node_id > g_max_id) {
+      return 0;
+    }
+    return (unsigned long)(g_sp_ptr[original_node_id + 1] - g_sp_ptr[original_node_id]);
+  }
+  return (get_node_attributes(original_node_id) == NULL) ? 0 : g_dim;
 }
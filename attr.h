@@ -3,11 +3,36 @@
 
 #include "struct.h"
 
+/*
+  Binary attribute file (little-endian):
+    header  (32 bytes) magic "LNEA", uint32 version, uint64 rows (max id + 1),
+                       uint64 dim, uint64 reserved
+    present bitmap of rows bits, padded to a multiple of 8 bytes
+    matrix  rows x dim float32, row-major, indexed by original node id
+*/
+
+#define ATTR_MAGIC "LNEA"
+#define ATTR_VERSION 1
+#define ATTR_HEADER_SIZE 32
+
+#define ATTR_AUTO 0
+#define ATTR_DENSE 1
+#define ATTR_SPARSE 2
+#define ATTR_SPARSE_DENSITY 0.1
+
 int load_attributes(const char *path);
+int is_attr_binary(const char *path);
+int write_attributes_binary(const char *path);
+int write_attributes_text(const char *path);
 void free_attributes(void);
 unsigned long attr_dim(void);
+unsigned long attr_rows(void);
 const float *get_node_attributes(unsigned long original_node_id);
-long double attr_cosine_node_to_comm(adjlist *g, unsigned long node, const long double *comm_vec, unsigned long comm_size);
-long double attr_dot_node_to_comm_sum(adjlist *g, unsigned long node, const long double *comm_vec);
+void set_attr_mode(int mode);
+int attr_is_sparse(void);
+unsigned long get_node_attributes_sparse(unsigned long original_node_id, const unsigned **idx, const float **val);
+weight_t attr_dot_node_to_comm_sum(adjlist *g, unsigned long node, const attrsum_t *comm_vec);
+weight_t attr_node_norm2(adjlist *g, unsigned long node);
+unsigned long attr_node_cost(unsigned long original_node_id);
 
 #endif
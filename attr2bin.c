@@ -0,0 +1,34 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <time.h>
+
+#include "attr.h"
+
+int main(int argc,char** argv){
+  if (argc != 3) {
+    printf("Usage: ./attr2bin attributes.txt attributes.bin\n");
+    printf("       ./attr2bin attributes.bin attributes.txt\n");
+    return 1;
+  }
+
+  time_t t0=time(NULL),t1;
+  int to_text=is_attr_binary(argv[1]);
+
+  printf("Reading attributes from file %s\n",argv[1]);
+  if (!load_attributes(argv[1])) {
+    printf("Could not load attribute file: %s\n", argv[1]);
+    return 1;
+  }
+  printf("Attribute dim: %lu\n", attr_dim());
+
+  printf("Writing %s attributes to file %s\n",to_text?"text":"binary",argv[2]);
+  if (!(to_text ? write_attributes_text(argv[2]) : write_attributes_binary(argv[2]))) {
+    printf("Could not write attribute file: %s\n", argv[2]);
+    return 1;
+  }
+  free_attributes();
+
+  t1=time(NULL);
+  printf("- Overall time = %ldh%ldm%lds\n",(t1-t0)/3600,((t1-t0)%3600)/60,((t1-t0)%60));
+  return 0;
+}
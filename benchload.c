@@ -0,0 +1,47 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <time.h>
+
+#include "graphio.h"
+
+static double now(){
+  struct timespec ts;
+  clock_gettime(CLOCK_MONOTONIC,&ts);
+  return ts.tv_sec+ts.tv_nsec*1e-9;
+}
+
+static void bench(const char *name, adjlist* (*reader)(char*), char *input, unsigned reps){
+  unsigned r;
+  double t,best=-1.0;
+  adjlist *g=NULL;
+  for (r=0;r<reps;r++){
+    t=now();
+    g=reader(input);
+    t=now()-t;
+    if (best<0 || t<best){
+      best=t;
+    }
+    if (r+1<reps){
+      free_adjlist(g);
+    }
+  }
+  printf("%s_time_sec %.6f\n",name,best);
+  printf("%s_edges_per_sec %.1f\n",name,g->e/best);
+  free_adjlist(g);
+}
+
+int main(int argc,char** argv){
+  if (argc < 2 || argc > 3) {
+    printf("Usage: ./benchload edgelist.txt [repetitions=3]\n");
+    return 1;
+  }
+  int reps=(argc==3)?atoi(argv[2]):3;
+  if (reps < 1) {
+    printf("repetitions must be at least 1\n");
+    return 1;
+  }
+
+  bench("two_pass_fscanf",readadjlist2pass,argv[1],(unsigned)reps);
+  bench("single_pass_stream",readadjlist,argv[1],(unsigned)reps);
+  return 0;
+}
@@ -0,0 +1,39 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <time.h>
+
+#include "graphio.h"
+
+int main(int argc,char** argv){
+  adjlist *g,*h;
+
+  if (argc < 3 || argc > 4) {
+    printf("Usage: ./edge2csr edgelist.txt graph.csr [compact=0|1]\n");
+    return 1;
+  }
+
+  time_t t0=time(NULL),t1;
+
+  printf("Reading edgelist from file %s\n",argv[1]);
+  g=readadjlist(argv[1]);
+  if (argc==4 && strcmp(argv[3],"1")==0) {
+    h=compact_graph(g);
+    free_adjlist(g);
+    g=h;
+    printf("Compacted node ids, id map stored in cache\n");
+  }
+  printf("Number of nodes: %lu\n",g->n);
+  printf("Number of edges: %llu\n",g->e);
+
+  printf("Writing binary CSR cache to file %s\n",argv[2]);
+  if (!write_graph_cache(g,argv[2])) {
+    printf("Could not write graph cache: %s\n",argv[2]);
+    return 1;
+  }
+  free_adjlist(g);
+
+  t1=time(NULL);
+  printf("- Overall time = %ldh%ldm%lds\n",(t1-t0)/3600,((t1-t0)%3600)/60,((t1-t0)%60));
+  return 0;
+}
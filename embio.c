@@ -0,0 +1,143 @@
+#include "embio.h"
+
+#include <stdlib.h>
+#include <string.h>
+
+#define NIDS 65536
+
+static uint16_t float_to_half(float f) {
+  uint32_t x;
+  memcpy(&x, &f, sizeof(x));
+  uint32_t sign = (x >> 16) & 0x8000u;
+  int32_t exp = (int32_t)((x >> 23) & 0xffu) - 127 + 15;
+  uint32_t mant = x & 0x7fffffu;
+
+  if (((x >> 23) & 0xffu) == 0xffu) {
+    return (uint16_t)(sign | 0x7c00u | (mant ? 0x200u : 0u));
+  }
+  if (exp >= 31) {
+    return (uint16_t)(sign | 0x7c00u);
+  }
+  if (exp <= 0) {
+    if (exp < -10) {
+      return (uint16_t)sign;
+    }
+    mant |= 0x800000u;
+    uint32_t shift = (uint32_t)(14 - exp);
+    uint32_t half = mant >> shift;
+    uint32_t rem = mant & ((1u << shift) - 1u);
+    uint32_t mid = 1u << (shift - 1u);
+    if (rem > mid || (rem == mid && (half & 1u))) {
+      half++;
+    }
+    return (uint16_t)(sign | half);
+  }
+  uint32_t half = ((uint32_t)exp << 10) | (mant >> 13);
+  uint32_t rem = mant & 0x1fffu;
+  if (rem > 0x1000u || (rem == 0x1000u && (half & 1u))) {
+    half++;
+  }
+  return (uint16_t)(sign | half);
+}
+
+static size_t emb_itemsize(int format) {
+  return (format == EMB_F16) ? sizeof(uint16_t) : sizeof(float);
+}
+
+static void emb_write_header(embwriter *w, uint64_t ids_offset) {
+  unsigned char hdr[EMB_HEADER_SIZE];
+  uint32_t version = EMB_VERSION, k = w->k, dtype = (uint32_t)w->format;
+  uint64_t n = w->n;
+  memcpy(hdr, EMB_MAGIC, 4);
+  memcpy(hdr + 4, &version, 4);
+  memcpy(hdr + 8, &n, 8);
+  memcpy(hdr + 16, &k, 4);
+  memcpy(hdr + 20, &dtype, 4);
+  memcpy(hdr + 24, &ids_offset, 8);
+  fwrite(hdr, 1, EMB_HEADER_SIZE, w->file);
+}
+
+int emb_parse_format(const char *s) {
+  if (strcmp(s, "txt") == 0) {
+    return EMB_TXT;
+  }
+  if (strcmp(s, "f32") == 0) {
+    return EMB_F32;
+  }
+  if (strcmp(s, "f16") == 0) {
+    return EMB_F16;
+  }
+  return -1;
+}
+
+embwriter *emb_open(const char *path, unsigned k, int format) {
+  embwriter *w = malloc(sizeof(embwriter));
+  w->file = fopen(path, (format == EMB_TXT) ? "w" : "wb");
+  if (w->file == NULL) {
+    free(w);
+    return NULL;
+  }
+  w->format = format;
+  w->k = k;
+  w->n = 0;
+  w->cap = 0;
+  w->ids = NULL;
+  w->row = NULL;
+  if (format != EMB_TXT) {
+    w->cap = NIDS;
+    w->ids = malloc(w->cap * sizeof(uint64_t));
+    w->row = malloc(k * emb_itemsize(format));
+    emb_write_header(w, 0);
+  }
+  return w;
+}
+
+void emb_write(embwriter *w, unsigned long id, const double *vec) {
+  unsigned j;
+
+  if (w->format == EMB_TXT) {
+    fprintf(w->file, "%lu", id);
+    for (j = 0; j < w->k; j++) {
+      fprintf(w->file, " %le", vec[j]);
+    }
+    fprintf(w->file, "\n");
+    w->n++;
+    return;
+  }
+
+  if (w->n == w->cap) {
+    w->cap *= 2;
+    w->ids = realloc(w->ids, w->cap * sizeof(uint64_t));
+  }
+  w->ids[w->n++] = id;
+  if (w->format == EMB_F16) {
+    uint16_t *r = w->row;
+    for (j = 0; j < w->k; j++) {
+      r[j] = float_to_half((float)vec[j]);
+    }
+  } else {
+    float *r = w->row;
+    for (j = 0; j < w->k; j++) {
+      r[j] = (float)vec[j];
+    }
+  }
+  fwrite(w->row, emb_itemsize(w->format), w->k, w->file);
+}
+
+int emb_close(embwriter *w) {
+  int ok = 1;
+  if (w->format != EMB_TXT) {
+    uint64_t end = EMB_HEADER_SIZE + (uint64_t)w->n * w->k * emb_itemsize(w->format);
+    uint64_t ids_offset = (end + 7) & ~(uint64_t)7;
+    static const unsigned char pad[8] = {0};
+    fwrite(pad, 1, ids_offset - end, w->file);
+    fwrite(w->ids, sizeof(uint64_t), w->n, w->file);
+    ok = (fseek(w->file, 0, SEEK_SET) == 0);
+    emb_write_header(w, ids_offset);
+  }
+  ok = (fclose(w->file) == 0) && ok;
+  free(w->ids);
+  free(w->row);
+  free(w);
+  return ok;
+}
@@ -0,0 +1,38 @@
+#ifndef EMBIO_H
+#define EMBIO_H
+
+#include <stdio.h>
+#include <stdint.h>
+
+/*
+  Binary embedding file (little-endian):
+    header  (32 bytes)  magic "LNEV", uint32 version, uint64 n, uint32 k,
+                        uint32 dtype, uint64 ids_offset
+    matrix  (offset 32) n x k values, row-major, float32 or float16
+    ids     (ids_offset) n x uint64 node ids, row i of the matrix is node ids[i]
+*/
+
+#define EMB_MAGIC "LNEV"
+#define EMB_VERSION 1
+#define EMB_HEADER_SIZE 32
+
+#define EMB_TXT 0
+#define EMB_F32 1
+#define EMB_F16 2
+
+typedef struct {
+  FILE *file;
+  int format;
+  unsigned k;
+  unsigned long n;
+  unsigned long cap;
+  uint64_t *ids;
+  void *row;
+} embwriter;
+
+int emb_parse_format(const char *s);
+embwriter *emb_open(const char *path, unsigned k, int format);
+void emb_write(embwriter *w, unsigned long id, const double *vec);
+int emb_close(embwriter *w);
+
+#endif
@@ -0,0 +1,393 @@
+#include "graphio.h"
+
+#include <stdlib.h>
+#include <stdio.h>
+#include <string.h>
+#include <strings.h>
+#include <stdint.h>
+#include <fcntl.h>
+#include <unistd.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <zlib.h>
+
+#define NNODES 10000000
+#define NCHUNK (1UL<<20)
+#define NDEG (1UL<<16)
+#define BUFSIZE (1UL<<20)
+
+static void *g_mapped = NULL;
+static size_t g_mapped_len = 0;
+
+/* Node ids must fit in node_t (only a restriction in compact builds). */
+static inline void check_id(unsigned long u){
+#ifdef COMPACT_GRAPH
+  if (u>NODE_MAX){
+    printf("Node id %lu does not fit in 32 bits; use the default build\n",u);
+    exit(1);
+  }
+#else
+  (void)u;
+#endif
+}
+
+static inline unsigned long max3(unsigned long a,unsigned long b,unsigned long c){
+  a = (a > b) ? a : b;
+  return (a > c) ? a : c;
+}
+
+adjlist* readadjlist2pass(char* input){
+  unsigned long n1=NNODES,n2,u,v,i;
+  unsigned long *d=calloc(n1,sizeof(unsigned long));
+  adjlist *g=malloc(sizeof(adjlist));
+  FILE *file;
+
+  g->n=0;
+  g->e=0;
+  file=fopen(input,"r");
+  while (fscanf(file,"%lu %lu", &u, &v)==2) {
+    check_id(u);
+    check_id(v);
+    g->e++;
+    g->n=max3(g->n,u,v);
+    if (g->n+1>=n1) {
+      n2=g->n+NNODES;
+      d=realloc(d,n2*sizeof(unsigned long));
+      bzero(d+n1,(n2-n1)*sizeof(unsigned long));
+      n1=n2;
+    }
+    d[u]++;
+    d[v]++;
+  }
+  fclose(file);
+
+  g->n++;
+  d=realloc(d,g->n*sizeof(unsigned long));
+
+  g->cd=malloc((g->n+1)*sizeof(unsigned long long));
+  g->cd[0]=0;
+  for (i=1;i<g->n+1;i++) {
+    g->cd[i]=g->cd[i-1]+d[i-1];
+    d[i-1]=0;
+  }
+
+  g->adj=malloc(2*g->e*sizeof(node_t));
+
+  file=fopen(input,"r");
+  while (fscanf(file,"%lu %lu", &u, &v)==2) {
+    g->adj[ g->cd[u] + d[u]++ ]=v;
+    g->adj[ g->cd[v] + d[v]++ ]=u;
+  }
+  fclose(file);
+
+  g->weights = NULL;
+  g->totalWeight = 2*g->e;
+  g->map=NULL;
+
+  free(d);
+
+  return g;
+}
+
+typedef struct {
+  gzFile file;
+  unsigned char *buf;
+  size_t len;
+  size_t pos;
+} reader;
+
+static int reader_open(reader *r, const char *input){
+  if (strcmp(input,"-")==0){
+    r->file=gzdopen(dup(fileno(stdin)),"rb");
+  } else {
+    r->file=gzopen(input,"rb");
+  }
+  if (r->file==NULL){
+    return 0;
+  }
+  gzbuffer(r->file,BUFSIZE);
+  r->buf=malloc(BUFSIZE);
+  r->len=0;
+  r->pos=0;
+  return 1;
+}
+
+static void reader_close(reader *r){
+  gzclose(r->file);
+  free(r->buf);
+}
+
+static inline int reader_peek(reader *r){
+  if (r->pos==r->len){
+    int nread=gzread(r->file,r->buf,BUFSIZE);
+    if (nread<=0){
+      return -1;
+    }
+    r->len=(size_t)nread;
+    r->pos=0;
+  }
+  return r->buf[r->pos];
+}
+
+static inline int read_ulong(reader *r, unsigned long *x){
+  int c;
+  unsigned long v=0;
+  while ((c=reader_peek(r))==' ' || c=='\t' || c=='\n' || c=='\r'){
+    r->pos++;
+  }
+  if (c<'0' || c>'9'){
+    return 0;
+  }
+  while ((c=reader_peek(r))>='0' && c<='9'){
+    v=v*10+(unsigned long)(c-'0');
+    r->pos++;
+  }
+  *x=v;
+  return 1;
+}
+
+adjlist* readadjlist(char* input){
+  unsigned long u,v,i,n1=NDEG,n2;
+  unsigned long long j,nchunks=0,cchunks=16;
+  unsigned long *d=calloc(n1,sizeof(unsigned long));
+  edge **chunks=malloc(cchunks*sizeof(edge*));
+  adjlist *g=malloc(sizeof(adjlist));
+  reader r;
+
+  if (!reader_open(&r,input)){
+    printf("Could not open edgelist: %s\n",input);
+    exit(1);
+  }
+
+  g->n=0;
+  g->e=0;
+  while (read_ulong(&r,&u) && read_ulong(&r,&v)) {
+    check_id(u);
+    check_id(v);
+    if (g->e==nchunks*NCHUNK) {
+      if (nchunks==cchunks) {
+        cchunks*=2;
+        chunks=realloc(chunks,cchunks*sizeof(edge*));
+      }
+      chunks[nchunks++]=malloc(NCHUNK*sizeof(edge));
+    }
+    chunks[g->e/NCHUNK][g->e%NCHUNK].s=u;
+    chunks[g->e/NCHUNK][g->e%NCHUNK].t=v;
+    g->e++;
+    g->n=max3(g->n,u,v);
+    if (g->n>=n1) {
+      n2=n1;
+      while (g->n>=n2) {
+        n2*=2;
+      }
+      d=realloc(d,n2*sizeof(unsigned long));
+      bzero(d+n1,(n2-n1)*sizeof(unsigned long));
+      n1=n2;
+    }
+    d[u]++;
+    d[v]++;
+  }
+  reader_close(&r);
+
+  g->n=(g->e==0)?0:g->n+1;
+
+  g->cd=malloc((g->n+1)*sizeof(unsigned long long));
+  g->cd[0]=0;
+  for (i=1;i<g->n+1;i++) {
+    g->cd[i]=g->cd[i-1]+d[i-1];
+    d[i-1]=0;
+  }
+
+  g->adj=malloc(2*g->e*sizeof(node_t));
+  for (j=0;j<g->e;j++) {
+    u=chunks[j/NCHUNK][j%NCHUNK].s;
+    v=chunks[j/NCHUNK][j%NCHUNK].t;
+    g->adj[ g->cd[u] + d[u]++ ]=v;
+    g->adj[ g->cd[v] + d[v]++ ]=u;
+  }
+  for (j=0;j<nchunks;j++) {
+    free(chunks[j]);
+  }
+  free(chunks);
+
+  g->weights = NULL;
+  g->totalWeight = 2*g->e;
+  g->map=NULL;
+
+  free(d);
+
+  return g;
+}
+
+int is_graph_cache(const char *path){
+  char magic[4];
+  FILE *file=fopen(path,"rb");
+  if (file==NULL){
+    return 0;
+  }
+  int ok=(fread(magic,1,4,file)==4 && memcmp(magic,GRAPH_MAGIC,4)==0);
+  fclose(file);
+  return ok;
+}
+
+static void convert_ids(node_t *dst, const unsigned char *src, unsigned long long len, size_t width){
+  unsigned long long i;
+  uint32_t u32;
+  uint64_t u64;
+  for (i=0;i<len;i++){
+    if (width==sizeof(uint32_t)){
+      memcpy(&u32,src+i*width,width);
+      dst[i]=u32;
+    } else {
+      memcpy(&u64,src+i*width,width);
+      check_id(u64);
+      dst[i]=(node_t)u64;
+    }
+  }
+}
+
+static adjlist* mmap_graph_cache(const char *path){
+  int fd=open(path,O_RDONLY);
+  struct stat st;
+  if (fd<0 || fstat(fd,&st)!=0 || (size_t)st.st_size<GRAPH_HEADER_SIZE){
+    if (fd>=0) close(fd);
+    return NULL;
+  }
+  void *base=mmap(NULL,st.st_size,PROT_READ,MAP_PRIVATE,fd,0);
+  close(fd);
+  if (base==MAP_FAILED){
+    return NULL;
+  }
+
+  const unsigned char *hdr=base;
+  uint32_t version,flags;
+  uint64_t n,e;
+  memcpy(&version,hdr+4,4);
+  memcpy(&n,hdr+8,8);
+  memcpy(&e,hdr+16,8);
+  memcpy(&flags,hdr+24,4);
+  size_t width=(flags&GRAPH_IDS32)?sizeof(uint32_t):sizeof(uint64_t);
+  size_t need=GRAPH_HEADER_SIZE+(n+1)*sizeof(uint64_t)+(2*e+((flags&GRAPH_HAS_MAP)?n:0))*width;
+  if (version!=GRAPH_VERSION || need>(size_t)st.st_size){
+    munmap(base,st.st_size);
+    return NULL;
+  }
+
+  adjlist *g=malloc(sizeof(adjlist));
+  g->n=n;
+  g->e=e;
+  g->weights=NULL;
+  g->totalWeight=2*g->e;
+  const unsigned long long *cd=(const unsigned long long*)(hdr+GRAPH_HEADER_SIZE);
+  const unsigned char *adj=(const unsigned char*)(cd+n+1);
+  if (width==sizeof(node_t)){
+    g->cd=(unsigned long long*)cd;
+    g->adj=(node_t*)adj;
+    g->map=(flags&GRAPH_HAS_MAP)?g->adj+2*e:NULL;
+    madvise(base,st.st_size,MADV_WILLNEED);
+    g_mapped=base;
+    g_mapped_len=st.st_size;
+    return g;
+  }
+
+  /* Cache written by a build with the other id width: copy and convert. */
+  g->cd=malloc((n+1)*sizeof(unsigned long long));
+  memcpy(g->cd,cd,(n+1)*sizeof(unsigned long long));
+  g->adj=malloc(2*e*sizeof(node_t));
+  convert_ids(g->adj,adj,2*e,width);
+  g->map=NULL;
+  if (flags&GRAPH_HAS_MAP){
+    g->map=malloc(n*sizeof(node_t));
+    convert_ids(g->map,adj+2*e*width,n,width);
+  }
+  munmap(base,st.st_size);
+  return g;
+}
+
+adjlist* load_graph(char* input){
+  if (is_graph_cache(input)){
+    adjlist *g=mmap_graph_cache(input);
+    if (g==NULL){
+      printf("Invalid graph cache: %s\n",input);
+      exit(1);
+    }
+    return g;
+  }
+  return readadjlist(input);
+}
+
+int write_graph_cache(adjlist *g, const char *path){
+  unsigned char hdr[GRAPH_HEADER_SIZE];
+  uint32_t version=GRAPH_VERSION,flags=(g->map!=NULL)?GRAPH_HAS_MAP:0,reserved=0;
+  if (sizeof(node_t)==sizeof(uint32_t)){
+    flags|=GRAPH_IDS32;
+  }
+  uint64_t n=g->n,e=g->e;
+  FILE *file=fopen(path,"wb");
+  if (file==NULL){
+    return 0;
+  }
+  memcpy(hdr,GRAPH_MAGIC,4);
+  memcpy(hdr+4,&version,4);
+  memcpy(hdr+8,&n,8);
+  memcpy(hdr+16,&e,8);
+  memcpy(hdr+24,&flags,4);
+  memcpy(hdr+28,&reserved,4);
+
+  int ok=(fwrite(hdr,1,GRAPH_HEADER_SIZE,file)==GRAPH_HEADER_SIZE);
+  ok=ok && fwrite(g->cd,sizeof(unsigned long long),g->n+1,file)==g->n+1;
+  ok=ok && fwrite(g->adj,sizeof(node_t),2*g->e,file)==2*g->e;
+  if (g->map!=NULL){
+    ok=ok && fwrite(g->map,sizeof(node_t),g->n,file)==g->n;
+  }
+  ok=(fclose(file)==0) && ok;
+  return ok;
+}
+
+adjlist* compact_graph(adjlist *g){
+  unsigned long u,i,n=0;
+  unsigned long long j,k=0;
+  unsigned long *new=malloc(g->n*sizeof(unsigned long));
+  adjlist *h=malloc(sizeof(adjlist));
+
+  for (u=0;u<g->n;u++){
+    new[u]=(g->cd[u+1]>g->cd[u])?n++:(unsigned long)-1;
+  }
+  h->n=n;
+  h->e=g->e;
+  h->cd=malloc((n+1)*sizeof(unsigned long long));
+  h->adj=malloc(2*g->e*sizeof(node_t));
+  h->map=malloc(n*sizeof(node_t));
+  h->weights=NULL;
+  h->totalWeight=g->totalWeight;
+  h->cd[0]=0;
+  for (u=0,i=0;u<g->n;u++){
+    if (new[u]==(unsigned long)-1){
+      continue;
+    }
+    h->map[i]=(g->map==NULL)?u:g->map[u];
+    for (j=g->cd[u];j<g->cd[u+1];j++){
+      h->adj[k++]=new[g->adj[j]];
+    }
+    h->cd[++i]=k;
+  }
+  free(new);
+  return h;
+}
+
+void free_adjlist(adjlist *g){
+  /* Subgraphs may be freed concurrently by recpart's worker threads. */
+  void *mapped=__atomic_load_n(&g_mapped,__ATOMIC_ACQUIRE);
+  if (mapped!=NULL && (void*)g->cd==(char*)mapped+GRAPH_HEADER_SIZE){
+    munmap(mapped,g_mapped_len);
+    __atomic_store_n(&g_mapped,NULL,__ATOMIC_RELEASE);
+    g_mapped_len=0;
+    free(g);
+    return;
+  }
+  free(g->cd);
+  free(g->adj);
+  free(g->weights);
+  free(g->map);
+  free(g);
+}
@@ -0,0 +1,32 @@
+#ifndef GRAPHIO_H
+#define GRAPHIO_H
+
+#include "struct.h"
+
+/*
+  Binary CSR graph cache (little-endian, native unsigned long = 64 bits):
+    header (32 bytes) magic "LNEG", uint32 version, uint64 n, uint64 e,
+                      uint32 flags (GRAPH_HAS_MAP, GRAPH_IDS32), uint32 reserved
+    cd     (n+1) x uint64
+    adj    2e x uint64 (uint32 if GRAPH_IDS32)
+    map    n x uint64 original node ids (uint32 if GRAPH_IDS32), if GRAPH_HAS_MAP
+  Caches are written with the id width of the build (GRAPH_IDS32 in compact
+  builds) and mapped directly when it matches; otherwise they are converted
+  on load.
+*/
+
+#define GRAPH_MAGIC "LNEG"
+#define GRAPH_VERSION 1
+#define GRAPH_HEADER_SIZE 32
+#define GRAPH_HAS_MAP 1u
+#define GRAPH_IDS32 2u
+
+adjlist* readadjlist(char* input);
+adjlist* readadjlist2pass(char* input);
+adjlist* load_graph(char* input);
+int is_graph_cache(const char *path);
+int write_graph_cache(adjlist *g, const char *path);
+adjlist* compact_graph(adjlist *g);
+void free_adjlist(adjlist *g);
+
+#endif
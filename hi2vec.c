@@ -1,84 +1,64 @@
 #include <stdlib.h>
 #include <stdio.h>
-#include <strings.h>
 #include <time.h>
-#include <math.h>
 
-#define HMAX 100000
+#include "embio.h"
+#include "hierio.h"
+#include "treevec.h"
 
-inline double rand1(){
-  return 2 * ((rand()+1.0) / (RAND_MAX+1.0)) - 1;
-}
-
-void recvec(FILE* file1, FILE* file2, unsigned k, double a, double *vec){
-  unsigned h;
-  unsigned long i,j,u,n,c;
-  double ah;
-
-  if (fscanf(file1,"%u %lu", &h, &c)!=2){
-    printf("file reading error 1\n");
-    return;
-  }
-  ah=pow(a,h);
-  if (vec==NULL){
-    vec=malloc(HMAX*k*sizeof(double));
-    bzero(vec,k*sizeof(double));
-  }
-  if (c==1){
-    if (fscanf(file1,"%lu", &n)!=1){
-      printf("file reading error 2\n");
-      return;
-    }
-    for (i=0;i<n;i++){
-      if (fscanf(file1,"%lu",&u)!=1){
-        printf("file reading error 3\n");
-        return;
-      }
-      fprintf(file2,"%lu",u);
-      for (j=0;j<k;j++){
-        fprintf(file2," %le",vec[h*k+j]+rand1()*ah);
-      }
-      fprintf(file2,"\n");
-    }
-  }
-  else{
-    for (i=0;i<c;i++){
-      for (j=0;j<k;j++){
-        vec[(h+1)*k+j]=vec[h*k+j]+rand1()*ah;
-      }
-      recvec(file1, file2, k, a, vec);
-    }
-  }
-}
+static const char *usage = "Usage: ./hi2vec k a hierarchy.txt vectors.txt [format=txt|f32|f16] [seed=time] [threads=1]\n";
 
 int main(int argc,char** argv){
-  if (argc != 5) {
-    printf("Usage: ./hi2vec k a hierarchy.txt vectors.txt\n");
+  if (argc < 5 || argc > 8) {
+    printf("%s", usage);
     return 1;
   }
 
-  FILE *file1,*file2;
-  unsigned k;
+  hiertree *tree;
+  embwriter *out;
+  unsigned k, threads;
   double a;
+  unsigned long seed;
+  int format = (argc >= 6) ? emb_parse_format(argv[5]) : EMB_TXT;
+  if (format < 0) {
+    printf("Unknown vector format: %s\n", argv[5]);
+    return 1;
+  }
 
   time_t t1,t2;
   t1=time(NULL);
 
-  srand(time(NULL));
   printf("Number of dimensions: %s\n",argv[1]);
   k=atoi(argv[1]);
   printf("Damping factor: %s\n",argv[2]);
   a=atof(argv[2]);
+  seed=(argc >= 7) ? strtoul(argv[6], NULL, 10) : (unsigned long)time(NULL);
+  printf("Seed: %lu\n",seed);
+  threads=(argc == 8) ? parse_threads(argv[7]) : 1;
+  if (threads == 0) {
+    printf("Invalid thread count: %s (expected 1 to %d)\n", argv[7], MAX_THREADS);
+    printf("%s", usage);
+    return 1;
+  }
+  printf("Threads: %u\n",threads);
 
   printf("Reading hierarchy from file: %s\n",argv[3]);
-  file1=fopen(argv[3],"r");
+  tree=hiertree_load(argv[3]);
+  if (tree==NULL) {
+    printf("Could not read hierarchy file: %s\n", argv[3]);
+    return 1;
+  }
   printf("Writing vectors to file: %s\n",argv[4]);
-  file2=fopen(argv[4],"w");
+  out=emb_open(argv[4],k,format);
+  if (out==NULL) {
+    printf("Could not open vector file: %s\n", argv[4]);
+    return 1;
+  }
 
-  recvec(file1, file2, k, a, NULL);
+  hiertree_embed(tree, k, a, seed, threads, 1, NULL, NULL, &out);
 
-  fclose(file1);
-  fclose(file2);
+  hiertree_free(tree);
+  emb_close(out);
 
   t2=time(NULL);
   printf("- Overall Time = %ldh%ldm%lds\n",(t2-t1)/3600,((t2-t1)%3600)/60,((t2-t1)%60));
@@ -1,120 +1,295 @@
 #include <stdlib.h>
 #include <stdio.h>
-#include <strings.h>
+#include <string.h>
 #include <time.h>
 #include <math.h>
 
 #include "attr.h"
+#include "embio.h"
+#include "hierio.h"
+#include "treevec.h"
 
-#define HMAX 100000
+#define PROJ_ROWS 64
+#define PROJ_COLS 256
+
+#define PROJ_DENSE 0
+#define PROJ_SPARSE 1
 
-static unsigned g_k = 0;
-static unsigned long g_attr_d = 0;
 static double *g_proj = NULL;
+static double *g_xp = NULL;
+static unsigned long g_xp_rows = 0;
 
-inline double rand1(){
-  return 2 * ((rand()+1.0) / (RAND_MAX+1.0)) - 1;
-}
+typedef struct {
+  unsigned k;
+  unsigned nbeta;
+  const double *beta;
+} leafctx;
 
-static void init_projection(unsigned k, unsigned long d) {
-  unsigned long i;
-  g_k = k;
-  g_attr_d = d;
+/* Projection rows are keyed by (seed, ~0, row) so they never collide with
+   the tree keys derived from the same seed. */
+static void init_projection(unsigned k, unsigned long d, uint64_t pkey) {
+  unsigned long t;
+  unsigned j;
   g_proj = malloc((unsigned long)k * d * sizeof(double));
-  for (i = 0; i < (unsigned long)k * d; i++) {
-    g_proj[i] = rand1() / sqrt((double)k);
+  for (j = 0; j < k; j++) {
+    uint64_t rk = tree_key(pkey, j);
+    for (t = 0; t < d; t++) {
+      g_proj[(unsigned long)j * d + t] = tree_uniform(rk, t) / sqrt((double)k);
+    }
   }
 }
 
-static inline double attr_proj_coord(const float *x, unsigned j) {
-  unsigned long t;
-  double s = 0.0;
-  for (t = 0; t < g_attr_d; t++) {
-    s += (double)x[t] * g_proj[(unsigned long)j * g_attr_d + t];
+static inline void axpy_row(double *out, double x, const double *p, unsigned k) {
+  unsigned j;
+  for (j = 0; j < k; j++) {
+    out[j] += x * p[j];
   }
-  return s;
 }
 
-void recvec_attr(FILE* file1, FILE* file2, unsigned k, double a, double beta, double *vec){
-  unsigned h;
-  unsigned long i,j,u,n,c;
-  double ah;
+/* XP = X.P^T for every attribute row, through P^T (d x k) so that each
+   non-zero attribute adds one contiguous row. Dense attributes are walked in
+   PROJ_ROWS x PROJ_COLS blocks to keep the P^T slice in cache. */
+static void project_dense(unsigned k, unsigned long d) {
+  unsigned long r0, r1, t0, t1, u, t, j;
+  double *pt = malloc(d * k * sizeof(double));
+  for (j = 0; j < k; j++) {
+    for (t = 0; t < d; t++) {
+      pt[t * k + j] = g_proj[j * d + t];
+    }
+  }
 
-  if (fscanf(file1,"%u %lu", &h, &c)!=2){
-    printf("file reading error 1\n");
+  if (attr_is_sparse()) {
+    for (u = 0; u < g_xp_rows; u++) {
+      const unsigned *idx;
+      const float *val;
+      unsigned long nnz = get_node_attributes_sparse(u, &idx, &val);
+      for (t = 0; t < nnz; t++) {
+        axpy_row(g_xp + u * k, (double)val[t], pt + (unsigned long)idx[t] * k, k);
+      }
+    }
+    free(pt);
     return;
   }
-  ah=pow(a,h);
-  if (vec==NULL){
-    vec=malloc(HMAX*k*sizeof(double));
-    bzero(vec,k*sizeof(double));
+
+  for (r0 = 0; r0 < g_xp_rows; r0 += PROJ_ROWS) {
+    r1 = (r0 + PROJ_ROWS < g_xp_rows) ? r0 + PROJ_ROWS : g_xp_rows;
+    for (t0 = 0; t0 < d; t0 += PROJ_COLS) {
+      t1 = (t0 + PROJ_COLS < d) ? t0 + PROJ_COLS : d;
+      for (u = r0; u < r1; u++) {
+        const float *x = get_node_attributes(u);
+        if (x == NULL) {
+          continue;
+        }
+        for (t = t0; t < t1; t++) {
+          if (x[t] != 0.0f) {
+            axpy_row(g_xp + u * k, (double)x[t], pt + t * k, k);
+          }
+        }
+      }
+    }
+  }
+  free(pt);
+}
+
+/* Achlioptas projection: entries are +-1/sqrt(k) with probability 1/6 each
+   and 0 otherwise, so their variance is 1/(3k) like the dense entries. They
+   are stored as a CSR list of non-zero output coordinates per attribute.
+   Only non-zero attributes are visited. */
+static void project_sparse(unsigned k, unsigned long d, uint64_t pkey) {
+  unsigned long t, u, nnz = 0;
+  unsigned j;
+  double s = 1.0 / sqrt((double)k);
+  unsigned long *ptr = malloc((d + 1) * sizeof(unsigned long));
+  unsigned *col = malloc(((unsigned long)k * d + 1) * sizeof(unsigned));
+  double *sign = malloc(((unsigned long)k * d + 1) * sizeof(double));
+
+  ptr[0] = 0;
+  for (t = 0; t < d; t++) {
+    uint64_t rk = tree_key(pkey, t);
+    for (j = 0; j < k; j++) {
+      int r = (int)(tree_mix(rk + j) % 6);
+      if (r < 2) {
+        col[nnz] = j;
+        sign[nnz] = (r == 0) ? s : -s;
+        nnz++;
+      }
+    }
+    ptr[t + 1] = nnz;
   }
 
-  if (c==1){
-    if (fscanf(file1,"%lu", &n)!=1){
-      printf("file reading error 2\n");
-      return;
+  for (u = 0; u < g_xp_rows; u++) {
+    double *out = g_xp + u * k;
+    const unsigned *idx;
+    const float *val;
+    const float *x = NULL;
+    unsigned long n, i;
+    if (attr_is_sparse()) {
+      n = get_node_attributes_sparse(u, &idx, &val);
+    } else {
+      x = get_node_attributes(u);
+      n = (x == NULL) ? 0 : d;
     }
-    for (i=0;i<n;i++){
-      if (fscanf(file1,"%lu",&u)!=1){
-        printf("file reading error 3\n");
-        return;
+    for (i = 0; i < n; i++) {
+      double xt = (x == NULL) ? (double)val[i] : (double)x[i];
+      t = (x == NULL) ? idx[i] : i;
+      if (xt == 0.0) {
+        continue;
       }
-      const float *x = get_node_attributes(u);
-      fprintf(file2,"%lu",u);
-      for (j=0;j<k;j++){
-        double attr_term = 0.0;
-        if (x != NULL && g_attr_d > 0) {
-          attr_term = beta * attr_proj_coord(x, j) * ah;
-        }
-        fprintf(file2," %le",vec[h*k+j] + rand1()*ah + attr_term);
+      unsigned long q;
+      for (q = ptr[t]; q < ptr[t + 1]; q++) {
+        out[col[q]] += xt * sign[q];
       }
-      fprintf(file2,"\n");
     }
   }
-  else{
-    for (i=0;i<c;i++){
-      for (j=0;j<k;j++){
-        vec[(h+1)*k+j]=vec[h*k+j]+rand1()*ah;
+
+  free(ptr);
+  free(col);
+  free(sign);
+}
+
+static void precompute_projection(unsigned k, int mode, uint64_t seed) {
+  unsigned long d = attr_dim();
+  clock_t c0 = clock();
+  g_xp_rows = attr_rows();
+  g_xp = calloc(g_xp_rows * k + 1, sizeof(double));
+  if (g_xp_rows == 0) {
+    return;
+  }
+  uint64_t pkey = tree_key(seed, ~0ULL);
+  if (mode == PROJ_SPARSE) {
+    project_sparse(k, d, pkey);
+  } else {
+    init_projection(k, d, pkey);
+    project_dense(k, d);
+  }
+  printf("Projected %lu attribute rows (%lu -> %u, %s) in %.3fs\n", g_xp_rows, d, k,
+         (mode == PROJ_SPARSE) ? "sparse" : "dense", (double)(clock() - c0) / CLOCKS_PER_SEC);
+}
+
+static void attr_leaf(void *arg, unsigned long u, double ah, const double *base, double *rows) {
+  leafctx *ctx = arg;
+  unsigned b, j, k = ctx->k;
+  const double *xp = (u < g_xp_rows) ? g_xp + u*k : NULL;
+  for (b=0;b<ctx->nbeta;b++){
+    for (j=0;j<k;j++){
+      double attr_term = 0.0;
+      if (xp != NULL) {
+        attr_term = ctx->beta[b] * xp[j] * ah;
       }
-      recvec_attr(file1, file2, k, a, beta, vec);
+      rows[(unsigned long)b*k+j] = base[j] + attr_term;
     }
   }
 }
 
+/* Replaces the first "{beta}" in path by tok; returns a malloc'd string. */
+static char *beta_path(const char *path, const char *tok, unsigned long len) {
+  const char *p = strstr(path, "{beta}");
+  char *res = malloc(strlen(path) + len + 1);
+  if (p == NULL) {
+    strcpy(res, path);
+    return res;
+  }
+  memcpy(res, path, p - path);
+  memcpy(res + (p - path), tok, len);
+  strcpy(res + (p - path) + len, p + 6);
+  return res;
+}
+
+static const char *usage = "Usage: ./hi2vec_attr k a beta[,beta...] hierarchy.txt attributes.txt vectors.txt [format=txt|f32|f16] [projection=dense|sparse] [seed=time] [threads=1]\n";
+
 int main(int argc,char** argv){
-  if (argc != 7) {
-    printf("Usage: ./hi2vec_attr k a beta hierarchy.txt attributes.txt vectors.txt\n");
+  if (argc < 7 || argc > 11) {
+    printf("%s", usage);
+    printf("With several beta values the vector path must contain {beta}, e.g. vec_b{beta}.txt\n");
     return 1;
   }
 
-  FILE *file1,*file2;
-  unsigned k;
-  double a, beta;
+  hiertree *tree;
+  embwriter **out;
+  unsigned k, b, nbeta = 0, threads;
+  double a, *beta;
+  unsigned long seed;
+  char **toks;
+  int format = (argc >= 8) ? emb_parse_format(argv[7]) : EMB_TXT;
+  if (format < 0) {
+    printf("Unknown vector format: %s\n", argv[7]);
+    return 1;
+  }
+  int proj = PROJ_DENSE;
+  if (argc >= 9) {
+    if (strcmp(argv[8], "sparse") == 0) {
+      proj = PROJ_SPARSE;
+    } else if (strcmp(argv[8], "dense") != 0) {
+      printf("Unknown projection: %s\n", argv[8]);
+      return 1;
+    }
+  }
+
+  beta = malloc((strlen(argv[3]) / 2 + 1) * sizeof(double));
+  toks = malloc((strlen(argv[3]) / 2 + 1) * sizeof(char *));
+  for (char *tok = strtok(argv[3], ","); tok != NULL; tok = strtok(NULL, ",")) {
+    toks[nbeta] = tok;
+    beta[nbeta++] = atof(tok);
+  }
+  if (nbeta == 0) {
+    printf("No beta value given\n");
+    return 1;
+  }
+  if (nbeta > 1 && strstr(argv[6], "{beta}") == NULL) {
+    printf("Vector path must contain {beta} when several beta values are given: %s\n", argv[6]);
+    return 1;
+  }
 
   time_t t1,t2;
   t1=time(NULL);
 
-  srand(time(NULL));
   k=atoi(argv[1]);
   a=atof(argv[2]);
-  beta=atof(argv[3]);
+  seed=(argc >= 10) ? strtoul(argv[9], NULL, 10) : (unsigned long)time(NULL);
+  printf("Seed: %lu\n",seed);
+  threads=(argc == 11) ? parse_threads(argv[10]) : 1;
+  if (threads == 0) {
+    printf("Invalid thread count: %s (expected 1 to %d)\n", argv[10], MAX_THREADS);
+    printf("%s", usage);
+    return 1;
+  }
+  printf("Threads: %u\n",threads);
 
   if (!load_attributes(argv[5])) {
     printf("Could not load attribute file: %s\n", argv[5]);
     return 1;
   }
 
-  init_projection(k, attr_dim());
+  precompute_projection(k, proj, seed);
 
-  file1=fopen(argv[4],"r");
-  file2=fopen(argv[6],"w");
+  tree=hiertree_load(argv[4]);
+  if (tree==NULL) {
+    printf("Could not read hierarchy file: %s\n", argv[4]);
+    return 1;
+  }
+  out=malloc(nbeta*sizeof(embwriter *));
+  for (b=0;b<nbeta;b++){
+    char *path = beta_path(argv[6], toks[b], strlen(toks[b]));
+    out[b]=emb_open(path,k,format);
+    if (out[b]==NULL) {
+      printf("Could not open vector file: %s\n", path);
+      return 1;
+    }
+    free(path);
+  }
 
-  recvec_attr(file1, file2, k, a, beta, NULL);
+  leafctx ctx = {k, nbeta, beta};
+  hiertree_embed(tree, k, a, seed, threads, nbeta, attr_leaf, &ctx, out);
 
-  fclose(file1);
-  fclose(file2);
+  hiertree_free(tree);
+  for (b=0;b<nbeta;b++){
+    emb_close(out[b]);
+  }
+  free(out);
+  free(beta);
+  free(toks);
   free(g_proj);
+  free(g_xp);
   free_attributes();
 
   t2=time(NULL);
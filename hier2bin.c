@@ -0,0 +1,68 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <time.h>
+
+#include "hierio.h"
+
+int main(int argc,char** argv){
+  if (argc != 3) {
+    printf("Usage: ./hier2bin hierarchy.txt hierarchy.bin\n");
+    printf("       ./hier2bin hierarchy.bin hierarchy.txt\n");
+    return 1;
+  }
+
+  time_t t0=time(NULL),t1;
+  unsigned h;
+  unsigned long c,n,i,cap=1024,nrec=0;
+  unsigned long *ids=malloc(cap*sizeof(unsigned long));
+
+  printf("Reading hierarchy from file %s\n",argv[1]);
+  hierreader* in=hier_open_read(argv[1]);
+  if (in==NULL) {
+    printf("Could not open hierarchy file: %s\n", argv[1]);
+    return 1;
+  }
+  int to_text=(in->format==HIER_BIN);
+
+  printf("Writing %s hierarchy to file %s\n",to_text?"text":"binary",argv[2]);
+  hierwriter* out=hier_open(argv[2],to_text?HIER_TXT:HIER_BIN);
+  if (out==NULL) {
+    printf("Could not open hierarchy file: %s\n", argv[2]);
+    return 1;
+  }
+
+  while (hier_read_node(in,&h,&c)) {
+    nrec++;
+    if (c!=1) {
+      hier_write_node(out,h,c);
+      continue;
+    }
+    if (!hier_read_size(in,&n)) {
+      printf("file reading error 2\n");
+      return 1;
+    }
+    if (n>cap) {
+      cap=n;
+      ids=realloc(ids,cap*sizeof(unsigned long));
+    }
+    for (i=0;i<n;i++) {
+      if (!hier_read_id(in,ids+i)) {
+        printf("file reading error 3\n");
+        return 1;
+      }
+    }
+    hier_write_leaf(out,h,n,ids);
+  }
+
+  hier_close_read(in);
+  if (!hier_close(out)) {
+    printf("Could not write hierarchy file: %s\n", argv[2]);
+    return 1;
+  }
+  free(ids);
+  printf("Tree nodes: %lu\n",nrec);
+
+  t1=time(NULL);
+  printf("- Overall time = %ldh%ldm%lds\n",(t1-t0)/3600,((t1-t0)%3600)/60,((t1-t0)%60));
+  return 0;
+}
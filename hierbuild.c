@@ -0,0 +1,427 @@
+#include "hierbuild.h"
+#include "graphio.h"
+
+#include <errno.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/stat.h>
+#include <time.h>
+
+typedef struct buildtask {
+  adjlist *g;
+  childarena *arena; /* holds g; NULL for the whole graph */
+  unsigned h;
+  hierwriter *out;
+  unsigned long nchild;
+  struct buildtask **child;
+} buildtask;
+
+typedef struct {
+  buildtask **items;
+  unsigned long top;
+  unsigned long bottom;
+  unsigned long cap;
+  pthread_mutex_t lock;
+} taskdeque;
+
+/* queued counts the tasks in the deques and pending the tasks not yet done.
+   Both are guarded by lock; idle workers sleep on wake until one changes. */
+typedef struct {
+  partition part;
+  unsigned nworkers;
+  taskdeque *dq;
+  pthread_mutex_t lock;
+  pthread_cond_t wake;
+  unsigned long queued;
+  unsigned long pending;
+} buildpool;
+
+typedef struct {
+  buildpool *pool;
+  unsigned id;
+} workerarg;
+
+/* Child extraction work, summed over all splits. */
+static unsigned long long g_split_count = 0;
+static unsigned long long g_split_children = 0;
+static unsigned long long g_split_allocs = 0;
+static unsigned long long g_split_nsec = 0;
+
+childarena *split_children(adjlist *g, unsigned long *lab, unsigned long nlab) {
+  struct timespec t0, t1;
+  unsigned long i, u, v, lu;
+  unsigned long long j, nadj = 0;
+  childarena *a;
+  adjlist *sg;
+
+  clock_gettime(CLOCK_MONOTONIC, &t0);
+  unsigned long *new = malloc(g->n * sizeof(unsigned long));
+  unsigned long *size = calloc(nlab, sizeof(unsigned long));
+  unsigned long long *pos = calloc(nlab, sizeof(unsigned long long));
+
+  /* Counting pass: local ids, nodes and internal adjacency entries per child. */
+  for (u = 0; u < g->n; u++) {
+    lu = lab[u];
+    new[u] = size[lu]++;
+    for (j = g->cd[u]; j < g->cd[u + 1]; j++) {
+      if (lab[g->adj[j]] == lu) {
+        pos[lu]++;
+      }
+    }
+  }
+  for (i = 0; i < nlab; i++) {
+    nadj += pos[i];
+  }
+
+  a = malloc(sizeof(childarena) + nlab * sizeof(adjlist) + (g->n + nlab) * sizeof(unsigned long long) +
+             (nadj + g->n) * sizeof(node_t));
+  a->nchild = nlab;
+  a->refs = nlab;
+  unsigned long long *cd = (unsigned long long *)(a->child + nlab);
+  node_t *adj = (node_t *)(cd + g->n + nlab);
+  node_t *map = adj + nadj;
+  for (i = 0; i < nlab; i++) {
+    sg = a->child + i;
+    sg->n = size[i];
+    sg->e = pos[i] / 2;
+    sg->cd = cd;
+    sg->adj = adj;
+    sg->map = map;
+    sg->weights = NULL;
+    sg->totalWeight = 2 * sg->e;
+    sg->cd[0] = 0;
+    cd += sg->n + 1;
+    adj += pos[i];
+    map += sg->n;
+    pos[i] = 0;
+  }
+
+  /* Filling pass: one scan of g appends each node to its child. */
+  for (u = 0; u < g->n; u++) {
+    lu = lab[u];
+    sg = a->child + lu;
+    sg->map[new[u]] = (g->map == NULL) ? u : g->map[u];
+    for (j = g->cd[u]; j < g->cd[u + 1]; j++) {
+      v = g->adj[j];
+      if (lab[v] == lu) {
+        sg->adj[pos[lu]++] = new[v];
+      }
+    }
+    sg->cd[new[u] + 1] = pos[lu];
+  }
+  free(new);
+  free(size);
+  free(pos);
+
+  clock_gettime(CLOCK_MONOTONIC, &t1);
+  __atomic_add_fetch(&g_split_count, 1, __ATOMIC_RELAXED);
+  __atomic_add_fetch(&g_split_children, nlab, __ATOMIC_RELAXED);
+  __atomic_add_fetch(&g_split_allocs, 4, __ATOMIC_RELAXED);
+  __atomic_add_fetch(&g_split_nsec,
+                     (unsigned long long)((t1.tv_sec - t0.tv_sec) * 1000000000LL + (t1.tv_nsec - t0.tv_nsec)),
+                     __ATOMIC_RELAXED);
+  return a;
+}
+
+void print_split_stats(void) {
+  printf("Child extraction: %llu splits, %llu subgraphs, %llu allocations, %.3fs\n", g_split_count,
+         g_split_children, g_split_allocs, g_split_nsec / 1e9);
+}
+
+/* Writes g as a leaf, with the original ids from its map (the identity when
+   g is the whole input graph, which has no map). */
+static void write_leaf(hierwriter *out, unsigned h, adjlist *g) {
+  unsigned long i, *ids;
+
+  if (sizeof(node_t) == sizeof(unsigned long) && g->map != NULL) {
+    hier_write_leaf(out, h, g->n, (const unsigned long *)g->map);
+    return;
+  }
+  ids = malloc(g->n * sizeof(unsigned long));
+  for (i = 0; i < g->n; i++) {
+    ids[i] = (g->map == NULL) ? i : g->map[i];
+  }
+  hier_write_leaf(out, h, g->n, ids);
+  free(ids);
+}
+
+/* Partitions g and writes its hierarchy record. Returns the number of parts
+   with their labels in *lab, or 0 when g was written as a leaf.
+   Prints the partition time when report is set (for the whole graph). */
+static unsigned long split_level(partition part, adjlist *g, unsigned h, hierwriter *out, unsigned long **lab,
+                                 int report) {
+  struct timespec t0, t1;
+  unsigned long nlab;
+
+  if (g->e == 0) {
+    write_leaf(out, h, g);
+    return 0;
+  }
+  if (report) {
+    clock_gettime(CLOCK_MONOTONIC, &t0);
+  }
+  *lab = malloc(g->n * sizeof(unsigned long));
+  nlab = part(g, *lab);
+  if (report) {
+    clock_gettime(CLOCK_MONOTONIC, &t1);
+    double dt = (t1.tv_sec - t0.tv_sec) + 1e-9 * (t1.tv_nsec - t0.tv_nsec);
+    long sec = (long)dt;
+    printf("First level partition computed: %lu parts\n", nlab);
+    printf("- Time to compute first level partition = %ldh%ldm%.3fs\n", sec / 3600, (sec % 3600) / 60, dt - 60 * (sec / 60));
+  }
+  if (nlab == 1) {
+    write_leaf(out, h, g);
+    free(*lab);
+    return 0;
+  }
+  hier_write_node(out, h, nlab);
+  return nlab;
+}
+
+/* Writes the hierarchy of g. When own is set, g is freed as soon as its
+   children are extracted; otherwise the caller keeps it. */
+static void descend(partition part, adjlist *g, unsigned h, hierwriter *out, int report, int own) {
+  unsigned long i, nlab, *lab;
+  childarena *a;
+
+  nlab = split_level(part, g, h, out, &lab, report);
+  if (nlab == 0) {
+    if (own) {
+      free_adjlist(g);
+    }
+    return;
+  }
+  a = split_children(g, lab, nlab);
+  free(lab);
+  if (own) {
+    free_adjlist(g);
+  }
+  for (i = 0; i < nlab; i++) {
+    descend(part, a->child + i, h + 1, out, 0, 0);
+  }
+  free(a);
+}
+
+void recurs(partition part, adjlist *g, unsigned h, hierwriter *out) {
+  descend(part, g, h, out, h == 0, 1);
+}
+
+static buildtask *new_task(adjlist *g, childarena *arena, unsigned h, int format) {
+  buildtask *t = malloc(sizeof(buildtask));
+  t->g = g;
+  t->arena = arena;
+  t->h = h;
+  t->out = hier_open_mem(format);
+  t->nchild = 0;
+  t->child = NULL;
+  return t;
+}
+
+static void deque_push(taskdeque *q, buildtask *t) {
+  pthread_mutex_lock(&q->lock);
+  if (q->bottom == q->cap) {
+    if (q->top > 0) {
+      memmove(q->items, q->items + q->top, (q->bottom - q->top) * sizeof(buildtask *));
+      q->bottom -= q->top;
+      q->top = 0;
+    } else {
+      q->cap = (q->cap == 0) ? 64 : 2 * q->cap;
+      q->items = realloc(q->items, q->cap * sizeof(buildtask *));
+    }
+  }
+  q->items[q->bottom++] = t;
+  pthread_mutex_unlock(&q->lock);
+}
+
+/* The owner pops its newest task; thieves take the oldest one. */
+static buildtask *deque_pop(taskdeque *q, int steal) {
+  buildtask *t = NULL;
+  pthread_mutex_lock(&q->lock);
+  if (q->bottom > q->top) {
+    t = steal ? q->items[q->top++] : q->items[--q->bottom];
+  }
+  pthread_mutex_unlock(&q->lock);
+  return t;
+}
+
+/* Frees the graph of t, or releases it from its arena, which goes with the
+   last of its children. */
+static void drop_graph(buildtask *t) {
+  if (t->arena == NULL) {
+    free_adjlist(t->g);
+  } else if (__atomic_sub_fetch(&t->arena->refs, 1, __ATOMIC_ACQ_REL) == 0) {
+    free(t->arena);
+  }
+  t->g = NULL;
+}
+
+static void run_task(buildpool *pool, unsigned w, buildtask *t) {
+  unsigned long i, nlab, *lab;
+  childarena *a;
+
+  if (t->g->n < TASK_MIN_NODES) {
+    descend(pool->part, t->g, t->h, t->out, t->h == 0, 0);
+    drop_graph(t);
+    return;
+  }
+  nlab = split_level(pool->part, t->g, t->h, t->out, &lab, t->h == 0);
+  if (nlab == 0) {
+    drop_graph(t);
+    return;
+  }
+
+  a = split_children(t->g, lab, nlab);
+  free(lab);
+  drop_graph(t);
+  t->child = malloc(nlab * sizeof(buildtask *));
+  t->nchild = nlab;
+  for (i = 0; i < nlab; i++) {
+    t->child[i] = new_task(a->child + i, a, t->h + 1, t->out->format);
+    deque_push(pool->dq + w, t->child[i]);
+  }
+  pthread_mutex_lock(&pool->lock);
+  pool->queued += nlab;
+  pool->pending += nlab;
+  pthread_cond_broadcast(&pool->wake);
+  pthread_mutex_unlock(&pool->lock);
+}
+
+static void *build_worker(void *arg) {
+  workerarg *wa = arg;
+  buildpool *pool = wa->pool;
+  unsigned v, w = wa->id;
+
+  for (;;) {
+    pthread_mutex_lock(&pool->lock);
+    while (pool->queued == 0 && pool->pending > 0) {
+      pthread_cond_wait(&pool->wake, &pool->lock);
+    }
+    if (pool->queued == 0) {
+      pthread_mutex_unlock(&pool->lock);
+      break;
+    }
+    pool->queued--;
+    pthread_mutex_unlock(&pool->lock);
+
+    /* queued was counted down, so some deque holds a task for us. */
+    buildtask *t = NULL;
+    for (v = 0; t == NULL; v = (v + 1) % pool->nworkers) {
+      t = deque_pop(pool->dq + (w + v) % pool->nworkers, v != 0);
+    }
+    local_moving_threads_busy(1);
+    run_task(pool, w, t);
+    local_moving_threads_busy(-1);
+
+    pthread_mutex_lock(&pool->lock);
+    if (--pool->pending == 0) {
+      pthread_cond_broadcast(&pool->wake);
+    }
+    pthread_mutex_unlock(&pool->lock);
+  }
+  return NULL;
+}
+
+/* Writes the task buffers in hierarchy (preorder) order. */
+static void merge_task(hierwriter *out, buildtask *t) {
+  unsigned long i;
+  hier_append(out, t->out);
+  hier_close(t->out);
+  for (i = 0; i < t->nchild; i++) {
+    merge_task(out, t->child[i]);
+  }
+  free(t->child);
+  free(t);
+}
+
+void build_hierarchy(partition part, adjlist *g, hierwriter *out, unsigned threads) {
+  unsigned w;
+
+  if (threads <= 1) {
+    recurs(part, g, 0, out);
+    return;
+  }
+
+  buildpool pool;
+  pool.part = part;
+  pool.nworkers = threads;
+  pool.dq = calloc(threads, sizeof(taskdeque));
+  for (w = 0; w < threads; w++) {
+    pthread_mutex_init(&pool.dq[w].lock, NULL);
+  }
+  pthread_mutex_init(&pool.lock, NULL);
+  pthread_cond_init(&pool.wake, NULL);
+  buildtask *root = new_task(g, NULL, 0, out->format);
+  pool.queued = 1;
+  pool.pending = 1;
+  deque_push(pool.dq, root);
+  /* This thread only waits for the workers: its share of the budget is theirs. */
+  local_moving_threads_busy(-1);
+
+  pthread_t *tid = malloc(threads * sizeof(pthread_t));
+  workerarg *args = malloc(threads * sizeof(workerarg));
+  for (w = 0; w < threads; w++) {
+    args[w].pool = &pool;
+    args[w].id = w;
+    pthread_create(tid + w, NULL, build_worker, args + w);
+  }
+  for (w = 0; w < threads; w++) {
+    pthread_join(tid[w], NULL);
+  }
+  local_moving_threads_busy(1);
+
+  merge_task(out, root);
+
+  for (w = 0; w < threads; w++) {
+    pthread_mutex_destroy(&pool.dq[w].lock);
+    free(pool.dq[w].items);
+  }
+  pthread_mutex_destroy(&pool.lock);
+  pthread_cond_destroy(&pool.wake);
+  free(pool.dq);
+  free(tid);
+  free(args);
+}
+
+unsigned long shard_hierarchy(partition part, adjlist *g, hierwriter *out, const char *dir) {
+  unsigned long i, nlab, nshard = 0, *lab;
+  childarena *a;
+  adjlist *sg;
+  char path[4096];
+
+  nlab = split_level(part, g, 0, out, &lab, 1);
+  if (nlab == 0) {
+    free_adjlist(g);
+    return 0;
+  }
+  if (mkdir(dir, 0755) != 0 && errno != EEXIST) {
+    printf("Could not create shard directory: %s\n", dir);
+    exit(1);
+  }
+  a = split_children(g, lab, nlab);
+  free(lab);
+  free_adjlist(g);
+  for (i = 0; i < nlab; i++) {
+    sg = a->child + i;
+    if (sg->n < TASK_MIN_NODES) {
+      snprintf(path, sizeof(path), "%s/" SHARD_NAME "%s", dir, i, (out->format == HIER_BIN) ? ".bin" : ".txt");
+      hierwriter *frag = hier_open(path, out->format);
+      if (frag == NULL) {
+        printf("Could not open hierarchy file: %s\n", path);
+        exit(1);
+      }
+      descend(part, sg, 0, frag, 0, 0);
+      hier_close(frag);
+      continue;
+    }
+    snprintf(path, sizeof(path), "%s/" SHARD_NAME ".csr", dir, i);
+    if (!write_graph_cache(sg, path)) {
+      printf("Could not write shard: %s\n", path);
+      exit(1);
+    }
+    nshard++;
+  }
+  free(a);
+  return nshard;
+}
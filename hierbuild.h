@@ -0,0 +1,36 @@
+#ifndef HIERBUILD_H
+#define HIERBUILD_H
+
+#include "struct.h"
+#include "partition.h"
+#include "hierio.h"
+
+/* Subgraphs with fewer nodes are finished inline by the task that made them. */
+#define TASK_MIN_NODES 1024
+
+/* Files of the i-th top-level child in the shard directory: the subgraph
+   (".csr") or its hierarchy fragment (".txt" or ".bin"). */
+#define SHARD_NAME "shard_%06lu"
+
+/* The nlab child subgraphs of one split, as views into a single block that
+   also holds their cd, adj and map arrays; free it with free(). In the
+   threaded build, refs counts the children still in use. */
+typedef struct {
+  unsigned long nchild;
+  unsigned long refs;
+  adjlist child[];
+} childarena;
+
+childarena *split_children(adjlist *g, unsigned long *lab, unsigned long nlab);
+void print_split_stats(void);
+
+void recurs(partition part, adjlist *g, unsigned h, hierwriter *out);
+void build_hierarchy(partition part, adjlist *g, hierwriter *out, unsigned threads);
+
+/* Writes only the root record of g to out. Each top-level child with at least
+   TASK_MIN_NODES nodes is written to dir as a graph cache shard, with its map
+   to original ids; smaller children get their hierarchy fragment written there
+   directly. Returns the number of shards (0 when g is a single leaf). */
+unsigned long shard_hierarchy(partition part, adjlist *g, hierwriter *out, const char *dir);
+
+#endif
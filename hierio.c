@@ -0,0 +1,304 @@
+#include "hierio.h"
+
+#include <errno.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define HBUF (1 << 16)
+
+int hier_parse_format(const char *s) {
+  if (strcmp(s, "txt") == 0) {
+    return HIER_TXT;
+  }
+  if (strcmp(s, "bin") == 0) {
+    return HIER_BIN;
+  }
+  return -1;
+}
+
+unsigned parse_threads(const char *s) {
+  char *end;
+  long t;
+
+  errno = 0;
+  t = strtol(s, &end, 10);
+  if (end == s || *end != '\0' || errno != 0 || t < 1 || t > MAX_THREADS) {
+    return 0;
+  }
+  return (unsigned)t;
+}
+
+int is_hier_binary(const char *path) {
+  char magic[4];
+  FILE *f = fopen(path, "rb");
+  if (f == NULL) {
+    return 0;
+  }
+  int ok = (fread(magic, 1, 4, f) == 4) && memcmp(magic, HIER_MAGIC, 4) == 0;
+  fclose(f);
+  return ok;
+}
+
+static void hier_write_header(hierwriter *w) {
+  unsigned char hdr[HIER_HEADER_SIZE] = {0};
+  uint32_t version = HIER_VERSION;
+  memcpy(hdr, HIER_MAGIC, 4);
+  memcpy(hdr + 4, &version, 4);
+  memcpy(hdr + 8, &w->nrec, 8);
+  memcpy(hdr + 16, &w->nids, 8);
+  fwrite(hdr, 1, HIER_HEADER_SIZE, w->file);
+}
+
+/* File writers write the buffer out; memory writers (file == NULL) grow it. */
+static void hier_flush(hierwriter *w) {
+  if (w->file == NULL) {
+    w->cap *= 2;
+    w->buf = realloc(w->buf, w->cap);
+    return;
+  }
+  fwrite(w->buf, 1, w->len, w->file);
+  w->len = 0;
+}
+
+static inline void put_byte(hierwriter *w, unsigned char c) {
+  if (w->len == w->cap) {
+    hier_flush(w);
+  }
+  w->buf[w->len++] = c;
+}
+
+static inline void put_varint(hierwriter *w, uint64_t x) {
+  while (x >= 0x80) {
+    put_byte(w, (unsigned char)(x | 0x80));
+    x >>= 7;
+  }
+  put_byte(w, (unsigned char)x);
+}
+
+static inline void put_dec(hierwriter *w, unsigned long x) {
+  char tmp[24];
+  int i = 0;
+  do {
+    tmp[i++] = (char)('0' + x % 10);
+    x /= 10;
+  } while (x > 0);
+  while (i > 0) {
+    put_byte(w, (unsigned char)tmp[--i]);
+  }
+}
+
+hierwriter *hier_open(const char *path, int format) {
+  hierwriter *w = malloc(sizeof(hierwriter));
+  w->file = fopen(path, (format == HIER_TXT) ? "w" : "wb");
+  if (w->file == NULL) {
+    free(w);
+    return NULL;
+  }
+  w->format = format;
+  w->buf = malloc(HBUF);
+  w->len = 0;
+  w->cap = HBUF;
+  w->nrec = 0;
+  w->nids = 0;
+  if (format == HIER_BIN) {
+    hier_write_header(w);
+  }
+  return w;
+}
+
+hierwriter *hier_open_mem(int format) {
+  hierwriter *w = malloc(sizeof(hierwriter));
+  w->file = NULL;
+  w->format = format;
+  w->cap = 256;
+  w->buf = malloc(w->cap);
+  w->len = 0;
+  w->nrec = 0;
+  w->nids = 0;
+  return w;
+}
+
+/* Appends the records of a memory writer of the same format. */
+void hier_append(hierwriter *w, const hierwriter *src) {
+  size_t off = 0, n;
+  while (off < src->len) {
+    if (w->len == w->cap) {
+      hier_flush(w);
+    }
+    n = w->cap - w->len;
+    if (n > src->len - off) {
+      n = src->len - off;
+    }
+    memcpy(w->buf + w->len, src->buf + off, n);
+    w->len += n;
+    off += n;
+  }
+  w->nrec += src->nrec;
+  w->nids += src->nids;
+}
+
+void hier_write_node(hierwriter *w, unsigned h, unsigned long c) {
+  w->nrec++;
+  if (w->format == HIER_BIN) {
+    put_varint(w, h);
+    put_varint(w, c);
+    return;
+  }
+  put_dec(w, h);
+  put_byte(w, ' ');
+  put_dec(w, c);
+  put_byte(w, '\n');
+}
+
+void hier_write_leaf(hierwriter *w, unsigned h, unsigned long n, const unsigned long *ids) {
+  unsigned long i, prev = 0;
+  w->nrec++;
+  w->nids += n;
+  if (w->format == HIER_BIN) {
+    put_varint(w, h);
+    put_varint(w, 1);
+    put_varint(w, n);
+    for (i = 0; i < n; i++) {
+      int64_t d = (int64_t)(ids[i] - prev);
+      put_varint(w, ((uint64_t)d << 1) ^ (uint64_t)(d >> 63));
+      prev = ids[i];
+    }
+    return;
+  }
+  put_dec(w, h);
+  put_byte(w, ' ');
+  put_byte(w, '1');
+  put_byte(w, ' ');
+  put_dec(w, n);
+  for (i = 0; i < n; i++) {
+    put_byte(w, ' ');
+    put_dec(w, ids[i]);
+  }
+  put_byte(w, '\n');
+}
+
+int hier_close(hierwriter *w) {
+  int ok = 1;
+  if (w->file == NULL) {
+    free(w->buf);
+    free(w);
+    return 1;
+  }
+  hier_flush(w);
+  if (w->format == HIER_BIN) {
+    ok = (fseek(w->file, 0, SEEK_SET) == 0);
+    hier_write_header(w);
+  }
+  ok = (fclose(w->file) == 0) && ok;
+  free(w->buf);
+  free(w);
+  return ok;
+}
+
+static inline int get_byte(hierreader *r) {
+  if (r->pos == r->len) {
+    r->len = fread(r->buf, 1, HBUF, r->file);
+    r->pos = 0;
+    if (r->len == 0) {
+      return -1;
+    }
+  }
+  return r->buf[r->pos++];
+}
+
+static inline int get_varint(hierreader *r, uint64_t *x) {
+  unsigned shift = 0;
+  int c;
+  *x = 0;
+  while ((c = get_byte(r)) >= 0) {
+    *x |= (uint64_t)(c & 0x7f) << shift;
+    if ((c & 0x80) == 0) {
+      return 1;
+    }
+    shift += 7;
+    if (shift > 63) {
+      return 0;
+    }
+  }
+  return 0;
+}
+
+static inline int get_dec(hierreader *r, unsigned long *x) {
+  int c;
+  do {
+    c = get_byte(r);
+  } while (c == ' ' || c == '\n' || c == '\t' || c == '\r');
+  if (c < '0' || c > '9') {
+    return 0;
+  }
+  *x = 0;
+  while (c >= '0' && c <= '9') {
+    *x = *x * 10 + (unsigned long)(c - '0');
+    c = get_byte(r);
+  }
+  return 1;
+}
+
+static inline int get_ulong(hierreader *r, unsigned long *x) {
+  if (r->format == HIER_BIN) {
+    uint64_t v;
+    if (!get_varint(r, &v)) {
+      return 0;
+    }
+    *x = (unsigned long)v;
+    return 1;
+  }
+  return get_dec(r, x);
+}
+
+hierreader *hier_open_read(const char *path) {
+  hierreader *r = malloc(sizeof(hierreader));
+  r->file = fopen(path, "rb");
+  if (r->file == NULL) {
+    free(r);
+    return NULL;
+  }
+  r->buf = malloc(HBUF);
+  r->len = fread(r->buf, 1, HBUF, r->file);
+  r->pos = 0;
+  r->prev = 0;
+  r->format = HIER_TXT;
+  if (r->len >= HIER_HEADER_SIZE && memcmp(r->buf, HIER_MAGIC, 4) == 0) {
+    r->format = HIER_BIN;
+    r->pos = HIER_HEADER_SIZE;
+  }
+  return r;
+}
+
+int hier_read_node(hierreader *r, unsigned *h, unsigned long *c) {
+  unsigned long x;
+  if (!get_ulong(r, &x)) {
+    return 0;
+  }
+  *h = (unsigned)x;
+  return get_ulong(r, c);
+}
+
+int hier_read_size(hierreader *r, unsigned long *n) {
+  r->prev = 0;
+  return get_ulong(r, n);
+}
+
+int hier_read_id(hierreader *r, unsigned long *u) {
+  if (r->format == HIER_BIN) {
+    uint64_t z;
+    if (!get_varint(r, &z)) {
+      return 0;
+    }
+    r->prev += (unsigned long)((z >> 1) ^ (~(z & 1) + 1));
+    *u = r->prev;
+    return 1;
+  }
+  return get_dec(r, u);
+}
+
+void hier_close_read(hierreader *r) {
+  fclose(r->file);
+  free(r->buf);
+  free(r);
+}
@@ -0,0 +1,69 @@
+#ifndef HIERIO_H
+#define HIERIO_H
+
+#include <stdio.h>
+#include <stdint.h>
+
+/*
+  Binary hierarchy file (little-endian):
+    header  (32 bytes) magic "LNEH", uint32 version, uint64 records,
+                       uint64 ids (total leaf members), uint64 reserved
+    records in preorder, one per tree node:
+      varint depth, varint children (1 = leaf)
+      leaf only: varint size, then size ids, each a zigzag varint of the
+                 difference with the previous id of the leaf (first from 0)
+
+  The text format has one line per tree node: "depth children" for inner
+  nodes and "depth 1 size id..." for leaves.
+*/
+
+#define HIER_MAGIC "LNEH"
+#define HIER_VERSION 1
+#define HIER_HEADER_SIZE 32
+
+#define HIER_TXT 0
+#define HIER_BIN 1
+
+typedef struct {
+  FILE *file;
+  int format;
+  unsigned char *buf;
+  size_t len;
+  size_t cap;
+  uint64_t nrec;
+  uint64_t nids;
+} hierwriter;
+
+typedef struct {
+  FILE *file;
+  int format;
+  unsigned char *buf;
+  size_t pos;
+  size_t len;
+  unsigned long prev;
+} hierreader;
+
+int hier_parse_format(const char *s);
+
+/* Largest thread count the drivers accept. */
+#define MAX_THREADS 1024
+
+/* Parses a thread count: a whole decimal number from 1 to MAX_THREADS, or
+   else 0. */
+unsigned parse_threads(const char *s);
+int is_hier_binary(const char *path);
+
+hierwriter *hier_open(const char *path, int format);
+hierwriter *hier_open_mem(int format);
+void hier_write_node(hierwriter *w, unsigned h, unsigned long c);
+void hier_write_leaf(hierwriter *w, unsigned h, unsigned long n, const unsigned long *ids);
+void hier_append(hierwriter *w, const hierwriter *src);
+int hier_close(hierwriter *w);
+
+hierreader *hier_open_read(const char *path);
+int hier_read_node(hierreader *r, unsigned *h, unsigned long *c);
+int hier_read_size(hierreader *r, unsigned long *n);
+int hier_read_id(hierreader *r, unsigned long *u);
+void hier_close_read(hierreader *r);
+
+#endif
@@ -0,0 +1,108 @@
+#include <stdlib.h>
+#include <stdio.h>
+#include <time.h>
+
+#include "hierio.h"
+
+static unsigned long *ids=NULL;
+static unsigned long cap=0;
+
+/* Copies the records of one hierarchy file, shifting their depth by dh.
+   Returns the number of records, or 0 on a reading error. */
+static unsigned long copy_records(hierreader *in, hierwriter *out, unsigned dh){
+  unsigned h;
+  unsigned long c,n,i,nrec=0;
+
+  while (hier_read_node(in,&h,&c)) {
+    if ((nrec==0)!=(h==0)) {
+      return 0;
+    }
+    nrec++;
+    if (c!=1) {
+      hier_write_node(out,h+dh,c);
+      continue;
+    }
+    if (!hier_read_size(in,&n)) {
+      return 0;
+    }
+    if (n>cap) {
+      cap=n;
+      ids=realloc(ids,cap*sizeof(unsigned long));
+    }
+    for (i=0;i<n;i++) {
+      if (!hier_read_id(in,ids+i)) {
+        return 0;
+      }
+    }
+    hier_write_leaf(out,h+dh,n,ids);
+  }
+  return nrec;
+}
+
+int main(int argc,char** argv){
+  if (argc < 3) {
+    printf("Usage: ./hierstitch hierarchy.txt root.txt [fragment_0.txt fragment_1.txt ...]\n");
+    return 1;
+  }
+
+  time_t t0=time(NULL),t1;
+  unsigned h;
+  unsigned long c,i,nrec=1;
+
+  hierreader* root=hier_open_read(argv[2]);
+  if (root==NULL) {
+    printf("Could not open hierarchy file: %s\n", argv[2]);
+    return 1;
+  }
+  hierwriter* out=hier_open(argv[1],root->format);
+  if (out==NULL) {
+    printf("Could not open hierarchy file: %s\n", argv[1]);
+    return 1;
+  }
+
+  if (!hier_read_node(root,&h,&c) || h!=0) {
+    printf("Invalid root hierarchy: %s\n", argv[2]);
+    return 1;
+  }
+  if (c==1) {
+    /* The whole graph is a single leaf: nothing was sharded. */
+    hier_close_read(root);
+    root=hier_open_read(argv[2]);
+    nrec=copy_records(root,out,0);
+    c=0;
+  } else {
+    hier_write_node(out,0,c);
+  }
+  hier_close_read(root);
+  if ((unsigned long)(argc-3)!=c) {
+    printf("Root has %lu children but %d fragments were given\n",c,argc-3);
+    return 1;
+  }
+
+  printf("Stitching %lu fragments into file %s\n",c,argv[1]);
+  for (i=0;i<c;i++) {
+    hierreader* in=hier_open_read(argv[3+i]);
+    if (in==NULL) {
+      printf("Could not open hierarchy file: %s\n", argv[3+i]);
+      return 1;
+    }
+    unsigned long n=copy_records(in,out,1);
+    if (n==0) {
+      printf("Invalid hierarchy fragment: %s\n", argv[3+i]);
+      return 1;
+    }
+    nrec+=n;
+    hier_close_read(in);
+  }
+
+  if (!hier_close(out)) {
+    printf("Could not write hierarchy file: %s\n", argv[1]);
+    return 1;
+  }
+  free(ids);
+  printf("Tree nodes: %lu\n",nrec);
+
+  t1=time(NULL);
+  printf("- Overall time = %ldh%ldm%lds\n",(t1-t0)/3600,((t1-t0)%3600)/60,((t1-t0)%60));
+  return 0;
+}
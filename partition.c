@@ -2,14 +2,130 @@
 #include "attr.h"
 
 #include <math.h>
+#include <pthread.h>
+#include <time.h>
+
+#ifdef REDUCED_PRECISION
+#define wsqrt sqrt
+#else
+#define wsqrt sqrtl
+#endif
+
+static weight_t g_attr_lambda = 0.2;
+
+static int g_lm_mode = LM_SWEEP;
+static unsigned g_lm_max_passes = 0;
+static unsigned g_lm_threads = 1;
+static long g_lm_spare = 0;
+
+/* Per-thread counters, folded into the totals when a local-moving phase ends.
+   Attribute work is only counted in attributed local moving. */
+static __thread int g_pass = -1;
+static __thread int g_attr_pass = -1;
+static __thread unsigned long long g_pass_evals[NPASS_STATS];
+static __thread unsigned long long g_pass_flops[NPASS_STATS];
+static __thread unsigned long long g_pass_visits[NPASS_STATS];
+static __thread unsigned long long g_pass_moves[NPASS_STATS];
+static unsigned long long g_attr_evals[NPASS_STATS];
+static unsigned long long g_attr_flops[NPASS_STATS];
+static unsigned long long g_lm_visits[NPASS_STATS];
+static unsigned long long g_lm_moves[NPASS_STATS];
+
+/* Coarsening work of the multi-level partition (1), by level. Each level is
+   coarsened once per call, so the totals are updated atomically in place. */
+static unsigned long long g_coarsen_calls[NPASS_STATS];
+static unsigned long long g_coarsen_nodes[NPASS_STATS];
+static unsigned long long g_coarsen_edges[NPASS_STATS];
+static unsigned long long g_coarsen_nsec[NPASS_STATS];
+
+static inline void count_attr_flops(unsigned long long flops, unsigned long long evals) {
+  if (g_attr_pass >= 0) {
+    g_pass_evals[g_attr_pass] += evals;
+    g_pass_flops[g_attr_pass] += flops;
+  }
+}
+
+static void fold_pass_stats(void) {
+  int i;
+  for (i = 0; i < NPASS_STATS; i++) {
+    __atomic_add_fetch(g_attr_evals + i, g_pass_evals[i], __ATOMIC_RELAXED);
+    __atomic_add_fetch(g_attr_flops + i, g_pass_flops[i], __ATOMIC_RELAXED);
+    __atomic_add_fetch(g_lm_visits + i, g_pass_visits[i], __ATOMIC_RELAXED);
+    __atomic_add_fetch(g_lm_moves + i, g_pass_moves[i], __ATOMIC_RELAXED);
+    g_pass_evals[i] = 0;
+    g_pass_flops[i] = 0;
+    g_pass_visits[i] = 0;
+    g_pass_moves[i] = 0;
+  }
+}
+
+void print_attr_stats(void) {
+  int i;
+  for (i = 0; i < NPASS_STATS; i++) {
+    if (g_attr_evals[i] == 0 && g_attr_flops[i] == 0) {
+      continue;
+    }
+    printf("Attributed pass %d%s: %llu candidate evaluations, %llu attribute flops\n",
+           i, (i == NPASS_STATS - 1) ? "+" : "", g_attr_evals[i], g_attr_flops[i]);
+  }
+}
+
+void print_pass_stats(void) {
+  int i;
+  unsigned long long visits = 0, moves = 0;
+  for (i = 0; i < NPASS_STATS; i++) {
+    if (g_lm_visits[i] == 0) {
+      continue;
+    }
+    printf("Local moving pass %d%s: %llu nodes visited, %llu moves\n",
+           i, (i == NPASS_STATS - 1) ? "+" : "", g_lm_visits[i], g_lm_moves[i]);
+    visits += g_lm_visits[i];
+    moves += g_lm_moves[i];
+  }
+  printf("Local moving total: %llu nodes visited, %llu moves\n", visits, moves);
+}
+
+void print_coarsen_stats(void) {
+  int i;
+  for (i = 0; i < NPASS_STATS; i++) {
+    if (g_coarsen_calls[i] == 0) {
+      continue;
+    }
+    printf("Coarsening level %d%s: %llu graphs, %llu nodes, %llu edges, %.3fs\n",
+           i, (i == NPASS_STATS - 1) ? "+" : "", g_coarsen_calls[i], g_coarsen_nodes[i],
+           g_coarsen_edges[i], g_coarsen_nsec[i] / 1e9);
+  }
+}
+
+void set_local_moving(int mode, unsigned max_passes) {
+  g_lm_mode = mode;
+  g_lm_max_passes = max_passes;
+}
+
+void set_local_moving_threads(unsigned threads) {
+  g_lm_threads = (threads == 0) ? 1 : threads;
+  g_lm_spare = g_lm_threads - 1;
+}
 
-#define NLINKS2 8
+void local_moving_threads_busy(long delta) {
+  __atomic_sub_fetch(&g_lm_spare, delta, __ATOMIC_ACQ_REL);
+}
 
-static long double g_attr_lambda = 0.2L;
+/* Takes up to want threads from the spare budget. */
+static unsigned claimSyncThreads(unsigned want) {
+  long spare = __atomic_load_n(&g_lm_spare, __ATOMIC_ACQUIRE), take;
+  do {
+    take = (spare < (long)want) ? spare : (long)want;
+    if (take <= 0) {
+      return 0;
+    }
+  } while (!__atomic_compare_exchange_n(&g_lm_spare, &spare, spare - take, 0, __ATOMIC_ACQ_REL, __ATOMIC_ACQUIRE));
+  return (unsigned)take;
+}
 
 void set_attr_louvain_weight(long double lambda) {
-  if (lambda < 0.0L) {
-    lambda = 0.0L;
+  if (lambda < 0.0) {
+    lambda = 0.0;
   }
   g_attr_lambda = lambda;
 }
@@ -23,7 +139,35 @@ unsigned long init(adjlist *g,unsigned long *lab){
   return nlab;
 }
 
+/* Local moving options after the partition id: "sweep", "active" or "sync",
+   then an optional pass cap, e.g. "4:active:20". */
+static void parse_local_moving(char *opt){
+  char *cap=strchr(opt,':');
+  if (cap!=NULL) {
+    *cap++='\0';
+  }
+  static const char *names[]={"sweep","active","sync"};
+  static const char *labels[]={"sweep","active set","bucketed synchronous"};
+  int mode;
+  for (mode=0;mode<3 && strcmp(opt,names[mode])!=0;mode++);
+  if (mode==3) {
+    printf("Unknown local moving mode: %s\n",opt);
+    exit(1);
+  }
+  set_local_moving(mode,(cap!=NULL)?strtoul(cap,NULL,10):0);
+  printf("Local moving: %s",labels[mode]);
+  if (g_lm_max_passes>0) {
+    printf(", at most %u passes",g_lm_max_passes);
+  }
+  printf("\n");
+}
+
 partition choose_partition(char *c){
+  char *opt=strchr(c,':');
+  if (opt!=NULL) {
+    *opt++='\0';
+    parse_local_moving(opt);
+  }
   printf("Chosen partition algorithm: ");
   if (strcmp(c,"0")==0){
     printf("Random partition\n");
@@ -49,43 +193,26 @@ partition choose_partition(char *c){
   exit(1);
 }
 
-int myCompare(const void *a, const void *b, void *array2) {
-  unsigned long ia = *(const unsigned long *)a;
-  unsigned long ib = *(const unsigned long *)b;
-  long diff = ((unsigned long *)array2)[ia] - ((unsigned long *)array2)[ib];
-  return (0 < diff) - (diff < 0);
-}
-
-unsigned long *mySort(unsigned long *part, unsigned long size) {
-  unsigned long i;
-  unsigned long *nodes = (unsigned long *)malloc(size * sizeof(unsigned long));
-  for (i = 0; i < size; i++) {
-    nodes[i] = i;
-  }
-  qsort_r(nodes, size, sizeof(unsigned long), myCompare, (void *)part);
-  return nodes;
-}
-
-inline long double degreeWeighted(adjlist *g, unsigned long node) {
+inline weight_t degreeWeighted(adjlist *g, unsigned long node) {
   unsigned long long i;
   if (g->weights == NULL) {
-    return 1.0L * (g->cd[node + 1] - g->cd[node]);
+    return 1.0 * (g->cd[node + 1] - g->cd[node]);
   }
-  long double res = 0.0L;
+  weight_t res = 0.0;
   for (i = g->cd[node]; i < g->cd[node + 1]; i++) {
     res += g->weights[i];
   }
   return res;
 }
 
-inline long double selfloopWeighted(adjlist *g, unsigned long node) {
+inline weight_t selfloopWeighted(adjlist *g, unsigned long node) {
   unsigned long long i;
   for (i = g->cd[node]; i < g->cd[node + 1]; i++) {
     if (g->adj[i] == node) {
-      return (g->weights == NULL) ? 1.0L : g->weights[i];
+      return (g->weights == NULL) ? 1.0 : g->weights[i];
     }
   }
-  return 0.0L;
+  return 0.0;
 }
 
 static inline void attr_remove_node(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm) {
@@ -94,14 +221,28 @@ static inline void attr_remove_node(louvainPartition *p, adjlist *g, unsigned lo
     return;
   }
   unsigned long oid = (g->map == NULL) ? node : g->map[node];
+  weight_t dot = attr_dot_node_to_comm_sum(g, node, p->attrSums + comm * d);
+  p->commNorm2[comm] -= 2.0 * dot;
+  p->commNorm2[comm] += p->attrNorm2[node];
+  count_attr_flops(2 * attr_node_cost(oid), 0);
+  if (attr_is_sparse()) {
+    const unsigned *idx;
+    const float *val;
+    unsigned long t, nnz = get_node_attributes_sparse(oid, &idx, &val);
+    attrsum_t *dst = p->attrSums + comm * d;
+    for (t = 0; t < nnz; t++) {
+      dst[idx[t]] -= (attrsum_t)val[t];
+    }
+    return;
+  }
   const float *x = get_node_attributes(oid);
   if (x == NULL) {
     return;
   }
   unsigned long j;
-  long double *dst = p->attrSums + comm * d;
+  attrsum_t *dst = p->attrSums + comm * d;
   for (j = 0; j < d; j++) {
-    dst[j] -= (long double)x[j];
+    dst[j] -= (attrsum_t)x[j];
   }
 }
 
@@ -111,46 +252,84 @@ static inline void attr_insert_node(louvainPartition *p, adjlist *g, unsigned lo
     return;
   }
   unsigned long oid = (g->map == NULL) ? node : g->map[node];
+  weight_t dot = attr_dot_node_to_comm_sum(g, node, p->attrSums + comm * d);
+  p->commNorm2[comm] += 2.0 * dot;
+  p->commNorm2[comm] += p->attrNorm2[node];
+  count_attr_flops(2 * attr_node_cost(oid), 0);
+  if (attr_is_sparse()) {
+    const unsigned *idx;
+    const float *val;
+    unsigned long t, nnz = get_node_attributes_sparse(oid, &idx, &val);
+    attrsum_t *dst = p->attrSums + comm * d;
+    for (t = 0; t < nnz; t++) {
+      dst[idx[t]] += (attrsum_t)val[t];
+    }
+    return;
+  }
   const float *x = get_node_attributes(oid);
   if (x == NULL) {
     return;
   }
   unsigned long j;
-  long double *dst = p->attrSums + comm * d;
+  attrsum_t *dst = p->attrSums + comm * d;
   for (j = 0; j < d; j++) {
-    dst[j] += (long double)x[j];
+    dst[j] += (attrsum_t)x[j];
   }
 }
 
-static inline void removeNode(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm, long double dnodecomm) {
-  p->in[comm]  -= 2.0L * dnodecomm + selfloopWeighted(g, node);
+/* Term of comm in the modularity sum, as in modularity(). */
+static inline weight_t commTerm(louvainPartition *p, adjlist *g, unsigned long comm) {
+  return (p->tot[comm] > 0.0) ? p->in[comm] - (p->tot[comm] * p->tot[comm]) / g->totalWeight : 0.0;
+}
+
+static inline void removeNode(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm, weight_t dnodecomm) {
+  p->q -= commTerm(p, g, comm);
+  p->in[comm]  -= 2.0 * dnodecomm + selfloopWeighted(g, node);
   p->tot[comm] -= degreeWeighted(g, node);
+  p->q += commTerm(p, g, comm);
   if (p->commSize[comm] > 0) {
     p->commSize[comm]--;
   }
   attr_remove_node(p, g, node, comm);
 }
 
-static inline void insertNode(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm, long double dnodecomm) {
-  p->in[comm]  += 2.0L * dnodecomm + selfloopWeighted(g, node);
+static inline void insertNode(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm, weight_t dnodecomm) {
+  p->q -= commTerm(p, g, comm);
+  p->in[comm]  += 2.0 * dnodecomm + selfloopWeighted(g, node);
   p->tot[comm] += degreeWeighted(g, node);
+  p->q += commTerm(p, g, comm);
   p->node2Community[node] = comm;
   p->commSize[comm]++;
   attr_insert_node(p, g, node, comm);
 }
 
-inline long double gain(louvainPartition *p, adjlist *g, unsigned long comm, long double dnc, long double degc) {
-  long double totc = p->tot[comm];
-  long double m2 = g->totalWeight;
+inline weight_t gain(louvainPartition *p, adjlist *g, unsigned long comm, weight_t dnc, weight_t degc) {
+  weight_t totc = p->tot[comm];
+  weight_t m2 = g->totalWeight;
   return (dnc - totc * degc / m2);
 }
 
-static inline long double attr_gain(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm) {
-  if (g_attr_lambda <= 0.0L || attr_dim() == 0 || p->attrSums == NULL || p->commSize[comm] == 0) {
-    return 0.0L;
+/* Dot product of the attributes of node with an attribute sum. */
+static inline weight_t node_dot(adjlist *g, unsigned long node, const attrsum_t *vec) {
+  count_attr_flops(attr_node_cost((g->map == NULL) ? node : g->map[node]), 1);
+  return attr_dot_node_to_comm_sum(g, node, vec);
+}
+
+static inline weight_t attr_gain(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm) {
+  if (g_attr_lambda <= 0.0 || attr_dim() == 0 || p->attrSums == NULL || p->commSize[comm] == 0) {
+    return 0.0;
+  }
+  weight_t nx = p->attrNorm2[node];
+  weight_t nc = p->commNorm2[comm];
+  if (nx <= 0.0 || nc <= 0.0) {
+    return 0.0;
+  }
+  weight_t cos = node_dot(g, node, p->attrSums + comm * attr_dim()) / wsqrt(nx * nc);
+  if (cos > 1.0) {
+    cos = 1.0;
+  } else if (cos < -1.0) {
+    cos = -1.0;
   }
-  const long double *vec = p->attrSums + comm * attr_dim();
-  long double cos = attr_cosine_node_to_comm(g, node, vec, p->commSize[comm]);
   return g_attr_lambda * cos;
 }
 
@@ -169,6 +348,8 @@ void freeLouvainPartition(louvainPartition *p) {
   free(p->node2Community);
   free(p->commSize);
   free(p->attrSums);
+  free(p->attrNorm2);
+  free(p->commNorm2);
   free(p);
 }
 
@@ -179,16 +360,18 @@ louvainPartition *createLouvainPartition(adjlist *g) {
   louvainPartition *p = malloc(sizeof(louvainPartition));
   p->size = g->n;
 
-  p->node2Community = malloc(p->size * sizeof(unsigned long));
-  p->in = malloc(p->size * sizeof(long double));
-  p->tot = malloc(p->size * sizeof(long double));
+  p->node2Community = malloc(p->size * sizeof(node_t));
+  p->in = malloc(p->size * sizeof(weight_t));
+  p->tot = malloc(p->size * sizeof(weight_t));
 
-  p->neighCommWeights = malloc(p->size * sizeof(long double));
-  p->neighCommPos = malloc(p->size * sizeof(unsigned long));
+  p->neighCommWeights = malloc(p->size * sizeof(weight_t));
+  p->neighCommPos = malloc(p->size * sizeof(node_t));
   p->neighCommNb = 0;
 
   p->commSize = calloc(p->size, sizeof(unsigned long));
-  p->attrSums = (d == 0) ? NULL : calloc(p->size * d, sizeof(long double));
+  p->attrSums = (d == 0) ? NULL : calloc(p->size * d, sizeof(attrsum_t));
+  p->attrNorm2 = (d == 0) ? NULL : malloc(p->size * sizeof(weight_t));
+  p->commNorm2 = (d == 0) ? NULL : calloc(p->size, sizeof(weight_t));
 
   for (i = 0; i < p->size; i++) {
     p->node2Community[i] = i;
@@ -197,19 +380,26 @@ louvainPartition *createLouvainPartition(adjlist *g) {
     p->neighCommWeights[i] = -1;
     p->neighCommPos[i] = 0;
     p->commSize[i] = 1;
+    if (p->attrNorm2 != NULL) {
+      p->attrNorm2[i] = attr_node_norm2(g, i);
+    }
     attr_insert_node(p, g, i, i);
   }
+  p->q = 0.0;
+  for (i = 0; i < p->size; i++) {
+    p->q += commTerm(p, g, i);
+  }
 
   return p;
 }
 
-long double modularity(louvainPartition *p, adjlist *g) {
-  long double q = 0.0L;
-  long double m2 = g->totalWeight;
+weight_t modularity(louvainPartition *p, adjlist *g) {
+  weight_t q = 0.0;
+  weight_t m2 = g->totalWeight;
   unsigned long i;
 
   for (i = 0; i < p->size; i++) {
-    if (p->tot[i] > 0.0L) {
+    if (p->tot[i] > 0.0) {
       q += p->in[i] - (p->tot[i] * p->tot[i]) / m2;
     }
   }
@@ -227,19 +417,19 @@ void neighCommunitiesInit(louvainPartition *p) {
 void neighCommunities(louvainPartition *p, adjlist *g, unsigned long node) {
   unsigned long long i;
   unsigned long neigh, neighComm;
-  long double neighW;
+  weight_t neighW;
   p->neighCommPos[0] = p->node2Community[node];
-  p->neighCommWeights[p->neighCommPos[0]] = 0.0L;
+  p->neighCommWeights[p->neighCommPos[0]] = 0.0;
   p->neighCommNb = 1;
 
   for (i = g->cd[node]; i < g->cd[node + 1]; i++) {
     neigh = g->adj[i];
     neighComm = p->node2Community[neigh];
-    neighW = (g->weights == NULL) ? 1.0L : g->weights[i];
+    neighW = (g->weights == NULL) ? 1.0 : g->weights[i];
     if (neigh != node) {
       if (p->neighCommWeights[neighComm] == -1) {
         p->neighCommPos[p->neighCommNb] = neighComm;
-        p->neighCommWeights[neighComm] = 0.0L;
+        p->neighCommWeights[neighComm] = 0.0;
         p->neighCommNb++;
       }
       p->neighCommWeights[neighComm] += neighW;
@@ -250,16 +440,16 @@ void neighCommunities(louvainPartition *p, adjlist *g, unsigned long node) {
 void neighCommunitiesAll(louvainPartition *p, adjlist *g, unsigned long node) {
   unsigned long long i;
   unsigned long neigh, neighComm;
-  long double neighW;
+  weight_t neighW;
 
   for (i = g->cd[node]; i < g->cd[node + 1]; i++) {
     neigh = g->adj[i];
     neighComm = p->node2Community[neigh];
-    neighW = (g->weights == NULL) ? 1.0L : g->weights[i];
+    neighW = (g->weights == NULL) ? 1.0 : g->weights[i];
 
     if (p->neighCommWeights[neighComm] == -1) {
       p->neighCommPos[p->neighCommNb] = neighComm;
-      p->neighCommWeights[neighComm] = 0.0L;
+      p->neighCommWeights[neighComm] = 0.0;
       p->neighCommNb++;
     }
     p->neighCommWeights[neighComm] += neighW;
@@ -283,174 +473,505 @@ unsigned long updatePartition(louvainPartition *p, unsigned long *part, unsigned
   return last - 1;
 }
 
+/* Nodes grouped by community with a counting sort: the nodes of community c
+   are order[start[c]..start[c+1]), in increasing index. */
+static node_t *communityOrder(node_t *part, unsigned long size, unsigned long ncomm, unsigned long *start) {
+  unsigned long i;
+  node_t *order = malloc(size * sizeof(node_t));
+
+  memset(start, 0, (ncomm + 1) * sizeof(unsigned long));
+  for (i = 0; i < size; i++) {
+    start[part[i] + 1]++;
+  }
+  for (i = 0; i < ncomm; i++) {
+    start[i + 1] += start[i];
+  }
+  for (i = 0; i < size; i++) {
+    order[start[part[i]]++] = i;
+  }
+  for (i = ncomm; i > 0; i--) {
+    start[i] = start[i - 1];
+  }
+  start[0] = 0;
+  return order;
+}
+
 adjlist* louvainPartition2Graph(louvainPartition *p, adjlist *g) {
-  unsigned long node, i, j;
+  unsigned long node, c, i, j, last = 0;
+  unsigned long long k;
   unsigned long *renumber = malloc(g->n * sizeof(unsigned long));
   for (node = 0; node < g->n; node++) {
-    renumber[node] = 0;
+    renumber[node] = (unsigned long)-1;
   }
-  unsigned long last = 1;
   for (node = 0; node < g->n; node++) {
-    if (renumber[p->node2Community[node]] == 0) {
+    if (renumber[p->node2Community[node]] == (unsigned long)-1) {
       renumber[p->node2Community[node]] = last++;
     }
   }
   for (node = 0; node < g->n; node++) {
-    p->node2Community[node] = renumber[p->node2Community[node]] - 1;
+    p->node2Community[node] = renumber[p->node2Community[node]];
   }
 
-  unsigned long *order = mySort(p->node2Community, g->n);
+  unsigned long *start = malloc((last + 1) * sizeof(unsigned long));
+  node_t *order = communityOrder(p->node2Community, g->n, last, start);
   adjlist *res = malloc(sizeof(adjlist));
-  unsigned long long e1 = NLINKS2;
-  res->n = last - 1;
-  res->e = 0;
-  res->cd = calloc((1 + res->n), sizeof(unsigned long long));
+  res->n = last;
+  res->cd = malloc((1 + res->n) * sizeof(unsigned long long));
   res->cd[0] = 0;
-  res->adj = malloc(NLINKS2 * sizeof(unsigned long));
-  res->totalWeight = 0.0L;
-  res->weights = malloc(NLINKS2 * sizeof(long double));
+  res->totalWeight = 0.0;
   res->map = NULL;
 
-  neighCommunitiesInit(p);
-  unsigned long oldComm = p->node2Community[order[0]];
-  unsigned long currentComm = oldComm;
-
-  for (i = 0; i <= p->size; i++) {
-    node = (i == p->size) ? 0 : order[i];
-    currentComm = (i == p->size) ? (currentComm + 1) : p->node2Community[order[i]];
-
-    if (oldComm != currentComm) {
-      res->cd[oldComm + 1] = res->cd[oldComm] + p->neighCommNb;
-
-      for (j = 0; j < p->neighCommNb; j++) {
-        unsigned long neighComm = p->neighCommPos[j];
-        long double neighCommWeight = p->neighCommWeights[p->neighCommPos[j]];
-
-        res->adj[res->e] = neighComm;
-        res->weights[res->e] = neighCommWeight;
-        res->totalWeight += neighCommWeight;
-        (res->e)++;
-
-        if (res->e == e1) {
-          e1 *= 2;
-          res->adj = realloc(res->adj, e1 * sizeof(unsigned long));
-          res->weights = realloc(res->weights, e1 * sizeof(long double));
-          if (res->adj == NULL || res->weights == NULL) {
-            printf("error during memory allocation\n");
-            exit(1);
-          }
+  /* First pass: count the distinct neighbouring communities of each community,
+     reusing renumber (no longer needed) as a dense "last seen by" marker. */
+  for (c = 0; c < last; c++) {
+    renumber[c] = (unsigned long)-1;
+  }
+  for (c = 0; c < last; c++) {
+    res->cd[c + 1] = res->cd[c];
+    for (i = start[c]; i < start[c + 1]; i++) {
+      node = order[i];
+      for (k = g->cd[node]; k < g->cd[node + 1]; k++) {
+        unsigned long neighComm = p->node2Community[g->adj[k]];
+        if (renumber[neighComm] != c) {
+          renumber[neighComm] = c;
+          res->cd[c + 1]++;
         }
       }
-
-      if (i == p->size) {
-        res->adj = realloc(res->adj, res->e * sizeof(unsigned long));
-        res->weights = realloc(res->weights, res->e * sizeof(long double));
-        free(order);
-        free(renumber);
-        return res;
-      }
-
-      oldComm = currentComm;
-      neighCommunitiesInit(p);
     }
+  }
+  res->e = res->cd[last];
+  res->adj = malloc(res->e * sizeof(node_t));
+  res->weights = malloc(res->e * sizeof(eweight_t));
+  if ((res->e > 0) && (res->adj == NULL || res->weights == NULL)) {
+    printf("error during memory allocation\n");
+    exit(1);
+  }
 
-    neighCommunitiesAll(p, g, node);
+  /* Second pass: merge the edges of each community into the dense
+     neighCommWeights scratch, then write them out in first-seen order. */
+  neighCommunitiesInit(p);
+  for (c = 0; c < last; c++) {
+    for (i = start[c]; i < start[c + 1]; i++) {
+      neighCommunitiesAll(p, g, order[i]);
+    }
+    k = res->cd[c];
+    for (j = 0; j < p->neighCommNb; j++) {
+      unsigned long neighComm = p->neighCommPos[j];
+      weight_t neighCommWeight = p->neighCommWeights[neighComm];
+
+      res->adj[k] = neighComm;
+      res->weights[k] = neighCommWeight;
+      res->totalWeight += neighCommWeight;
+      k++;
+    }
+    neighCommunitiesInit(p);
   }
 
-  printf("bad exit\n");
+  free(start);
+  free(order);
+  free(renumber);
   return res;
 }
 
-long double louvainOneLevel(louvainPartition *p, adjlist *g) {
-  unsigned long nbMoves;
-  long double startModularity = modularity(p, g);
-  long double newModularity = startModularity;
-  long double curModularity;
-  unsigned long i,j,node;
-  unsigned long oldComm,newComm,bestComm;
-  long double degreeW, bestCommW, bestGain, newGain;
+/* louvainPartition2Graph, counted in the coarsening stats of level. */
+static adjlist *coarsen(louvainPartition *p, adjlist *g, unsigned level) {
+  struct timespec t0, t1;
+  adjlist *res;
+  int i = (level < NPASS_STATS) ? level : NPASS_STATS - 1;
+
+  clock_gettime(CLOCK_MONOTONIC, &t0);
+  res = louvainPartition2Graph(p, g);
+  clock_gettime(CLOCK_MONOTONIC, &t1);
+  __atomic_add_fetch(g_coarsen_calls + i, 1, __ATOMIC_RELAXED);
+  __atomic_add_fetch(g_coarsen_nodes + i, g->n, __ATOMIC_RELAXED);
+  __atomic_add_fetch(g_coarsen_edges + i, g->e, __ATOMIC_RELAXED);
+  __atomic_add_fetch(g_coarsen_nsec + i,
+                     (unsigned long long)((t1.tv_sec - t0.tv_sec) * 1000000000LL + (t1.tv_nsec - t0.tv_nsec)),
+                     __ATOMIC_RELAXED);
+  return res;
+}
 
-  do {
-    curModularity = newModularity;
-    nbMoves = 0;
+/* Moves node to the neighbouring community with the best gain (the modularity
+   gain, plus the attribute term when attributed). Returns whether it moved. */
+static int moveNode(louvainPartition *p, adjlist *g, unsigned long node, int attributed) {
+  unsigned long j, oldComm, newComm, bestComm;
+  weight_t degreeW, bestCommW, bestGain, newGain;
 
-    for (i = 0; i < g->n; i++) {
-      node = i;
-      oldComm = p->node2Community[node];
-      degreeW = degreeWeighted(g, node);
+  oldComm = p->node2Community[node];
+  degreeW = degreeWeighted(g, node);
 
-      neighCommunitiesInit(p);
-      neighCommunities(p, g, node);
-
-      removeNode(p, g, node, oldComm, p->neighCommWeights[oldComm]);
-
-      bestComm = oldComm;
-      bestCommW = 0.0L;
-      bestGain = 0.0L;
-      for (j = 0; j < p->neighCommNb; j++) {
-        newComm = p->neighCommPos[j];
-        newGain = gain(p, g, newComm, p->neighCommWeights[newComm], degreeW);
-        if (newGain > bestGain) {
-          bestComm = newComm;
-          bestCommW = p->neighCommWeights[newComm];
-          bestGain = newGain;
-        }
-      }
+  neighCommunitiesInit(p);
+  neighCommunities(p, g, node);
+
+  removeNode(p, g, node, oldComm, p->neighCommWeights[oldComm]);
+
+  bestComm = oldComm;
+  bestCommW = 0.0;
+  bestGain = attributed ? attr_gain(p, g, node, oldComm) : 0.0;
+  for (j = 0; j < p->neighCommNb; j++) {
+    newComm = p->neighCommPos[j];
+    newGain = gain(p, g, newComm, p->neighCommWeights[newComm], degreeW);
+    if (attributed) {
+      newGain += attr_gain(p, g, node, newComm);
+    }
+    if (newGain > bestGain) {
+      bestComm = newComm;
+      bestCommW = p->neighCommWeights[newComm];
+      bestGain = newGain;
+    }
+  }
 
-      insertNode(p, g, node, bestComm, bestCommW);
-      if (bestComm != oldComm) {
-        nbMoves++;
-      }
+  insertNode(p, g, node, bestComm, bestCommW);
+  return bestComm != oldComm;
+}
+
+typedef struct {
+  weight_t *w;
+  node_t *pos;
+  unsigned long nb;
+} neighScratch;
+
+/* Same as neighCommunities, into caller-owned arrays. */
+static void neighCommunitiesScratch(louvainPartition *p, adjlist *g, unsigned long node, neighScratch *sc) {
+  unsigned long long i;
+  unsigned long neigh, neighComm;
+
+  for (i = 0; i < sc->nb; i++) {
+    sc->w[sc->pos[i]] = -1;
+  }
+  sc->pos[0] = p->node2Community[node];
+  sc->w[sc->pos[0]] = 0.0;
+  sc->nb = 1;
+  for (i = g->cd[node]; i < g->cd[node + 1]; i++) {
+    neigh = g->adj[i];
+    if (neigh == node) {
+      continue;
+    }
+    neighComm = p->node2Community[neigh];
+    if (sc->w[neighComm] == -1) {
+      sc->pos[sc->nb++] = neighComm;
+      sc->w[neighComm] = 0.0;
     }
+    sc->w[neighComm] += (g->weights == NULL) ? 1.0 : g->weights[i];
+  }
+}
 
-    newModularity = modularity(p, g);
-  } while (nbMoves > 0 && newModularity - curModularity > MIN_IMPROVEMENT);
+/* attr_gain of node for comm, as if node had been removed from its own
+   community (own set) without touching the partition. */
+static weight_t attr_gain_snapshot(louvainPartition *p, adjlist *g, unsigned long node, unsigned long comm, int own) {
+  if (g_attr_lambda <= 0.0 || attr_dim() == 0 || p->attrSums == NULL) {
+    return 0.0;
+  }
+  if (p->commSize[comm] == (own ? 1 : 0)) {
+    return 0.0;
+  }
+  weight_t nx = p->attrNorm2[node];
+  weight_t nc = p->commNorm2[comm];
+  if (nx <= 0.0 || (!own && nc <= 0.0)) {
+    return 0.0;
+  }
+  weight_t dot = node_dot(g, node, p->attrSums + comm * attr_dim());
+  if (own) {
+    nc += nx - 2.0 * dot;
+    dot -= nx;
+    if (nc <= 0.0) {
+      return 0.0;
+    }
+  }
+  weight_t cos = dot / wsqrt(nx * nc);
+  if (cos > 1.0) {
+    cos = 1.0;
+  } else if (cos < -1.0) {
+    cos = -1.0;
+  }
+  return g_attr_lambda * cos;
+}
 
-  return newModularity - startModularity;
+/* Best community for node against the current partition, which is only read,
+   so several nodes can be evaluated at once. Same choice rule as moveNode. */
+static unsigned long bestCommunity(louvainPartition *p, adjlist *g, unsigned long node, int attributed, neighScratch *sc) {
+  unsigned long j, c, oldComm = p->node2Community[node], bestComm = oldComm;
+  weight_t degreeW = degreeWeighted(g, node), m2 = g->totalWeight;
+  weight_t totc, newGain, bestGain;
+
+  neighCommunitiesScratch(p, g, node, sc);
+  bestGain = attributed ? attr_gain_snapshot(p, g, node, oldComm, 1) : 0.0;
+  for (j = 0; j < sc->nb; j++) {
+    c = sc->pos[j];
+    totc = p->tot[c] - ((c == oldComm) ? degreeW : 0.0);
+    newGain = sc->w[c] - totc * degreeW / m2;
+    if (attributed) {
+      newGain += attr_gain_snapshot(p, g, node, c, c == oldComm);
+    }
+    if (newGain > bestGain) {
+      bestComm = c;
+      bestGain = newGain;
+    }
+  }
+  return bestComm;
+}
+
+/* Applies a move chosen on an older snapshot if it still beats staying. */
+static int applyMove(louvainPartition *p, adjlist *g, unsigned long node, unsigned long target, int attributed) {
+  unsigned long oldComm = p->node2Community[node];
+  weight_t degreeW = degreeWeighted(g, node);
+  weight_t wOld, wNew, gOld, gNew;
+
+  neighCommunitiesInit(p);
+  neighCommunities(p, g, node);
+  wOld = p->neighCommWeights[oldComm];
+  wNew = (p->neighCommWeights[target] < 0.0) ? 0.0 : p->neighCommWeights[target];
+  removeNode(p, g, node, oldComm, wOld);
+  gOld = gain(p, g, oldComm, wOld, degreeW);
+  gNew = gain(p, g, target, wNew, degreeW);
+  if (attributed) {
+    gOld += attr_gain(p, g, node, oldComm);
+    gNew += attr_gain(p, g, node, target);
+  }
+  if (gNew > gOld) {
+    insertNode(p, g, node, target, wNew);
+    return 1;
+  }
+  insertNode(p, g, node, oldComm, wOld);
+  return 0;
+}
+
+typedef struct {
+  louvainPartition *p;
+  adjlist *g;
+  int attributed;
+  unsigned nthreads;
+  unsigned long start;
+  unsigned long len;
+  unsigned long *target;
+  int pass;
+  int stop;
+  pthread_barrier_t ready;
+  pthread_barrier_t done;
+} syncTeam;
+
+typedef struct {
+  syncTeam *team;
+  unsigned id;
+  neighScratch sc;
+} syncWorker;
+
+static void evalSlice(syncWorker *w) {
+  syncTeam *t = w->team;
+  unsigned long k, lo = t->len * w->id / t->nthreads, hi = t->len * (w->id + 1) / t->nthreads;
+  g_attr_pass = t->attributed ? t->pass : -1;
+  for (k = lo; k < hi; k++) {
+    t->target[k] = bestCommunity(t->p, t->g, t->start + k, t->attributed, &w->sc);
+  }
+}
+
+static void *syncWorkerLoop(void *arg) {
+  syncWorker *w = arg;
+  syncTeam *t = w->team;
+  for (;;) {
+    pthread_barrier_wait(&t->ready);
+    if (t->stop) {
+      break;
+    }
+    evalSlice(w);
+    pthread_barrier_wait(&t->done);
+  }
+  g_attr_pass = -1;
+  fold_pass_stats();
+  return NULL;
 }
 
-long double louvainOneLevelAttributed(louvainPartition *p, adjlist *g) {
-  unsigned long nbMoves;
-  unsigned long i, j, node;
-  unsigned long oldComm, newComm, bestComm;
-  long double degreeW, bestCommW, bestGain, newGain;
+/* Bucketed synchronous local moving: the nodes of each SYNC_BUCKET-sized
+   bucket pick their best community in parallel against the same snapshot,
+   then the moves are applied in index order, each one only if it still
+   improves on staying. The result does not depend on the thread count, so
+   the team takes only the threads left spare by the build pool. */
+static weight_t localMovingSync(louvainPartition *p, adjlist *g, int attributed) {
+  weight_t m2 = g->totalWeight;
+  weight_t startModularity = p->q / m2;
+  weight_t newModularity = startModularity;
+  weight_t curModularity;
+  unsigned maxPasses = g_lm_max_passes;
+  unsigned nthreads = (g->n >= 2 * SYNC_BUCKET) ? 1 + claimSyncThreads(g_lm_threads - 1) : 1;
+  unsigned long i, k, nbMoves;
+  unsigned pass = 0, w;
+  syncTeam team;
+  syncWorker *workers = malloc(nthreads * sizeof(syncWorker));
+  pthread_t *tid = malloc(nthreads * sizeof(pthread_t));
+
+  team.p = p;
+  team.g = g;
+  team.attributed = attributed;
+  team.nthreads = nthreads;
+  team.target = malloc(SYNC_BUCKET * sizeof(unsigned long));
+  team.stop = 0;
+  for (w = 0; w < nthreads; w++) {
+    workers[w].team = &team;
+    workers[w].id = w;
+    workers[w].sc.nb = 0;
+    if (w == 0) {
+      workers[w].sc.w = p->neighCommWeights;
+      workers[w].sc.pos = p->neighCommPos;
+      neighCommunitiesInit(p);
+      continue;
+    }
+    workers[w].sc.w = malloc(p->size * sizeof(weight_t));
+    workers[w].sc.pos = malloc(p->size * sizeof(node_t));
+    for (i = 0; i < p->size; i++) {
+      workers[w].sc.w[i] = -1;
+    }
+  }
+  if (nthreads > 1) {
+    pthread_barrier_init(&team.ready, NULL, nthreads);
+    pthread_barrier_init(&team.done, NULL, nthreads);
+    for (w = 1; w < nthreads; w++) {
+      pthread_create(tid + w, NULL, syncWorkerLoop, workers + w);
+    }
+  }
 
   do {
+    curModularity = newModularity;
     nbMoves = 0;
+    g_pass = (pass < NPASS_STATS) ? pass : NPASS_STATS - 1;
+    team.pass = g_pass;
+    pass++;
+
+    for (team.start = 0; team.start < g->n; team.start += SYNC_BUCKET) {
+      team.len = (g->n - team.start < SYNC_BUCKET) ? g->n - team.start : SYNC_BUCKET;
+      if (nthreads > 1) {
+        pthread_barrier_wait(&team.ready);
+      }
+      evalSlice(workers);
+      if (nthreads > 1) {
+        pthread_barrier_wait(&team.done);
+      }
+      /* The main thread's scratch is the partition's own neighbour arrays. */
+      p->neighCommNb = workers[0].sc.nb;
+      g_attr_pass = attributed ? team.pass : -1;
+      for (k = 0; k < team.len; k++) {
+        if (team.target[k] != p->node2Community[team.start + k]) {
+          nbMoves += applyMove(p, g, team.start + k, team.target[k], attributed);
+        }
+      }
+      workers[0].sc.nb = p->neighCommNb;
+    }
+
+    g_pass_visits[g_pass] += g->n;
+    g_pass_moves[g_pass] += nbMoves;
+    newModularity = p->q / m2;
+  } while (nbMoves > 0 && (attributed || newModularity - curModularity > MIN_IMPROVEMENT) &&
+           (maxPasses == 0 || pass < maxPasses));
+
+  if (nthreads > 1) {
+    team.stop = 1;
+    pthread_barrier_wait(&team.ready);
+    for (w = 1; w < nthreads; w++) {
+      pthread_join(tid[w], NULL);
+      free(workers[w].sc.w);
+      free(workers[w].sc.pos);
+    }
+    pthread_barrier_destroy(&team.ready);
+    pthread_barrier_destroy(&team.done);
+    local_moving_threads_busy(-(long)(nthreads - 1));
+  }
+  g_pass = -1;
+  g_attr_pass = -1;
+  fold_pass_stats();
+  free(team.target);
+  free(workers);
+  free(tid);
+  return newModularity - startModularity;
+}
 
+/* Local moving until no node moves, the modularity gain of a pass is at most
+   MIN_IMPROVEMENT (not checked when attributed, as the attribute term is not
+   part of it), or the max_passes cap of the partition spec is hit (0 for no
+   cap). A sweep visits every node in index
+   order on each pass. In active-set mode the first pass is a sweep, and later
+   passes visit only the queued neighbours, in another community, of nodes
+   that moved. */
+static weight_t localMoving(louvainPartition *p, adjlist *g, int attributed) {
+  weight_t m2 = g->totalWeight;
+  weight_t startModularity = p->q / m2;
+  weight_t newModularity = startModularity;
+  weight_t curModularity;
+  unsigned maxPasses = g_lm_max_passes;
+  unsigned long i, v, c, node, nbMoves, nvisit = g->n, head = 0, len = g->n;
+  unsigned long long j;
+  node_t *queue = NULL;
+  char *queued = NULL;
+  unsigned pass = 0;
+
+  if (g_lm_mode == LM_SYNC) {
+    return localMovingSync(p, g, attributed);
+  }
+  if (g_lm_mode == LM_ACTIVE) {
+    queue = malloc(g->n * sizeof(node_t));
+    queued = malloc(g->n);
     for (i = 0; i < g->n; i++) {
-      node = i;
-      oldComm = p->node2Community[node];
-      degreeW = degreeWeighted(g, node);
+      queue[i] = i;
+      queued[i] = 1;
+    }
+  }
 
-      neighCommunitiesInit(p);
-      neighCommunities(p, g, node);
-
-      removeNode(p, g, node, oldComm, p->neighCommWeights[oldComm]);
-
-      bestComm = oldComm;
-      bestCommW = 0.0L;
-      bestGain = attr_gain(p, g, node, oldComm);
-
-      for (j = 0; j < p->neighCommNb; j++) {
-        newComm = p->neighCommPos[j];
-        newGain = gain(p, g, newComm, p->neighCommWeights[newComm], degreeW);
-        newGain += attr_gain(p, g, node, newComm);
-        if (newGain > bestGain) {
-          bestComm = newComm;
-          bestCommW = p->neighCommWeights[newComm];
-          bestGain = newGain;
+  do {
+    curModularity = newModularity;
+    nbMoves = 0;
+    g_pass = (pass < NPASS_STATS) ? pass : NPASS_STATS - 1;
+    g_attr_pass = attributed ? g_pass : -1;
+    pass++;
+
+    for (i = 0; i < nvisit; i++) {
+      if (queue == NULL) {
+        node = i;
+      } else {
+        node = queue[head];
+        head = (head + 1 == g->n) ? 0 : head + 1;
+        len--;
+        queued[node] = 0;
+      }
+      if (!moveNode(p, g, node, attributed)) {
+        continue;
+      }
+      nbMoves++;
+      if (queue == NULL) {
+        continue;
+      }
+      c = p->node2Community[node];
+      for (j = g->cd[node]; j < g->cd[node + 1]; j++) {
+        v = g->adj[j];
+        if (!queued[v] && p->node2Community[v] != c) {
+          queue[(head + len) % g->n] = v;
+          queued[v] = 1;
+          len++;
         }
       }
+    }
 
-      insertNode(p, g, node, bestComm, bestCommW);
-      if (bestComm != oldComm) {
-        nbMoves++;
-      }
+    g_pass_visits[g_pass] += nvisit;
+    g_pass_moves[g_pass] += nbMoves;
+    if (queue != NULL) {
+      nvisit = len;
     }
-  } while (nbMoves > 0);
+    newModularity = p->q / m2;
+  } while (nbMoves > 0 && nvisit > 0 && (attributed || newModularity - curModularity > MIN_IMPROVEMENT) &&
+           (maxPasses == 0 || pass < maxPasses));
+
+  g_pass = -1;
+  g_attr_pass = -1;
+  fold_pass_stats();
+  free(queue);
+  free(queued);
+  return newModularity - startModularity;
+}
+
+weight_t louvainOneLevel(louvainPartition *p, adjlist *g) {
+  return localMoving(p, g, 0);
+}
 
-  return 0.0L;
+weight_t louvainOneLevelAttributed(louvainPartition *p, adjlist *g) {
+  localMoving(p, g, 1);
+  return 0.0;
 }
 
 unsigned long louvain(adjlist *g, unsigned long *lab) {
@@ -471,7 +992,8 @@ unsigned long louvainComplete(adjlist *g, unsigned long *lab) {
   adjlist *g2;
   unsigned long n, i;
   unsigned long originalSize = g->n;
-  long double improvement;
+  unsigned level = 0;
+  weight_t improvement;
   for (i = 0; i < g->n; i++) {
     lab[i] = i;
   }
@@ -486,7 +1008,7 @@ unsigned long louvainComplete(adjlist *g, unsigned long *lab) {
       break;
     }
 
-    g2 = louvainPartition2Graph(gp, g);
+    g2 = coarsen(gp, g, level++);
     if (g->n < originalSize) {
       free_adjlist2(g);
     }
@@ -527,14 +1049,10 @@ unsigned long labprop(adjlist *g,unsigned long *lab) {
   unsigned long n=g->n,i,k,u,nl,l,lmax,nmax,nlab;
   unsigned long long j;
   bool b;
-  static unsigned long *tab=NULL,*list=NULL,*nodes=NULL,*new=NULL;
-
-  if (tab==NULL){
-    tab=calloc(n,sizeof(unsigned long));
-    list=malloc(n*sizeof(unsigned long));
-    nodes=malloc(n*sizeof(unsigned long));
-    new=malloc(n*sizeof(unsigned long));
-  }
+  unsigned long *tab=calloc(n,sizeof(unsigned long));
+  unsigned long *list=malloc(n*sizeof(unsigned long));
+  unsigned long *nodes=malloc(n*sizeof(unsigned long));
+  unsigned long *new=malloc(n*sizeof(unsigned long));
 
   for (i=0;i<n;i++) {
     lab[i]=i;
@@ -581,5 +1099,9 @@ unsigned long labprop(adjlist *g,unsigned long *lab) {
     lab[i]=new[l];
   }
 
+  free(tab);
+  free(list);
+  free(nodes);
+  free(new);
   return nlab;
 }
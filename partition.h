@@ -11,6 +11,14 @@
 
 #define K 5
 #define MIN_IMPROVEMENT 0.005
+#define NPASS_STATS 16
+
+#define LM_SWEEP 0
+#define LM_ACTIVE 1
+#define LM_SYNC 2
+/* Nodes evaluated against one snapshot in LM_SYNC mode. Fixed, so that the
+   result does not depend on the thread count. */
+#define SYNC_BUCKET 4096
 
 typedef unsigned long (*partition)(adjlist*,unsigned long*);
 
@@ -21,28 +29,39 @@ unsigned long louvainComplete(adjlist *g, unsigned long *lab);
 unsigned long louvainAttributed(adjlist *g, unsigned long *lab);
 
 void set_attr_louvain_weight(long double lambda);
+void print_attr_stats(void);
+void print_pass_stats(void);
+void print_coarsen_stats(void);
+void set_local_moving(int mode, unsigned max_passes);
+/* Sets the thread budget shared by the build pool and LM_SYNC teams. Pool
+   workers mark themselves busy while they run a task; a team uses the rest. */
+void set_local_moving_threads(unsigned threads);
+void local_moving_threads_busy(long delta);
 
 typedef struct {
   unsigned long size;
-  unsigned long *node2Community;
-  long double *in;
-  long double *tot;
+  node_t *node2Community;
+  weight_t *in;
+  weight_t *tot;
+  weight_t q; /* sum of the community terms of modularity, times totalWeight */
 
-  long double *neighCommWeights;
-  unsigned long *neighCommPos;
+  weight_t *neighCommWeights;
+  node_t *neighCommPos;
   unsigned long neighCommNb;
 
   unsigned long *commSize;
-  long double *attrSums;
+  attrsum_t *attrSums;
+  weight_t *attrNorm2;
+  weight_t *commNorm2;
 } louvainPartition;
 
 void freeLouvainPartition(louvainPartition *p);
 louvainPartition *createLouvainPartition(adjlist *g);
-long double modularity(louvainPartition *p, adjlist *g);
+weight_t modularity(louvainPartition *p, adjlist *g);
 void neighCommunities(louvainPartition *p, adjlist *g, unsigned long node);
 adjlist* louvainPartition2Graph(louvainPartition *p, adjlist *g);
-long double louvainOneLevel(louvainPartition *p, adjlist *g);
-long double louvainOneLevelAttributed(louvainPartition *p, adjlist *g);
+weight_t louvainOneLevel(louvainPartition *p, adjlist *g);
+weight_t louvainOneLevelAttributed(louvainPartition *p, adjlist *g);
 
 void shuff(unsigned long, unsigned long*);
 unsigned long labprop(adjlist*,unsigned long*);
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+DEFAULT_DATASETS = [
+    ("cora", "data/real/cora/edgelist.txt", "data/real/cora/attributes.txt", "data/real/cora/labels.txt"),
+    ("blogcatalog", "data/real/blogcatalog/edgelist.txt", "data/real/blogcatalog/attributes.txt",
+     "data/real/blogcatalog/labels.txt"),
+]
+
+
+def read_edges(path):
+    edges = np.loadtxt(path, dtype=np.int64, ndmin=2)[:, :2]
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    edges = np.sort(edges, axis=1)
+    return np.unique(edges, axis=0)
+
+
+def hierarchy_stats(path):
+    """Tree shape of a text hierarchy and the top-level part of every node."""
+    top = {}
+    branch = -1
+    nrec = nleaf = maxdepth = 0
+    depth_sum = members = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            h = int(parts[0])
+            nrec += 1
+            maxdepth = max(maxdepth, h)
+            if h == 1:
+                branch += 1
+            if parts[1] == "1":
+                nleaf += 1
+                ids = parts[3:]
+                depth_sum += h * len(ids)
+                members += len(ids)
+                for u in ids:
+                    top[int(u)] = max(branch, 0)
+    return {
+        "tree_nodes": nrec,
+        "leaves": nleaf,
+        "top_parts": branch + 1,
+        "max_depth": maxdepth,
+        "mean_depth": depth_sum / max(members, 1),
+    }, top
+
+
+def modularity(edges, top):
+    src = np.array([top.get(int(u), -1) for u in edges[:, 0]], dtype=np.int64)
+    dst = np.array([top.get(int(v), -1) for v in edges[:, 1]], dtype=np.int64)
+    m = float(len(edges))
+    if m == 0:
+        return 0.0
+    k = max(src.max(), dst.max()) + 2
+    inside = np.bincount(src[src == dst] + 1, minlength=k).astype(np.float64)
+    tot = (np.bincount(src + 1, minlength=k) + np.bincount(dst + 1, minlength=k)).astype(np.float64)
+    return float(np.sum(inside / m - (tot / (2.0 * m)) ** 2))
+
+
+def build(args, edgelist, attributes, partition, out):
+    best = None
+    for _ in range(args.reps):
+        t0 = time.time()
+        subprocess.run(["./recpart_attr", edgelist, str(out), attributes, str(args.lam), partition],
+                       check=True, stdout=subprocess.DEVNULL)
+        t = time.time() - t0
+        best = t if best is None else min(best, t)
+    return best
+
+
+def accuracy(args, hier, attributes, labels, vec):
+    subprocess.run(["./hi2vec_attr", str(args.dim), str(args.a), str(args.beta), str(hier), attributes, str(vec),
+                    "txt", "dense", str(args.seed)], check=True, stdout=subprocess.DEVNULL)
+    out = subprocess.run(["python3", "scripts/eval_node_classification.py", "--vectors", str(vec),
+                          "--labels", labels], check=True, capture_output=True, text=True).stdout
+    for line in out.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0] == "accuracy_mean":
+            return float(parts[1])
+    return float("nan")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Build time, tree shape and accuracy of attributed partitions")
+    ap.add_argument("--dataset", nargs=4, action="append", metavar=("NAME", "EDGELIST", "ATTRIBUTES", "LABELS"))
+    ap.add_argument("--partitions", default="4,4:active")
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--eval", action="store_true", help="also embed with hi2vec_attr and classify nodes")
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--a", type=float, default=0.01)
+    ap.add_argument("--beta", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=42)
+    args = ap.parse_args()
+
+    datasets = args.dataset or DEFAULT_DATASETS
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, edgelist, attributes, labels in datasets:
+            edges = read_edges(edgelist)
+            for partition in args.partitions.split(","):
+                prefix = f"{name}_p{partition}"
+                hier = Path(tmp) / f"{prefix}.txt"
+                t = build(args, edgelist, attributes, partition, hier)
+                stats, top = hierarchy_stats(hier)
+                print(f"{prefix}_time_sec {t:.4f}")
+                for k, v in stats.items():
+                    print(f"{prefix}_{k} {v:.3f}" if isinstance(v, float) else f"{prefix}_{k} {v}")
+                print(f"{prefix}_top_modularity {modularity(edges, top):.6f}")
+                if args.eval:
+                    acc = accuracy(args, hier, attributes, labels, Path(tmp) / f"{prefix}.vec")
+                    print(f"{prefix}_accuracy {acc:.4f}")
+
+
+if __name__ == "__main__":
+    main()
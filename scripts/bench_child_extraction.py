@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from bench_compact_graph import peak_rss
+from bench_local_moving_threads import planted_partition
+
+
+EXTRACTION = re.compile(r"Child extraction: (\d+) splits, (\d+) subgraphs, (\d+) allocations, ([\d.]+)s")
+
+
+def run_once(cmd):
+    t0 = time.time()
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return time.time() - t0, EXTRACTION.search(out).groups()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Child subgraph extraction: allocations and time per hierarchy build")
+    ap.add_argument("--graph", action="append", nargs=2, metavar=("NAME", "EDGELIST"))
+    ap.add_argument("--synthetic-nodes", type=int, default=1000000, help="0 to skip the synthetic graph")
+    ap.add_argument("--synthetic-degree", type=int, default=10)
+    ap.add_argument("--synthetic-communities", type=int, default=1000)
+    ap.add_argument("--synthetic-mu", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--partitions", default="1")
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--bin-dir", default=".", help="directory of the recpart build to measure")
+    args = ap.parse_args()
+
+    graphs = args.graph or [("blogcatalog", "data/real/blogcatalog/edgelist.txt")]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_nodes > 0:
+            edges = Path(tmp) / "synthetic.txt"
+            planted_partition(edges, args.synthetic_nodes, args.synthetic_degree, args.synthetic_communities,
+                              args.synthetic_mu, args.seed)
+            graphs.append((f"synthetic{args.synthetic_nodes}", str(edges)))
+
+        for name, graph in graphs:
+            for partition in args.partitions.split(","):
+                cmd = [os.path.join(args.bin_dir, "recpart"), graph, str(Path(tmp) / "hier.txt"), partition, "txt",
+                       str(args.threads)]
+                runs = [run_once(cmd) for _ in range(args.reps)]
+                splits, subgraphs, allocs, _ = runs[0][1]
+                prefix = f"{name}_p{partition}"
+                print(f"{prefix}_splits {splits}")
+                print(f"{prefix}_subgraphs {subgraphs}")
+                print(f"{prefix}_allocations {allocs}")
+                print(f"{prefix}_extraction_sec {min(float(r[1][3]) for r in runs):.4f}")
+                print(f"{prefix}_time_sec {min(r[0] for r in runs):.4f}")
+                print(f"{prefix}_peak_rss_mb {peak_rss(cmd):.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+import argparse
+import os
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+
+from bench_local_moving_threads import planted_partition
+
+
+COARSEN = re.compile(r"Coarsening level (\d+)\+?: (\d+) graphs, (\d+) nodes, (\d+) edges, ([\d.]+)s")
+
+
+def coarsening(cmd):
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return {int(m[0]): tuple(int(x) for x in m[1:4]) + (float(m[4]),) for m in COARSEN.findall(out)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Coarsening (louvainPartition2Graph) time per level of louvainComplete")
+    ap.add_argument("--graph", action="append", nargs=2, metavar=("NAME", "EDGELIST"))
+    ap.add_argument("--synthetic-nodes", type=int, default=1000000, help="0 to skip the synthetic graph")
+    ap.add_argument("--synthetic-degree", type=int, default=10)
+    ap.add_argument("--synthetic-communities", type=int, default=1000)
+    ap.add_argument("--synthetic-mu", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--partition", default="1")
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--bin-dir", default=".", help="directory of the recpart build to measure")
+    args = ap.parse_args()
+
+    graphs = args.graph or [("blogcatalog", "data/real/blogcatalog/edgelist.txt")]
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_nodes > 0:
+            edges = Path(tmp) / "synthetic.txt"
+            planted_partition(edges, args.synthetic_nodes, args.synthetic_degree, args.synthetic_communities,
+                              args.synthetic_mu, args.seed)
+            csr = Path(tmp) / "synthetic.csr"
+            subprocess.run([os.path.join(args.bin_dir, "edge2csr"), str(edges), str(csr)], check=True,
+                           stdout=subprocess.DEVNULL)
+            edges.unlink()
+            graphs.append((f"synthetic{args.synthetic_nodes}", str(csr)))
+
+        for name, graph in graphs:
+            cmd = [os.path.join(args.bin_dir, "recpart"), graph, str(Path(tmp) / "hier.txt"), args.partition, "txt", "1"]
+            runs = [coarsening(cmd) for _ in range(args.reps)]
+            total = 0.0
+            for level in sorted(runs[0]):
+                ngraphs, nodes, edges, _ = runs[0][level]
+                best = min(r[level][3] for r in runs)
+                total += best
+                prefix = f"{name}_level{level}"
+                print(f"{prefix}_graphs {ngraphs}")
+                print(f"{prefix}_nodes {nodes}")
+                print(f"{prefix}_edges {edges}")
+                print(f"{prefix}_coarsen_sec {best:.4f}")
+                print(f"{prefix}_ns_per_edge {1e9 * best / max(edges, 1):.2f}")
+            print(f"{name}_coarsen_total_sec {total:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from bench_local_moving_threads import planted_partition
+
+
+def run_once(cmd):
+    t0 = time.time()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return time.time() - t0
+
+
+def peak_rss(cmd):
+    """Peak RSS (MB), sampled from VmHWM. ru_maxrss of a child would include
+    the RSS of this process at fork time."""
+    p = subprocess.Popen(cmd, stdout=subprocess.DEVNULL)
+    status = Path(f"/proc/{p.pid}/status")
+    hwm = 0
+    while p.poll() is None:
+        try:
+            for line in status.read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    hwm = max(hwm, int(line.split()[1]))
+        except (OSError, ValueError):
+            pass
+        time.sleep(0.005)
+    if p.returncode != 0:
+        raise subprocess.CalledProcessError(p.returncode, cmd)
+    return hwm / 1024.0
+
+
+def digest(path):
+    return hashlib.md5(Path(path).read_bytes()).hexdigest()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Peak RSS and time of the default and compact (32-bit id) builds")
+    ap.add_argument("--graph", action="append", nargs=2, metavar=("NAME", "EDGELIST"))
+    ap.add_argument("--synthetic-nodes", type=int, default=1000000, help="0 to skip the synthetic graph")
+    ap.add_argument("--synthetic-degree", type=int, default=10)
+    ap.add_argument("--synthetic-communities", type=int, default=1000)
+    ap.add_argument("--synthetic-mu", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--attributes", default="", help="if set, use recpart_attr with these attributes")
+    ap.add_argument("--partition", default="", help="default: 4 with attributes, 1 without")
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    ap.add_argument("--threads", type=int, default=1)
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--bin-dir", default=".")
+    args = ap.parse_args()
+
+    graphs = args.graph or [("blogcatalog", "data/real/blogcatalog/edgelist.txt")]
+    partition = args.partition or ("4" if args.attributes else "1")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_nodes > 0:
+            edges = Path(tmp) / "synthetic.txt"
+            planted_partition(edges, args.synthetic_nodes, args.synthetic_degree, args.synthetic_communities,
+                              args.synthetic_mu, args.seed)
+            graphs.append((f"synthetic{args.synthetic_nodes}", str(edges)))
+
+        for name, graph in graphs:
+            ref = None
+            for layout, suffix in (("default", ""), ("compact", "_compact")):
+                hier = Path(tmp) / f"{name}_{layout}.txt"
+                if args.attributes:
+                    cmd = [os.path.join(args.bin_dir, "recpart_attr" + suffix), graph, str(hier), args.attributes,
+                           str(args.lam), partition, "auto", "txt", str(args.threads)]
+                else:
+                    cmd = [os.path.join(args.bin_dir, "recpart" + suffix), graph, str(hier), partition, "txt",
+                           str(args.threads)]
+                best = min(run_once(cmd) for _ in range(args.reps))
+                prefix = f"{name}_{layout}"
+                print(f"{prefix}_time_sec {best:.4f}")
+                print(f"{prefix}_peak_rss_mb {peak_rss(cmd):.1f}")
+                if ref is None:
+                    ref = digest(hier)
+                else:
+                    print(f"{prefix}_identical {int(digest(hier) == ref)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import re
+import subprocess
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+
+FIRST_LEVEL = re.compile(r"first level partition = (\d+)h(\d+)m([\d.]+)s")
+
+
+def planted_partition(path, n, degree, communities, mu, seed):
+    """Edgelist with n nodes, about n*degree/2 edges, a fraction mu of them between communities."""
+    rng = np.random.default_rng(seed)
+    comm = rng.integers(0, communities, size=n)
+    order = np.argsort(comm, kind="stable")
+    start = np.searchsorted(comm[order], np.arange(communities + 1))
+    m = n * degree // 2
+    src = rng.integers(0, n, size=m)
+    inside = rng.random(m) >= mu
+    c = comm[src]
+    size = start[c + 1] - start[c]
+    dst_in = order[start[c] + (rng.random(m) * size).astype(np.int64)]
+    dst = np.where(inside, dst_in, rng.integers(0, n, size=m))
+    keep = src != dst
+    np.savetxt(path, np.stack([src[keep], dst[keep]], axis=1), fmt="%d")
+
+
+def first_level(cmd):
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    h, mnt, s = FIRST_LEVEL.search(out).groups()
+    return 3600 * int(h) + 60 * int(mnt) + float(s)
+
+
+def digest(path):
+    return hashlib.md5(Path(path).read_bytes()).hexdigest()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="First-level partition time against thread count (sync local moving)")
+    ap.add_argument("--graph", action="append", nargs=2, metavar=("NAME", "EDGELIST"))
+    ap.add_argument("--synthetic-nodes", type=int, default=1000000, help="0 to skip the synthetic graph")
+    ap.add_argument("--synthetic-degree", type=int, default=10)
+    ap.add_argument("--synthetic-communities", type=int, default=1000)
+    ap.add_argument("--synthetic-mu", type=float, default=0.2)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--attributes", default="", help="if set, use recpart_attr with these attributes")
+    ap.add_argument("--partition", default="", help="default: 4 with attributes, 1 without")
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    ap.add_argument("--threads", default="1,2,4,8")
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    graphs = args.graph or [("blogcatalog", "data/real/blogcatalog/edgelist.txt")]
+    partition = args.partition or ("4" if args.attributes else "1")
+    threads = [int(x) for x in args.threads.split(",") if x.strip()]
+    print(f"cpus {os.cpu_count()}")
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.synthetic_nodes > 0:
+            edges = Path(tmp) / "synthetic.txt"
+            planted_partition(edges, args.synthetic_nodes, args.synthetic_degree, args.synthetic_communities,
+                              args.synthetic_mu, args.seed)
+            csr = Path(tmp) / "synthetic.csr"
+            subprocess.run(["./edge2csr", str(edges), str(csr)], check=True, stdout=subprocess.DEVNULL)
+            edges.unlink()
+            graphs.append((f"synthetic{args.synthetic_nodes}", str(csr)))
+
+        for name, graph in graphs:
+            runs = [("sweep", 1)] + [("sync", n) for n in threads]
+            base = ref = None
+            for mode, n in runs:
+                hier = Path(tmp) / f"{name}_{mode}_t{n}.txt"
+                spec = partition if mode == "sweep" else f"{partition}:sync"
+                if args.attributes:
+                    cmd = ["./recpart_attr", graph, str(hier), args.attributes, str(args.lam), spec, "auto", "txt",
+                           str(n)]
+                else:
+                    cmd = ["./recpart", graph, str(hier), spec, "txt", str(n)]
+                best = min(first_level(cmd) for _ in range(args.reps))
+                prefix = f"{name}_{mode}_t{n}"
+                print(f"{prefix}_first_level_sec {best:.4f}")
+                if mode == "sync":
+                    if ref is None:
+                        base, ref = best, digest(hier)
+                    print(f"{prefix}_speedup {base / best:.3f}")
+                    print(f"{prefix}_identical {int(digest(hier) == ref)}")
+                hier.unlink()
+
+
+if __name__ == "__main__":
+    main()
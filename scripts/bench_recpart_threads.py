@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+
+def run_once(cmd):
+    t0 = time.time()
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+    return time.time() - t0
+
+
+def digest(path):
+    return hashlib.md5(Path(path).read_bytes()).hexdigest()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Strong-scaling benchmark of the threaded hierarchy build")
+    ap.add_argument("--edgelist", default="data/real/blogcatalog/edgelist.txt")
+    ap.add_argument("--attributes", default=None, help="if set, benchmark recpart_attr instead of recpart")
+    ap.add_argument("--partition", default=None, help="default: 4 with attributes, 1 without")
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    ap.add_argument("--threads", default="1,2,4,8")
+    ap.add_argument("--reps", type=int, default=3)
+    args = ap.parse_args()
+
+    threads = [int(x) for x in args.threads.split(",") if x.strip()]
+    partition = args.partition or ("4" if args.attributes else "1")
+    print(f"cpus {os.cpu_count()}")
+    base = None
+    ref = None
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in threads:
+            hier = str(Path(tmp) / f"hier_t{n}.txt")
+            if args.attributes:
+                cmd = ["./recpart_attr", args.edgelist, hier, args.attributes, str(args.lam), partition,
+                       "auto", "txt", str(n)]
+            else:
+                cmd = ["./recpart", args.edgelist, hier, partition, "txt", str(n)]
+            best = min(run_once(cmd) for _ in range(args.reps))
+            if base is None:
+                base, ref = best, digest(hier)
+            print(f"threads_{n}_time_sec {best:.4f}")
+            print(f"threads_{n}_speedup {base / best:.3f}")
+            print(f"threads_{n}_efficiency {base / best / n:.3f}")
+            print(f"threads_{n}_identical {int(digest(hier) == ref)}")
+
+
+if __name__ == "__main__":
+    main()
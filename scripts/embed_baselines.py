@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 import argparse
 import math
+import multiprocessing as mp
 import random
+import resource
+import time
 from collections import defaultdict
 
+import numpy as np
+
+from embfile import save_binary
+
+SIGMOID_TABLE_SIZE = 1000
+MAX_EXP = 8.0
+
 
 def read_graph(path):
     adj = defaultdict(list)
@@ -65,6 +75,218 @@ def generate_walks(nodes, adj, walk_length, num_walks, method, p, q):
     return walks
 
 
+def read_graph_csr(path):
+    edges = np.loadtxt(path, dtype=np.int64, ndmin=2).reshape(-1, 2)
+    nodes = np.unique(edges)
+    src = np.searchsorted(nodes, np.concatenate([edges[:, 0], edges[:, 1]]))
+    dst = np.searchsorted(nodes, np.concatenate([edges[:, 1], edges[:, 0]]))
+    order = np.lexsort((dst, src))
+    indices = dst[order]
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(nodes)), out=indptr[1:])
+    return nodes, indptr, indices
+
+
+def edge_keys(indptr, indices):
+    n = len(indptr) - 1
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(indptr))
+    return src * n + indices
+
+
+def has_edge(keys, n, u, v):
+    k = u * n + v
+    pos = np.minimum(np.searchsorted(keys, k), len(keys) - 1)
+    return keys[pos] == k
+
+
+def node2vec_weights(keys, n, prev, nxt, p, q):
+    w = np.full(len(nxt), 1.0 / q)
+    w[has_edge(keys, n, prev, nxt)] = 1.0
+    w[nxt == prev] = 1.0 / p
+    return w
+
+
+def segment_cumsum(x, seg):
+    """Inclusive cumulative sum of x restarted at each new value of seg (sorted)."""
+    cs = np.cumsum(x)
+    first = np.searchsorted(seg, seg, side="left")
+    return cs - (cs[first] - x[first])
+
+
+def alias_setup(weights, seg, local):
+    """Alias tables for many distributions at once, as Vose's sweep would build
+    them: weights[i] is entry local[i] of distribution seg[i] (seg sorted).
+    Within a distribution, the deficits of the small entries (scaled weight
+    below 1) and the excesses of the large ones are laid end to end. A small
+    entry is aliased to the large whose excess interval holds the start of its
+    deficit. Large entry t is aliased to large t + 1, which covers the part of
+    a small deficit that runs past the end of its own excess."""
+    nseg = int(seg[-1]) + 1
+    scale = np.bincount(seg, minlength=nseg) / np.bincount(seg, weights=weights, minlength=nseg)
+    prob = weights * scale[seg]
+    alias = local.copy()
+    small = np.flatnonzero(prob < 1.0)
+    large = np.flatnonzero(prob >= 1.0)
+    if len(small) == 0 or len(large) == 0:
+        prob[:] = 1.0
+        return prob, alias
+    d = 1.0 - prob[small]
+    d_end = segment_cumsum(d, seg[small])
+    e_end = segment_cumsum(prob[large] - 1.0, seg[large])
+
+    # Merge small starts and large ends per distribution; on a tie the large
+    # end comes first, so that interval is closed on the right.
+    ns, n = len(small), len(prob)
+    ev_seg = np.concatenate([seg[small], seg[large]])
+    order = np.lexsort((np.arange(n) < ns, np.concatenate([d_end - d, e_end]), ev_seg))
+    ev_seg = ev_seg[order]
+    is_large = order >= ns
+    pos = np.arange(n)
+    prev_small = np.maximum.accumulate(np.where(is_large, -1, pos))
+    prev_large = np.maximum.accumulate(np.where(is_large, pos, -1))
+    next_large = np.minimum.accumulate(np.where(is_large, pos, n)[::-1])[::-1]
+
+    at = pos[~is_large]
+    lg = np.minimum(next_large[at], n - 1)
+    # A start past the last end can only come from rounding: use the last large.
+    lg = np.where((next_large[at] < n) & (ev_seg[lg] == ev_seg[at]), lg, np.maximum(prev_large[at], 0))
+    ok = is_large[lg] & (ev_seg[lg] == ev_seg[at])
+    alias[small[order[at[ok]]]] = local[large[order[lg[ok]] - ns]]
+    prob[small[order[at[~ok]]]] = 1.0
+
+    at = pos[is_large]
+    t = order[at] - ns
+    sm = np.maximum(prev_small[at], 0)
+    straddle = (prev_small[at] >= 0) & (ev_seg[sm] == ev_seg[at])
+    over = np.where(straddle, d_end[np.where(straddle, order[sm], 0)] - e_end[t], 0.0)
+    last = np.append(seg[large][1:] != seg[large][:-1], True)
+    prob[large[t]] = np.where(last[t], 1.0, 1.0 - np.clip(over, 0.0, 1.0))
+    nxt = ~last
+    alias[large[nxt]] = local[large[np.flatnonzero(nxt) + 1]]
+    return prob, alias
+
+
+def build_node2vec_alias(indptr, indices, keys, p, q, chunk_entries=1 << 22):
+    """Alias tables of the node2vec transition from each directed edge
+    (prev, cur), built for about chunk_entries table entries at a time."""
+    n = len(indptr) - 1
+    deg = np.diff(indptr)
+    src = np.repeat(np.arange(n, dtype=np.int64), deg)
+    ptr = np.zeros(len(indices) + 1, dtype=np.int64)
+    np.cumsum(deg[indices], out=ptr[1:])
+    prob = np.empty(ptr[-1], dtype=np.float64)
+    alias = np.empty(ptr[-1], dtype=np.int64)
+    e0 = 0
+    while e0 < len(indices):
+        e1 = max(int(np.searchsorted(ptr, ptr[e0] + chunk_entries, side="right")) - 1, e0 + 1)
+        cur = indices[e0:e1]
+        seg = np.repeat(np.arange(e1 - e0), deg[cur])
+        local = np.arange(ptr[e0], ptr[e1]) - ptr[e0:e1][seg]
+        nxt = indices[indptr[cur][seg] + local]
+        w = node2vec_weights(keys, n, src[e0:e1][seg], nxt, p, q)
+        prob[ptr[e0]:ptr[e1]], alias[ptr[e0]:ptr[e1]] = alias_setup(w, seg, local)
+        e0 = e1
+    return ptr, prob, alias
+
+
+class WalkEngine:
+    def __init__(self, indptr, indices, method, p, q, rng, alias_max_entries):
+        self.indptr = indptr
+        self.indices = indices
+        self.deg = np.diff(indptr)
+        self.n = len(indptr) - 1
+        self.method = method
+        self.p = p
+        self.q = q
+        self.rng = rng
+        self.keys = None
+        self.alias = None
+        if method == "node2vec":
+            self.keys = edge_keys(indptr, indices)
+            if int(np.sum(self.deg[indices])) <= alias_max_entries:
+                self.alias = build_node2vec_alias(indptr, indices, self.keys, p, q)
+            self.w_max = max(1.0 / p, 1.0, 1.0 / q)
+
+    def first_step(self, cur):
+        off = (self.rng.random(len(cur)) * self.deg[cur]).astype(np.int64)
+        return self.indptr[cur] + off
+
+    def second_order_alias(self, edge, cur):
+        ptr, prob, alias = self.alias
+        k = (self.rng.random(len(cur)) * self.deg[cur]).astype(np.int64)
+        j = ptr[edge] + k
+        k = np.where(self.rng.random(len(cur)) < prob[j], k, alias[j])
+        return self.indptr[cur] + k
+
+    def second_order_rejection(self, prev, cur):
+        out = np.empty(len(cur), dtype=np.int64)
+        todo = np.arange(len(cur))
+        while len(todo):
+            cand = self.first_step(cur[todo])
+            w = node2vec_weights(self.keys, self.n, prev[todo], self.indices[cand], self.p, self.q)
+            ok = self.rng.random(len(todo)) * self.w_max < w
+            out[todo[ok]] = cand[ok]
+            todo = todo[~ok]
+        return out
+
+    def walk_batch(self, starts, walk_length):
+        walks = np.empty((len(starts), walk_length), dtype=np.int64)
+        walks[:, 0] = starts
+        edge = None
+        for t in range(1, walk_length):
+            cur = walks[:, t - 1]
+            if t == 1 or self.method == "deepwalk":
+                edge = self.first_step(cur)
+            elif self.alias is not None:
+                edge = self.second_order_alias(edge, cur)
+            else:
+                edge = self.second_order_rejection(walks[:, t - 2], cur)
+            walks[:, t] = self.indices[edge]
+        return walks
+
+    def walks(self, walk_length, num_walks, walk_batch, starts=None):
+        if starts is None:
+            starts = np.arange(self.n)
+        for _ in range(num_walks):
+            order = self.rng.permutation(starts)
+            for b in range(0, len(order), walk_batch):
+                yield self.walk_batch(order[b:b + walk_batch], walk_length)
+
+
+def seed_streams(seed):
+    """Independent seed sequences for the walks and for training (init, pair
+    sampling, negatives and shuffles), so that neither replays the other."""
+    return np.random.SeedSequence(seed).spawn(2)
+
+
+def generate_walks_csr(nodes, indptr, indices, walk_length, num_walks, method, p, q, seed,
+                       walk_batch=10000, alias_max_entries=20000000):
+    engine = WalkEngine(indptr, indices, method, p, q, np.random.default_rng(seed), alias_max_entries)
+    walks = []
+    for chunk in engine.walks(walk_length, num_walks, walk_batch):
+        walks.extend(nodes[chunk].tolist())
+    return walks
+
+
+def benchmark_walks(args):
+    for method in ("deepwalk", "node2vec"):
+        t0 = time.time()
+        if args.walk_engine == "csr":
+            nodes, indptr, indices = read_graph_csr(args.edgelist)
+            engine = WalkEngine(indptr, indices, method, args.p, args.q,
+                                np.random.default_rng(args.seed), args.alias_max_entries)
+            t_setup = time.time() - t0
+            n_walks = sum(len(c) for c in engine.walks(args.walk_length, args.num_walks, args.walk_batch))
+        else:
+            random.seed(args.seed)
+            nodes, adj = read_graph(args.edgelist)
+            t_setup = time.time() - t0
+            n_walks = len(generate_walks(nodes, adj, args.walk_length, args.num_walks, method, args.p, args.q))
+        t_walk = time.time() - t0 - t_setup
+        print(f"{method}_setup_time_sec {t_setup:.6f}")
+        print(f"{method}_walks_per_sec {n_walks / max(t_walk, 1e-9):.1f}")
+
+
 def build_pairs(walks, window, node2idx):
     pairs = []
     for w in walks:
@@ -95,6 +317,18 @@ def sigmoid(x):
     return 1.0 / (1.0 + math.exp(-x))
 
 
+def build_sigmoid_table(size=SIGMOID_TABLE_SIZE, max_exp=MAX_EXP):
+    x = (np.arange(size, dtype=np.float32) * (2.0 / size) - 1.0) * max_exp
+    return (1.0 / (1.0 + np.exp(-x))).astype(np.float32)
+
+
+def fast_sigmoid(x, table, max_exp=MAX_EXP):
+    size = table.shape[0]
+    idx = ((x + max_exp) * (size / (2.0 * max_exp))).astype(np.int64)
+    np.clip(idx, 0, size - 1, out=idx)
+    return table[idx]
+
+
 def build_neg_table(freq, size=200000):
     power = 0.75
     items = list(freq.items())
@@ -150,7 +384,193 @@ def train_skipgram(walks, dim, window, epochs, neg_k, lr, seed):
         v = [W_in[i][j] + W_out[i][j] for j in range(dim)]
         norm = math.sqrt(sum(x * x for x in v)) + 1e-12
         emb.append([x / norm for x in v])
-    return nodes, emb
+    return nodes, emb, len(pairs) * epochs
+
+
+def sgd_batch(W_in, W_out, c, o, negs, alpha, sig_table):
+    ctx = np.concatenate([o[:, None], negs], axis=1)
+    label = np.zeros(ctx.shape, dtype=np.float32)
+    label[:, 0] = 1.0
+
+    vc = W_in[c]
+    vo = W_out[ctx]
+    s = np.einsum("bd,bkd->bk", vc, vo)
+    g = (label - fast_sigmoid(s, sig_table)) * alpha
+    g[:, 1:][negs == o[:, None]] = 0.0
+
+    np.add.at(W_in, c, np.einsum("bk,bkd->bd", g, vo))
+    np.add.at(W_out, ctx.ravel(), (g[:, :, None] * vc[:, None, :]).reshape(-1, W_out.shape[1]))
+
+
+def init_embeddings(n, dim, rng):
+    W_in = ((rng.random((n, dim), dtype=np.float32) - 0.5) / dim).astype(np.float32)
+    W_out = np.zeros((n, dim), dtype=np.float32)
+    return W_in, W_out
+
+
+def normalized_sum(W_in, W_out):
+    emb = W_in + W_out
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+    return emb
+
+
+def sgd_pairs(W_in, W_out, batches, neg_table, neg_k, alpha, sig_table, rng):
+    n_pairs = 0
+    for batch in batches:
+        negs = neg_table[rng.integers(0, len(neg_table), size=(len(batch), neg_k))]
+        sgd_batch(W_in, W_out, batch[:, 0], batch[:, 1], negs, alpha, sig_table)
+        n_pairs += len(batch)
+    return n_pairs
+
+
+def train_skipgram_numpy(walks, dim, window, epochs, neg_k, lr, seed, batch_size):
+    rng = np.random.default_rng(seed)
+    nodes = sorted({u for w in walks for u in w})
+    node2idx = {u: i for i, u in enumerate(nodes)}
+    n = len(nodes)
+
+    freq = defaultdict(int)
+    for w in walks:
+        for u in w:
+            freq[node2idx[u]] += 1
+
+    W_in, W_out = init_embeddings(n, dim, rng)
+
+    pairs = np.asarray(build_pairs(walks, window, node2idx), dtype=np.int64).reshape(-1, 2)
+    neg_table = np.asarray(build_neg_table(freq), dtype=np.int64)
+    sig_table = build_sigmoid_table()
+
+    for ep in range(epochs):
+        order = rng.permutation(len(pairs))
+        alpha = np.float32(lr * (1.0 - ep / max(1, epochs)))
+        batches = (pairs[order[b:b + batch_size]] for b in range(0, len(order), batch_size))
+        sgd_pairs(W_in, W_out, batches, neg_table, neg_k, alpha, sig_table, rng)
+
+    return nodes, normalized_sum(W_in, W_out), len(pairs) * epochs
+
+
+def walk_pairs(chunk, window, rng):
+    win = rng.integers(1, window + 1, size=chunk.shape)
+    out = []
+    for d in range(1, min(window, chunk.shape[1] - 1) + 1):
+        left = chunk[:, :-d]
+        right = chunk[:, d:]
+        m = win[:, :-d] >= d
+        out.append(np.stack([left[m], right[m]], axis=1))
+        m = win[:, d:] >= d
+        out.append(np.stack([right[m], left[m]], axis=1))
+    if not out:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(out)
+
+
+def shuffled_batches(pair_chunks, buffer_size, batch_size, rng):
+    buf = []
+    size = 0
+    for pairs in pair_chunks:
+        buf.append(pairs)
+        size += len(pairs)
+        if size < buffer_size:
+            continue
+        pool = np.concatenate(buf)
+        pool = pool[rng.permutation(len(pool))]
+        buf = []
+        size = 0
+        for b in range(0, len(pool), batch_size):
+            yield pool[b:b + batch_size]
+    if buf:
+        pool = np.concatenate(buf)
+        pool = pool[rng.permutation(len(pool))]
+        for b in range(0, len(pool), batch_size):
+            yield pool[b:b + batch_size]
+
+
+def shared_matrix(n, dim):
+    return np.frombuffer(mp.RawArray("f", n * dim), dtype=np.float32).reshape(n, dim)
+
+
+def stream_epoch(engine, starts, W_in, W_out, neg_table, sig_table, alpha, rng, walk_length, num_walks,
+                 walk_batch, window, neg_k, batch_size, buffer_size):
+    walks = engine.walks(walk_length, num_walks, walk_batch, starts)
+    chunks = (walk_pairs(c, window, rng) for c in walks)
+    batches = shuffled_batches(chunks, buffer_size, batch_size, rng)
+    return sgd_pairs(W_in, W_out, batches, neg_table, neg_k, alpha, sig_table, rng)
+
+
+def hogwild_worker(engine, starts, seed_seq, counts, w, W_in, W_out, neg_table, sig_table, alpha, walk_length,
+                   num_walks, walk_batch, window, neg_k, batch_size, buffer_size):
+    walk_ss, train_ss = seed_seq.spawn(2)
+    engine.rng = np.random.default_rng(walk_ss)
+    rng = np.random.default_rng(train_ss)
+    counts[w] = stream_epoch(engine, starts, W_in, W_out, neg_table, sig_table, alpha, rng, walk_length,
+                             num_walks, walk_batch, window, neg_k, batch_size, buffer_size)
+
+
+def train_skipgram_stream(engine, walk_length, num_walks, walk_batch, dim, window, epochs, neg_k, lr, seed,
+                          batch_size, buffer_size, workers=1):
+    rng = np.random.default_rng(seed)
+    W_in, W_out = init_embeddings(engine.n, dim, rng)
+    if workers > 1:
+        W_in_shared, W_out_shared = shared_matrix(engine.n, dim), shared_matrix(engine.n, dim)
+        W_in_shared[:] = W_in
+        W_out_shared[:] = W_out
+        W_in, W_out = W_in_shared, W_out_shared
+        ctx = mp.get_context("fork")
+        shards = np.array_split(np.arange(engine.n), workers)
+        seeds = seed.spawn(epochs * workers)
+        counts = ctx.RawArray("q", workers)
+
+    freq = dict(enumerate(engine.deg.tolist()))
+    neg_table = np.asarray(build_neg_table(freq), dtype=np.int64)
+    sig_table = build_sigmoid_table()
+
+    n_pairs = 0
+    epoch_times = []
+    for ep in range(epochs):
+        t0 = time.time()
+        alpha = np.float32(lr * (1.0 - ep / max(1, epochs)))
+        if workers > 1:
+            procs = [
+                ctx.Process(
+                    target=hogwild_worker,
+                    args=(engine, shards[w], seeds[ep * workers + w], counts, w,
+                          W_in, W_out, neg_table, sig_table, alpha, walk_length, num_walks, walk_batch,
+                          window, neg_k, batch_size, buffer_size),
+                )
+                for w in range(workers)
+            ]
+            for pr in procs:
+                pr.start()
+            for pr in procs:
+                pr.join()
+                if pr.exitcode != 0:
+                    raise RuntimeError(f"hogwild worker exited with code {pr.exitcode}")
+            n_pairs += sum(counts)
+        else:
+            n_pairs += stream_epoch(engine, None, W_in, W_out, neg_table, sig_table, alpha, rng, walk_length,
+                                    num_walks, walk_batch, window, neg_k, batch_size, buffer_size)
+        epoch_times.append(time.time() - t0)
+
+    return normalized_sum(W_in, W_out), n_pairs, epoch_times
+
+
+def benchmark_workers(args, worker_counts):
+    nodes, indptr, indices = read_graph_csr(args.edgelist)
+    walk_ss, train_ss = seed_streams(args.seed)
+    engine = WalkEngine(indptr, indices, args.method, args.p, args.q,
+                        np.random.default_rng(walk_ss), args.alias_max_entries)
+    base = None
+    for w in worker_counts:
+        _, n_pairs, epoch_times = train_skipgram_stream(
+            engine, args.walk_length, args.num_walks, args.walk_batch, args.dim, args.window, args.epochs,
+            args.neg, args.lr, train_ss, args.batch_size, args.shuffle_buffer, w
+        )
+        t_epoch = sum(epoch_times) / len(epoch_times)
+        if base is None:
+            base = t_epoch
+        print(f"workers_{w}_epoch_time_sec {t_epoch:.6f}")
+        print(f"workers_{w}_pairs_per_sec {n_pairs / max(sum(epoch_times), 1e-9):.1f}")
+        print(f"workers_{w}_speedup {base / max(t_epoch, 1e-9):.3f}")
 
 
 def save_vectors(path, nodes, emb):
@@ -158,15 +578,15 @@ def save_vectors(path, nodes, emb):
         for u, v in zip(nodes, emb):
             f.write(str(u))
             for x in v:
-                f.write(f" {x:.8f}")
+                f.write(f" {float(x):.8f}")
             f.write("\n")
 
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--edgelist", required=True)
-    ap.add_argument("--out", required=True)
-    ap.add_argument("--method", choices=["deepwalk", "node2vec"], required=True)
+    ap.add_argument("--out")
+    ap.add_argument("--method", choices=["deepwalk", "node2vec"])
     ap.add_argument("--dim", type=int, default=128)
     ap.add_argument("--walk-length", type=int, default=40)
     ap.add_argument("--num-walks", type=int, default=10)
@@ -177,13 +597,77 @@ def main():
     ap.add_argument("--p", type=float, default=1.0)
     ap.add_argument("--q", type=float, default=1.0)
     ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--engine", choices=["numpy", "python"], default="numpy")
+    ap.add_argument("--batch-size", type=int, default=1024)
+    ap.add_argument("--walk-engine", choices=["csr", "python"], default="csr")
+    ap.add_argument("--walk-batch", type=int, default=10000)
+    ap.add_argument("--alias-max-entries", type=int, default=20000000)
+    ap.add_argument("--benchmark-walks", action="store_true")
+    ap.add_argument("--materialize-pairs", action="store_true")
+    ap.add_argument("--shuffle-buffer", type=int, default=1000000)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--benchmark-workers", default="")
+    ap.add_argument("--out-format", choices=["txt", "f32", "f16"], default="txt")
     args = ap.parse_args()
 
+    if args.benchmark_walks:
+        benchmark_walks(args)
+        return
+    if args.method is None:
+        ap.error("--method is required unless --benchmark-walks is given")
+    if args.benchmark_workers:
+        benchmark_workers(args, [int(x) for x in args.benchmark_workers.split(",") if x.strip()])
+        return
+    if args.out is None:
+        ap.error("--out is required")
+    if args.workers < 1:
+        ap.error("--workers must be at least 1")
+    if args.workers > 1 and (args.engine != "numpy" or args.walk_engine != "csr" or args.materialize_pairs):
+        ap.error("--workers needs streamed training: --engine numpy, --walk-engine csr, no --materialize-pairs")
+
     random.seed(args.seed)
-    nodes, adj = read_graph(args.edgelist)
-    walks = generate_walks(nodes, adj, args.walk_length, args.num_walks, args.method, args.p, args.q)
-    nodes_out, emb = train_skipgram(walks, args.dim, args.window, args.epochs, args.neg, args.lr, args.seed)
-    save_vectors(args.out, nodes_out, emb)
+    walk_ss, train_ss = seed_streams(args.seed)
+    t0 = time.time()
+    if args.engine == "numpy" and args.walk_engine == "csr" and not args.materialize_pairs:
+        nodes, indptr, indices = read_graph_csr(args.edgelist)
+        engine = WalkEngine(indptr, indices, args.method, args.p, args.q,
+                            np.random.default_rng(walk_ss), args.alias_max_entries)
+        t1 = time.time()
+        emb, n_updates, _ = train_skipgram_stream(
+            engine, args.walk_length, args.num_walks, args.walk_batch, args.dim, args.window, args.epochs,
+            args.neg, args.lr, train_ss, args.batch_size, args.shuffle_buffer, args.workers
+        )
+        nodes_out = nodes.tolist()
+    else:
+        if args.walk_engine == "csr":
+            nodes, indptr, indices = read_graph_csr(args.edgelist)
+            walks = generate_walks_csr(
+                nodes, indptr, indices, args.walk_length, args.num_walks, args.method, args.p, args.q,
+                walk_ss, args.walk_batch, args.alias_max_entries
+            )
+        else:
+            nodes, adj = read_graph(args.edgelist)
+            walks = generate_walks(nodes, adj, args.walk_length, args.num_walks, args.method, args.p, args.q)
+
+        t1 = time.time()
+        if args.engine == "numpy":
+            nodes_out, emb, n_updates = train_skipgram_numpy(
+                walks, args.dim, args.window, args.epochs, args.neg, args.lr, train_ss, args.batch_size
+            )
+        else:
+            nodes_out, emb, n_updates = train_skipgram(
+                walks, args.dim, args.window, args.epochs, args.neg, args.lr, args.seed
+            )
+    t_train = time.time() - t1
+    if args.out_format == "txt":
+        save_vectors(args.out, nodes_out, emb)
+    else:
+        save_binary(args.out, nodes_out, np.asarray(emb), args.out_format)
+
+    print(f"walk_time_sec {t1 - t0:.6f}")
+    print(f"train_time_sec {t_train:.6f}")
+    print(f"pairs_per_sec {n_updates / max(t_train, 1e-9):.1f}")
+    print(f"peak_rss_mb {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0:.1f}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Binary embedding files shared by hi2vec, hi2vec_attr and the evaluators.
+
+Layout (little-endian), see also embio.h:
+  header  32 bytes: magic "LNEV", uint32 version, uint64 n, uint32 k,
+          uint32 dtype (1 = float32, 2 = float16), uint64 ids_offset
+  matrix  n x k row-major values starting at byte 32
+  ids     n x uint64 node ids starting at ids_offset
+"""
+import argparse
+import struct
+
+import numpy as np
+
+MAGIC = b"LNEV"
+VERSION = 1
+HEADER = struct.Struct("<4sIQIIQ")
+DTYPES = {1: np.float32, 2: np.float16}
+FORMATS = {"f32": 1, "f16": 2}
+
+
+def is_binary(path):
+    with open(path, "rb") as f:
+        return f.read(4) == MAGIC
+
+
+def read_text(path):
+    vec = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.strip().split()
+            if len(parts) < 2:
+                continue
+            vec[int(parts[0])] = [float(x) for x in parts[1:]]
+    ids = np.fromiter(vec.keys(), dtype=np.int64, count=len(vec))
+    M = np.array(list(vec.values()), dtype=np.float64).reshape(len(vec), -1)
+    return ids, M
+
+
+def read_binary(path):
+    with open(path, "rb") as f:
+        magic, version, n, k, dtype, ids_offset = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or dtype not in DTYPES:
+        raise ValueError(f"not a supported embedding file: {path}")
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty((0, k), dtype=DTYPES[dtype])
+    M = np.memmap(path, dtype=DTYPES[dtype], mode="r", offset=HEADER.size, shape=(n, k))
+    ids = np.memmap(path, dtype=np.uint64, mode="r", offset=ids_offset, shape=(n,)).astype(np.int64)
+    return ids, M
+
+
+def load_embeddings(path):
+    """Return (ids, M) where row i of M is the vector of node ids[i].
+
+    Binary files are memory-mapped, so M is a read-only view of the file.
+    """
+    if is_binary(path):
+        return read_binary(path)
+    return read_text(path)
+
+
+def save_binary(path, ids, M, fmt="f32"):
+    dtype = FORMATS[fmt]
+    M = np.ascontiguousarray(M, dtype=DTYPES[dtype])
+    n, k = M.shape
+    end = HEADER.size + M.nbytes
+    ids_offset = (end + 7) & ~7
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, n, k, dtype, ids_offset))
+        f.write(M.tobytes())
+        f.write(b"\0" * (ids_offset - end))
+        f.write(np.asarray(ids, dtype=np.uint64).tobytes())
+
+
+def save_text(path, ids, M):
+    with open(path, "w", encoding="utf-8") as f:
+        for u, row in zip(ids, M):
+            f.write(str(int(u)))
+            for x in row:
+                f.write(f" {float(x):e}")
+            f.write("\n")
+
+
+def save_embeddings(path, ids, M, fmt="txt"):
+    if fmt == "txt":
+        save_text(path, ids, M)
+    else:
+        save_binary(path, ids, M, fmt)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Convert embedding files between text and binary formats.")
+    ap.add_argument("input")
+    ap.add_argument("output")
+    ap.add_argument("--format", choices=["txt", "f32", "f16"], required=True)
+    args = ap.parse_args()
+
+    ids, M = load_embeddings(args.input)
+    save_embeddings(args.output, ids, M, args.format)
+    print(f"n_vectors {len(ids)}")
+    print(f"dim {M.shape[1] if M.ndim == 2 else 0}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,94 @@
 #!/usr/bin/env python3
 import argparse
-import math
+from itertools import islice
 
+import numpy as np
 
-def read_vectors(path):
-    vec = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 2:
-                continue
-            u = int(parts[0])
-            vec[u] = [float(x) for x in parts[1:]]
-    return vec
+from embfile import load_embeddings
 
 
-def read_edges(path):
-    edges = []
+def read_edge_chunks(path, chunk_size):
     with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            u, v = map(int, line.split())
-            edges.append((u, v))
-    return edges
+        while True:
+            lines = [line for line in islice(f, chunk_size) if line.strip()]
+            if not lines:
+                return
+            yield np.loadtxt(lines, dtype=np.int64, ndmin=2).reshape(-1, 2)
+
+
+def row_index(ids):
+    order = np.argsort(ids, kind="stable")
+    return ids[order], order
 
 
-def dot(a, b):
-    return sum(x * y for x, y in zip(a, b))
+def lookup_rows(index, nodes):
+    keys, order = index
+    if len(keys) == 0:
+        return np.zeros(len(nodes), dtype=np.int64), np.zeros(len(nodes), dtype=bool)
+    pos = np.minimum(np.searchsorted(keys, nodes), len(keys) - 1)
+    return order[pos], keys[pos] == nodes
 
 
-def cosine(a, b):
-    da = math.sqrt(sum(x * x for x in a)) + 1e-12
-    db = math.sqrt(sum(x * x for x in b)) + 1e-12
-    return dot(a, b) / (da * db)
+def unit_rows(X):
+    X = np.asarray(X, dtype=np.float64)
+    return X / (np.linalg.norm(X, axis=1, keepdims=True) + 1e-12)
 
 
-def edge_score(u, v, vec, metric):
-    if u not in vec or v not in vec:
-        return None
-    if metric == "cosine":
-        return cosine(vec[u], vec[v])
-    return dot(vec[u], vec[v])
+def score_pairs(index, M, edges, chunk_size, cosine=False):
+    out = []
+    for s in range(0, len(edges), chunk_size):
+        e = edges[s:s + chunk_size]
+        ru, ok_u = lookup_rows(index, e[:, 0])
+        rv, ok_v = lookup_rows(index, e[:, 1])
+        ok = ok_u & ok_v
+        U, V = M[ru[ok]], M[rv[ok]]
+        if cosine:
+            U, V = unit_rows(U), unit_rows(V)
+        out.append(np.einsum("ij,ij->i", U, V, dtype=np.float64))
+    if not out:
+        return np.empty(0)
+    return np.concatenate(out)
 
 
-def auc(scores_labels):
-    n = len(scores_labels)
+def score_file(path, index, M, chunk_size, cosine=False):
+    parts = [score_pairs(index, M, e, chunk_size, cosine) for e in read_edge_chunks(path, chunk_size)]
+    if not parts:
+        return np.empty(0)
+    return np.concatenate(parts)
+
+
+def auc(scores, labels):
+    n = len(scores)
     if n == 0:
         return 0.0
-    arr = sorted(scores_labels, key=lambda x: x[0])
-    n_pos = sum(lbl for _, lbl in arr)
+    n_pos = int(labels.sum())
     n_neg = n - n_pos
     if n_pos == 0 or n_neg == 0:
         return 0.0
 
-    rank_sum_pos = 0.0
-    i = 0
-    rank = 1
-    while i < n:
-        j = i + 1
-        while j < n and arr[j][0] == arr[i][0]:
-            j += 1
-        avg_rank = (rank + (rank + (j - i) - 1)) / 2.0
-        pos_in_tie = sum(arr[k][1] for k in range(i, j))
-        rank_sum_pos += avg_rank * pos_in_tie
-        rank += (j - i)
-        i = j
+    order = np.argsort(scores, kind="mergesort")
+    s = scores[order]
+    lbl = labels[order]
+    starts = np.flatnonzero(np.r_[True, s[1:] != s[:-1]])
+    ends = np.r_[starts[1:], n]
+    avg_rank = (starts + 1 + ends) / 2.0
+    pos_in_tie = np.add.reduceat(lbl, starts)
+    rank_sum_pos = float(np.dot(avg_rank, pos_in_tie))
 
     u_stat = rank_sum_pos - n_pos * (n_pos + 1) / 2.0
     return u_stat / (n_pos * n_neg)
 
 
-def average_precision(scores_labels):
-    arr = sorted(scores_labels, key=lambda x: x[0], reverse=True)
-    n_pos = sum(lbl for _, lbl in arr)
+def average_precision(scores, labels):
+    n_pos = int(labels.sum())
     if n_pos == 0:
         return 0.0
 
-    tp = 0
-    ap = 0.0
-    for i, (_, lbl) in enumerate(arr, start=1):
-        if lbl == 1:
-            tp += 1
-            ap += tp / i
-    return ap / n_pos
+    order = np.argsort(-scores, kind="stable")
+    lbl = labels[order]
+    tp = np.cumsum(lbl)
+    hits = lbl == 1
+    return float(np.sum(tp[hits] / (np.flatnonzero(hits) + 1))) / n_pos
 
 
 def main():
@@ -93,37 +97,27 @@ def main():
     ap.add_argument("--test-pos", required=True)
     ap.add_argument("--test-neg", required=True)
     ap.add_argument("--metric", choices=["dot", "cosine"], default="dot")
+    ap.add_argument("--chunk-size", type=int, default=1000000)
     args = ap.parse_args()
 
-    vec = read_vectors(args.vectors)
-    pos = read_edges(args.test_pos)
-    neg = read_edges(args.test_neg)
-
-    scores_labels = []
-    used_pos = 0
-    used_neg = 0
+    ids, M = load_embeddings(args.vectors)
+    index = row_index(ids)
 
-    for u, v in pos:
-        s = edge_score(u, v, vec, args.metric)
-        if s is None:
-            continue
-        scores_labels.append((s, 1))
-        used_pos += 1
+    # Cosine normalizes the gathered rows of each chunk, so M stays a view.
+    cosine = args.metric == "cosine"
+    pos = score_file(args.test_pos, index, M, args.chunk_size, cosine)
+    neg = score_file(args.test_neg, index, M, args.chunk_size, cosine)
 
-    for u, v in neg:
-        s = edge_score(u, v, vec, args.metric)
-        if s is None:
-            continue
-        scores_labels.append((s, 0))
-        used_neg += 1
+    scores = np.concatenate([pos, neg])
+    labels = np.r_[np.ones(len(pos), dtype=np.int64), np.zeros(len(neg), dtype=np.int64)]
 
-    auc_v = auc(scores_labels)
-    ap_v = average_precision(scores_labels)
+    auc_v = auc(scores, labels)
+    ap_v = average_precision(scores, labels)
 
     print(f"link_auc {auc_v:.6f}")
     print(f"link_ap {ap_v:.6f}")
-    print(f"n_test_pos_used {used_pos}")
-    print(f"n_test_neg_used {used_neg}")
+    print(f"n_test_pos_used {len(pos)}")
+    print(f"n_test_neg_used {len(neg)}")
 
 
 if __name__ == "__main__":
@@ -1,19 +1,13 @@
 #!/usr/bin/env python3
 import argparse
 import math
+import os
 import random
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 
-def read_vectors(path):
-    vec = {}
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 2:
-                continue
-            u = int(parts[0])
-            vec[u] = [float(x) for x in parts[1:]]
-    return vec
+from embfile import load_embeddings
 
 
 def read_labels(path):
@@ -95,6 +89,71 @@ def accuracy(X, y, W, b):
     return hit / max(1, len(y))
 
 
+def train_softmax(X, y, ncls, epochs=60, lr=0.1, reg=1e-4, batch_size=256, val_ratio=0.1, patience=5, seed=0):
+    rng = np.random.default_rng(seed)
+    n, d = X.shape
+    perm = rng.permutation(n)
+    n_val = int(n * val_ratio) if n > 1 else 0
+    val, fit = perm[:n_val], perm[n_val:]
+
+    W = np.zeros((d, ncls))
+    b = np.zeros(ncls)
+    best = (W.copy(), b.copy())
+    best_acc = -1.0
+    stale = 0
+
+    for _ in range(epochs):
+        order = fit[rng.permutation(len(fit))]
+        for s in range(0, len(order), batch_size):
+            bi = order[s:s + batch_size]
+            z = X[bi] @ W + b
+            z -= z.max(axis=1, keepdims=True)
+            p = np.exp(z)
+            p /= p.sum(axis=1, keepdims=True)
+            p[np.arange(len(bi)), y[bi]] -= 1.0
+            p /= len(bi)
+            W -= lr * (X[bi].T @ p + reg * W)
+            b -= lr * p.sum(axis=0)
+
+        if n_val == 0:
+            best = (W, b)
+            continue
+        acc = accuracy_np(X[val], y[val], W, b)
+        if acc > best_acc:
+            best_acc = acc
+            best = (W.copy(), b.copy())
+            stale = 0
+        else:
+            stale += 1
+            if stale >= patience:
+                break
+
+    return best
+
+
+def accuracy_np(X, y, W, b):
+    if len(y) == 0:
+        return 0.0
+    return float(np.mean(np.argmax(X @ W + b, axis=1) == y))
+
+
+_X = None
+_y = None
+
+
+def init_worker(X, y):
+    global _X, _y
+    _X = X
+    _y = y
+
+
+def run_split(job):
+    tr_idx, te_idx, ncls, epochs, lr, batch_size, val_ratio, patience, seed = job
+    W, b = train_softmax(_X[tr_idx], _y[tr_idx], ncls, epochs=epochs, lr=lr, batch_size=batch_size,
+                         val_ratio=val_ratio, patience=patience, seed=seed)
+    return accuracy_np(_X[te_idx], _y[te_idx], W, b)
+
+
 def mean_std(vals):
     m = sum(vals) / len(vals)
     v = sum((x - m) ** 2 for x in vals) / len(vals)
@@ -110,13 +169,19 @@ def main():
     ap.add_argument("--seed", type=int, default=42)
     ap.add_argument("--epochs", type=int, default=60)
     ap.add_argument("--lr", type=float, default=0.1)
+    ap.add_argument("--engine", choices=["numpy", "python"], default="numpy")
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--val-ratio", type=float, default=0.1)
+    ap.add_argument("--patience", type=int, default=5)
+    ap.add_argument("--workers", type=int, default=0)
     args = ap.parse_args()
 
-    vec = read_vectors(args.vectors)
+    vec_ids, M = load_embeddings(args.vectors)
     lab = read_labels(args.labels)
 
-    ids = sorted(set(vec.keys()) & set(lab.keys()))
-    X = [vec[u] for u in ids]
+    row = {int(u): i for i, u in enumerate(vec_ids)}
+    ids = sorted(set(row.keys()) & set(lab.keys()))
+    X = np.asarray(M[[row[u] for u in ids]], dtype=np.float64).reshape(len(ids), -1)
     y_raw = [lab[u] for u in ids]
 
     uniq = sorted(set(y_raw))
@@ -126,21 +191,37 @@ def main():
 
     random.seed(args.seed)
     idx = list(range(len(ids)))
-    scores = []
-
+    splits = []
     for _ in range(args.runs):
         random.shuffle(idx)
         tr = int(len(idx) * args.train_ratio)
-        tr_idx = idx[:tr]
-        te_idx = idx[tr:]
-
-        Xtr = [X[i] for i in tr_idx]
-        ytr = [y[i] for i in tr_idx]
-        Xte = [X[i] for i in te_idx]
-        yte = [y[i] for i in te_idx]
-
-        W, b = train_linear(Xtr, ytr, ncls, epochs=args.epochs, lr=args.lr)
-        scores.append(accuracy(Xte, yte, W, b))
+        splits.append((idx[:tr], idx[tr:]))
+
+    if args.engine == "numpy":
+        y = np.asarray(y, dtype=np.int64)
+        jobs = [
+            (np.asarray(tr_idx, dtype=np.int64), np.asarray(te_idx, dtype=np.int64), ncls, args.epochs, args.lr,
+             args.batch_size, args.val_ratio, args.patience, args.seed + r)
+            for r, (tr_idx, te_idx) in enumerate(splits)
+        ]
+        workers = args.workers if args.workers > 0 else min(len(jobs), os.cpu_count() or 1)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(X, y)) as pool:
+                scores = list(pool.map(run_split, jobs))
+        else:
+            init_worker(X, y)
+            scores = [run_split(job) for job in jobs]
+    else:
+        X = X.tolist()
+        scores = []
+        for tr_idx, te_idx in splits:
+            Xtr = [X[i] for i in tr_idx]
+            ytr = [y[i] for i in tr_idx]
+            Xte = [X[i] for i in te_idx]
+            yte = [y[i] for i in te_idx]
+
+            W, b = train_linear(Xtr, ytr, ncls, epochs=args.epochs, lr=args.lr)
+            scores.append(accuracy(Xte, yte, W, b))
 
     m, s = mean_std(scores)
     print(f"accuracy_mean {m:.6f}")
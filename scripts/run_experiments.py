@@ -110,6 +110,7 @@ def main():
     ap.add_argument("--lr", type=float, default=0.025)
     ap.add_argument("--eval-epochs", type=int, default=30)
     ap.add_argument("--eval-runs", type=int, default=3)
+    ap.add_argument("--vec-format", choices=["txt", "f32", "f16"], default="txt")
 
     ap.add_argument("--with-link-pred", action="store_true")
     ap.add_argument("--lp-test-ratio", type=float, default=0.1)
@@ -135,6 +136,7 @@ def main():
             args.lp_seed,
         )
 
+    ext = ".txt" if args.vec_format == "txt" else ".bin"
     rows = []
 
     t_compile = run(["make"])
@@ -179,28 +181,28 @@ def main():
         })
 
     h_base = out / "hier_base.txt"
-    v_base = out / "vec_base.txt"
+    v_base = out / f"vec_base{ext}"
     run_method(
         "louvainNE",
         [
             ["./recpart", str(split_train), str(h_base), "1"],
-            ["./hi2vec", str(args.dim), str(args.a), str(h_base), str(v_base)],
+            ["./hi2vec", str(args.dim), str(args.a), str(h_base), str(v_base), args.vec_format],
         ],
         v_base,
     )
 
     h_attr = out / "hier_attr.txt"
-    v_attr = out / "vec_attr.txt"
+    v_attr = out / f"vec_attr{ext}"
     run_method(
         "attr-louvainNE",
         [
             ["./recpart_attr", str(split_train), str(h_attr), args.attributes, str(args.lambda_attr), "4"],
-            ["./hi2vec_attr", str(args.dim), str(args.a), str(args.beta), str(h_attr), args.attributes, str(v_attr)],
+            ["./hi2vec_attr", str(args.dim), str(args.a), str(args.beta), str(h_attr), args.attributes, str(v_attr), args.vec_format],
         ],
         v_attr,
     )
 
-    v_dw = out / "vec_deepwalk.txt"
+    v_dw = out / f"vec_deepwalk{ext}"
     run_method(
         "deepwalk",
         [[
@@ -215,11 +217,12 @@ def main():
             "--epochs", str(args.epochs),
             "--neg", str(args.neg),
             "--lr", str(args.lr),
+            "--out-format", args.vec_format,
         ]],
         v_dw,
     )
 
-    v_n2v = out / "vec_node2vec.txt"
+    v_n2v = out / f"vec_node2vec{ext}"
     run_method(
         "node2vec",
         [[
@@ -236,6 +239,7 @@ def main():
             "--epochs", str(args.epochs),
             "--neg", str(args.neg),
             "--lr", str(args.lr),
+            "--out-format", args.vec_format,
         ]],
         v_n2v,
     )
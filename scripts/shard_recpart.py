@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Sharded hierarchy build: one coordinator, several worker processes.
+
+The coordinator runs recpart/recpart_attr with a shard directory: it computes
+the top-level partition, writes the root record and one graph cache shard per
+large top-level community (small ones are finished by the coordinator). Each
+shard is sent to a worker over TCP, the worker runs recpart on it and sends
+back the hierarchy fragment, and hierstitch joins the root and the fragments
+into one hierarchy file.
+
+Protocol (one job per connection):
+  request   JSON line {"partition", "format", "threads", "attributed",
+            "lambda", "attr_mode", "size"}, then size bytes of shard
+  response  JSON line {"ok", "size", "time_sec"} or {"ok": false, "error"},
+            then size bytes of fragment
+"""
+import argparse
+import hashlib
+import json
+import os
+import queue
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+
+def recv_exact(f, size, out):
+    while size > 0:
+        chunk = f.read(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("connection closed early")
+        out.write(chunk)
+        size -= len(chunk)
+
+
+def worker_command(args, req, shard, frag):
+    if req["attributed"]:
+        if not args.attributes:
+            raise RuntimeError("worker has no --attributes for an attributed job")
+        return [os.path.join(args.bin_dir, "recpart_attr"), str(shard), str(frag), args.attributes, str(req["lambda"]),
+                req["partition"], req["attr_mode"], req["format"], str(req["threads"])]
+    return [os.path.join(args.bin_dir, "recpart"), str(shard), str(frag), req["partition"], req["format"], str(req["threads"])]
+
+
+def handle(args, conn, tmp):
+    f = conn.makefile("rb")
+    req = json.loads(f.readline())
+    shard = Path(tmp) / "shard.csr"
+    frag = Path(tmp) / f"fragment.{req['format']}"
+    with open(shard, "wb") as out:
+        recv_exact(f, req["size"], out)
+    t0 = time.time()
+    try:
+        subprocess.run(worker_command(args, req, shard, frag), check=True, stdout=subprocess.DEVNULL)
+    except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+        conn.sendall((json.dumps({"ok": False, "error": str(e)}) + "\n").encode())
+        return
+    reply = {"ok": True, "size": frag.stat().st_size, "time_sec": time.time() - t0}
+    conn.sendall((json.dumps(reply) + "\n").encode())
+    with open(frag, "rb") as fr:
+        conn.sendfile(fr)
+
+
+def serve(args):
+    srv = socket.create_server((args.host, args.port))
+    host, port = srv.getsockname()[:2]
+    print(f"listening {host}:{port}", flush=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        while True:
+            conn, _ = srv.accept()
+            with conn:
+                try:
+                    handle(args, conn, tmp)
+                except (ConnectionError, ValueError) as e:
+                    print(f"dropped job: {e}", file=sys.stderr)
+
+
+def start_local_workers(args, n):
+    procs, addrs = [], []
+    for _ in range(n):
+        cmd = [sys.executable, __file__, "serve", "--host", "127.0.0.1", "--port", "0", "--bin-dir", args.bin_dir]
+        if args.attributes:
+            cmd += ["--attributes", args.attributes]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        procs.append(p)
+        addrs.append(p.stdout.readline().split()[1])
+    return procs, addrs
+
+
+def run_job(addr, req, shard, frag):
+    host, port = addr.rsplit(":", 1)
+    with socket.create_connection((host, int(port))) as conn:
+        req = dict(req, size=shard.stat().st_size)
+        conn.sendall((json.dumps(req) + "\n").encode())
+        with open(shard, "rb") as f:
+            conn.sendfile(f)
+        f = conn.makefile("rb")
+        reply = json.loads(f.readline())
+        if not reply["ok"]:
+            raise RuntimeError(f"{addr}: {shard.name}: {reply['error']}")
+        with open(frag, "wb") as out:
+            recv_exact(f, reply["size"], out)
+    return reply["time_sec"]
+
+
+def dispatch(addrs, req, jobs):
+    """Sends the largest shards first; each worker takes the next job when done."""
+    todo = queue.Queue()
+    for job in sorted(jobs, key=lambda j: -j[0].stat().st_size):
+        todo.put(job)
+    busy = {a: 0.0 for a in addrs}
+    errors = []
+
+    def loop(addr):
+        while not errors:
+            try:
+                shard, frag = todo.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                busy[addr] += run_job(addr, req, shard, frag)
+            except (OSError, RuntimeError, ValueError) as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=loop, args=(a,)) for a in addrs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return busy
+
+
+def coordinator_command(args, root, shard_dir, partition):
+    if args.attributes:
+        return [os.path.join(args.bin_dir, "recpart_attr"), args.edgelist, str(root), args.attributes, str(args.lam), partition,
+                args.attr_mode, args.format, "1", str(shard_dir)]
+    return [os.path.join(args.bin_dir, "recpart"), args.edgelist, str(root), partition, args.format, "1", str(shard_dir)]
+
+
+def digest(path):
+    return hashlib.md5(Path(path).read_bytes()).hexdigest()
+
+
+def run(args):
+    partition = args.partition or ("4" if args.attributes else "1")
+    req = {"partition": partition, "format": args.format, "threads": args.threads,
+           "attributed": bool(args.attributes), "lambda": args.lam, "attr_mode": args.attr_mode}
+    procs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        shard_dir = Path(args.shard_dir or tmp)
+        shard_dir.mkdir(parents=True, exist_ok=True)
+        root = shard_dir / f"root.{args.format}"
+        try:
+            t0 = time.time()
+            subprocess.run(coordinator_command(args, root, shard_dir, partition), check=True,
+                           stdout=subprocess.DEVNULL)
+            t1 = time.time()
+            shards = sorted(shard_dir.glob("shard_*.csr"))
+            jobs = [(s, s.with_suffix(f".{args.format}")) for s in shards]
+
+            if args.workers:
+                addrs = args.workers.split(",")
+            else:
+                procs, addrs = start_local_workers(args, args.local)
+            t2 = time.time()
+            busy = dispatch(addrs, req, jobs) if jobs else {}
+            t3 = time.time()
+            frags = sorted(shard_dir.glob(f"shard_*.{args.format}"))
+            subprocess.run([os.path.join(args.bin_dir, "hierstitch"), args.hierarchy, str(root)] +
+                           [str(f) for f in frags], check=True, stdout=subprocess.DEVNULL)
+            t4 = time.time()
+        finally:
+            for p in procs:
+                p.terminate()
+                p.wait()
+
+        print(f"workers {len(addrs)}")
+        print(f"shards {len(shards)}")
+        print(f"inline_fragments {len(frags) - len(shards)}")
+        print(f"shard_bytes {sum(s.stat().st_size for s in shards)}")
+        print(f"coordinator_time_sec {t1 - t0:.4f}")
+        print(f"workers_time_sec {t3 - t2:.4f}")
+        print(f"worker_busy_sec_max {max(busy.values(), default=0.0):.4f}")
+        print(f"stitch_time_sec {t4 - t3:.4f}")
+        print(f"total_time_sec {t4 - t0 - (t2 - t1):.4f}")
+
+        if args.check:
+            ref = Path(tmp) / f"reference.{args.format}"
+            cmd = coordinator_command(args, ref, shard_dir, partition)[:-1]
+            subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+            print(f"identical {int(digest(ref) == digest(args.hierarchy))}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sharded multi-process hierarchy build")
+    sub = ap.add_subparsers(dest="mode", required=True)
+
+    sv = sub.add_parser("serve", help="run a worker that builds hierarchy fragments for shards")
+    sv.add_argument("--host", default="0.0.0.0")
+    sv.add_argument("--port", type=int, default=7711)
+    sv.add_argument("--bin-dir", default=".")
+    sv.add_argument("--attributes", default="", help="local attribute file, for attributed jobs")
+
+    rn = sub.add_parser("run", help="shard a graph, build the fragments on workers and stitch them")
+    rn.add_argument("--edgelist", default="data/real/blogcatalog/edgelist.txt")
+    rn.add_argument("--hierarchy", required=True)
+    rn.add_argument("--attributes", default="", help="if set, use recpart_attr instead of recpart")
+    rn.add_argument("--partition", default=None, help="default: 4 with attributes, 1 without")
+    rn.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    rn.add_argument("--attr-mode", default="auto", choices=["auto", "dense", "sparse"])
+    rn.add_argument("--format", default="txt", choices=["txt", "bin"])
+    rn.add_argument("--threads", type=int, default=1, help="recpart threads on each worker")
+    rn.add_argument("--workers", default="", help="comma-separated host:port list of running workers")
+    rn.add_argument("--local", type=int, default=2, help="local worker processes when --workers is not set")
+    rn.add_argument("--shard-dir", default="", help="keep shards and fragments here; must be empty or absent (default: temporary)")
+    rn.add_argument("--bin-dir", default=".")
+    rn.add_argument("--check", action="store_true", help="compare with a single-process recpart run")
+    args = ap.parse_args()
+
+    if args.mode == "run" and args.shard_dir and any(Path(args.shard_dir).glob("*")):
+        ap.error(f"--shard-dir {args.shard_dir} is not empty; shards or fragments from another run would be stitched in")
+    if args.mode == "serve":
+        serve(args)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
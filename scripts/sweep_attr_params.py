@@ -118,6 +118,7 @@ def main():
 
     ap.add_argument("--eval-epochs", type=int, default=5)
     ap.add_argument("--eval-runs", type=int, default=1)
+    ap.add_argument("--vec-format", choices=["txt", "f32", "f16"], default="txt")
 
     ap.add_argument("--with-link-pred", action="store_true")
     ap.add_argument("--lp-test-ratio", type=float, default=0.1)
@@ -134,6 +135,9 @@ def main():
 
     run(["make"])
 
+    attributes = str(out / "attributes.bin")
+    run(["./attr2bin", args.attributes, attributes])
+
     train_graph = args.edgelist
     lp_pos = None
     lp_neg = None
@@ -159,15 +163,20 @@ def main():
     for lam in lambdas:
         hier = out / f"hier_l{lam:.3f}".replace(".", "p")
         hier = Path(str(hier) + ".txt")
-        run(["./recpart_attr", train_graph, str(hier), args.attributes, str(lam), "4"])
-
-        for beta in betas:
-            tag = f"l{lam:.3f}_b{beta:.3f}".replace(".", "p")
-            vec = out / f"vec_{tag}.txt"
-
-            t0 = time.time()
-            run(["./hi2vec_attr", str(args.dim), str(args.a), str(beta), str(hier), args.attributes, str(vec)])
-            embed_t = time.time() - t0
+        run(["./recpart_attr", train_graph, str(hier), attributes, str(lam), "4"])
+
+        # One hi2vec_attr pass per hierarchy: the structural noise is drawn once
+        # and one vector file is written per beta.
+        ext = ".txt" if args.vec_format == "txt" else ".bin"
+        ltag = f"l{lam:.3f}".replace(".", "p")
+        beta_toks = [f"{beta:.3f}" for beta in betas]
+        t0 = time.time()
+        run(["./hi2vec_attr", str(args.dim), str(args.a), ",".join(beta_toks), str(hier), attributes,
+             str(out / f"vec_{ltag}_b{{beta}}{ext}"), args.vec_format])
+        embed_t = (time.time() - t0) / max(len(betas), 1)
+
+        for beta, tok in zip(betas, beta_toks):
+            vec = out / f"vec_{ltag}_b{tok}{ext}"
 
             acc_m, acc_s = evaluate_node(vec, args.labels, args.eval_epochs, args.eval_runs)
             auc_v = ""
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+DEFAULT_DATASETS = [
+    ("cora", "data/real/cora/edgelist.txt", "data/real/cora/attributes.txt"),
+    ("blogcatalog", "data/real/blogcatalog/edgelist.txt", "data/real/blogcatalog/attributes.txt"),
+]
+
+
+def read_edges(path):
+    edges = np.loadtxt(path, dtype=np.int64, ndmin=2)[:, :2]
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    edges = np.sort(edges, axis=1)
+    return np.unique(edges, axis=0)
+
+
+def read_hierarchy(path):
+    """Return {node: top-level subtree} and {node: leaf community} maps."""
+    top, leaf = {}, {}
+    branch = -1
+    nleaf = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if not parts:
+                continue
+            if int(parts[0]) == 1:
+                branch += 1
+            if len(parts) > 2:
+                for u in parts[3:]:
+                    top[int(u)] = max(branch, 0)
+                    leaf[int(u)] = nleaf
+                nleaf += 1
+    return top, leaf
+
+
+def labels_for(nodes, part):
+    return np.array([part.get(int(u), -1) for u in nodes], dtype=np.int64)
+
+
+def modularity(edges, nodes, labels):
+    index = {int(u): i for i, u in enumerate(nodes)}
+    src = labels[[index[int(u)] for u in edges[:, 0]]]
+    dst = labels[[index[int(v)] for v in edges[:, 1]]]
+    m = float(len(edges))
+    if m == 0:
+        return 0.0
+    inside = np.bincount(src[src == dst], minlength=labels.max() + 1).astype(np.float64)
+    tot = np.bincount(src, minlength=labels.max() + 1) + np.bincount(dst, minlength=labels.max() + 1)
+    tot = tot.astype(np.float64)
+    return float(np.sum(inside / m - (tot / (2.0 * m)) ** 2))
+
+
+def nmi(a, b):
+    _, a = np.unique(a, return_inverse=True)
+    _, b = np.unique(b, return_inverse=True)
+    n = float(len(a))
+    pairs, counts = np.unique(a * (b.max() + 1) + b, return_counts=True)
+    pa = np.bincount(a) / n
+    pb = np.bincount(b) / n
+    pab = counts / n
+    ia = pairs // (b.max() + 1)
+    ib = pairs % (b.max() + 1)
+    mi = float(np.sum(pab * np.log(pab / (pa[ia] * pb[ib]))))
+    ha = float(-np.sum(pa * np.log(pa)))
+    hb = float(-np.sum(pb * np.log(pb)))
+    if ha + hb == 0.0:
+        return 1.0
+    return 2.0 * mi / (ha + hb)
+
+
+def build_hierarchy(binary, edgelist, attributes, lam, partition, out):
+    t0 = time.time()
+    subprocess.run([binary, edgelist, str(out), attributes, str(lam), str(partition)],
+                   check=True, stdout=subprocess.DEVNULL)
+    return time.time() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compare reduced-precision recpart_attr against the long double build")
+    ap.add_argument("--reference", default="./recpart_attr")
+    ap.add_argument("--reduced", default="./recpart_attr_reduced")
+    ap.add_argument("--dataset", nargs=3, action="append", metavar=("NAME", "EDGELIST", "ATTRIBUTES"))
+    ap.add_argument("--partitions", default="1,4")
+    ap.add_argument("--lambda", dest="lam", type=float, default=0.2)
+    args = ap.parse_args()
+
+    datasets = args.dataset or DEFAULT_DATASETS
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, edgelist, attributes in datasets:
+            edges = read_edges(edgelist)
+            nodes = np.unique(edges)
+            for partition in args.partitions.split(","):
+                prefix = f"{name}_p{partition}"
+                paths = {}
+                for tag, binary in (("ref", args.reference), ("reduced", args.reduced)):
+                    paths[tag] = Path(tmp) / f"{prefix}_{tag}.txt"
+                    t = build_hierarchy(binary, edgelist, attributes, args.lam, partition, paths[tag])
+                    print(f"{prefix}_time_{tag} {t:.3f}")
+
+                identical = paths["ref"].read_bytes() == paths["reduced"].read_bytes()
+                ref_top, ref_leaf = read_hierarchy(paths["ref"])
+                red_top, red_leaf = read_hierarchy(paths["reduced"])
+                ref_top, red_top = labels_for(nodes, ref_top), labels_for(nodes, red_top)
+                ref_leaf, red_leaf = labels_for(nodes, ref_leaf), labels_for(nodes, red_leaf)
+
+                print(f"{prefix}_identical {int(identical)}")
+                print(f"{prefix}_modularity_ref {modularity(edges, nodes, ref_top):.6f}")
+                print(f"{prefix}_modularity_reduced {modularity(edges, nodes, red_top):.6f}")
+                print(f"{prefix}_top_agreement {float(np.mean(ref_top == red_top)):.6f}")
+                print(f"{prefix}_top_nmi {nmi(ref_top, red_top):.6f}")
+                print(f"{prefix}_leaf_nmi {nmi(ref_leaf, red_leaf):.6f}")
+
+
+if __name__ == "__main__":
+    main()
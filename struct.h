@@ -1,9 +1,36 @@
 #ifndef STRUCT_H
 #define STRUCT_H
 
+/* Numeric precision of the partition engine. By default modularity
+   bookkeeping and attribute sums are long double; building with
+   -DREDUCED_PRECISION (see the *_reduced targets in the Makefile) uses
+   double for the former and float for the latter. */
+#ifdef REDUCED_PRECISION
+typedef double weight_t;
+typedef float attrsum_t;
+#else
+typedef long double weight_t;
+typedef long double attrsum_t;
+#endif
+
+/* Graph layout. By default node ids (adjacency and maps) are unsigned long
+   and the edge weights of coarsened graphs are weight_t; building with
+   -DCOMPACT_GRAPH (see the *_compact targets in the Makefile) uses uint32_t
+   ids and float weights, for graphs of fewer than 2^32 nodes. Offsets (cd)
+   are 64-bit in both. */
+#ifdef COMPACT_GRAPH
+#include <stdint.h>
+typedef uint32_t node_t;
+typedef float eweight_t;
+#else
+typedef unsigned long node_t;
+typedef weight_t eweight_t;
+#endif
+#define NODE_MAX ((node_t)-1)
+
 typedef struct {
-  unsigned long s;
-  unsigned long t;
+  node_t s;
+  node_t t;
 } edge;
 
 typedef struct {
@@ -11,7 +38,7 @@ typedef struct {
   unsigned long long e;
   unsigned long long emax;
   edge *edges;
-  unsigned long *map;
+  node_t *map;
 } edgelist;
 
 typedef struct {
@@ -20,10 +47,10 @@ typedef struct {
   unsigned long long emax;
   edge *edges;
   unsigned long long *cd;
-  unsigned long *adj;
-  long double *weights;
-  long double totalWeight;
-  unsigned long *map;
+  node_t *adj;
+  eweight_t *weights;
+  weight_t totalWeight;
+  node_t *map;
 } adjlist;
 
 typedef struct {
@@ -0,0 +1,315 @@
+#include "treevec.h"
+#include "hierio.h"
+
+#include <math.h>
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define NREC 1024
+#define NIDS (1 << 16)
+
+typedef struct {
+  int direct;
+  unsigned long n;
+  unsigned long cap;
+  unsigned long *ids;
+  double *rows;
+} taskout;
+
+typedef struct {
+  hiertree *t;
+  unsigned k;
+  double a;
+  unsigned nout;
+  leaf_fn fn;
+  void *ctx;
+  embwriter **out;
+
+  unsigned long ntask;
+  unsigned long *start;
+  uint64_t *key;
+  int child;
+  uint64_t rootkey;
+
+  taskout *res;
+  char *done;
+  unsigned long next_task;
+  unsigned long next_write;
+  pthread_mutex_t lock;
+} treejob;
+
+hiertree *hiertree_load(const char *path) {
+  unsigned h;
+  unsigned long c, n, i, cap = NREC, idcap = NIDS;
+  hierreader *r = hier_open_read(path);
+  if (r == NULL) {
+    return NULL;
+  }
+
+  hiertree *t = malloc(sizeof(hiertree));
+  t->nrec = 0;
+  t->maxdepth = 0;
+  t->depth = malloc(cap * sizeof(unsigned));
+  t->children = malloc(cap * sizeof(unsigned long));
+  t->first = malloc(cap * sizeof(unsigned long long));
+  t->size = malloc(cap * sizeof(unsigned long));
+  t->ids = malloc(idcap * sizeof(unsigned long));
+  unsigned long long nids = 0;
+
+  while (hier_read_node(r, &h, &c)) {
+    if (t->nrec == cap) {
+      cap *= 2;
+      t->depth = realloc(t->depth, cap * sizeof(unsigned));
+      t->children = realloc(t->children, cap * sizeof(unsigned long));
+      t->first = realloc(t->first, cap * sizeof(unsigned long long));
+      t->size = realloc(t->size, cap * sizeof(unsigned long));
+    }
+    t->depth[t->nrec] = h;
+    t->children[t->nrec] = c;
+    t->first[t->nrec] = nids;
+    t->size[t->nrec] = 0;
+    if (h > t->maxdepth) {
+      t->maxdepth = h;
+    }
+    if (c == 1) {
+      if (!hier_read_size(r, &n)) {
+        printf("file reading error 2\n");
+        hier_close_read(r);
+        hiertree_free(t);
+        return NULL;
+      }
+      while (nids + n > idcap) {
+        idcap *= 2;
+        t->ids = realloc(t->ids, idcap * sizeof(unsigned long));
+      }
+      for (i = 0; i < n; i++) {
+        if (!hier_read_id(r, t->ids + nids + i)) {
+          printf("file reading error 3\n");
+          hier_close_read(r);
+          hiertree_free(t);
+          return NULL;
+        }
+      }
+      t->size[t->nrec] = n;
+      nids += n;
+    }
+    t->nrec++;
+  }
+  hier_close_read(r);
+  return t;
+}
+
+void hiertree_free(hiertree *t) {
+  free(t->depth);
+  free(t->children);
+  free(t->first);
+  free(t->size);
+  free(t->ids);
+  free(t);
+}
+
+static unsigned long skip_subtree(hiertree *t, unsigned long r) {
+  unsigned long i, c = t->children[r];
+  if (c == 1) {
+    return r + 1;
+  }
+  r++;
+  for (i = 0; i < c; i++) {
+    r = skip_subtree(t, r);
+  }
+  return r;
+}
+
+static void flush_task(treejob *job, taskout *o) {
+  unsigned long m;
+  unsigned b;
+  for (m = 0; m < o->n; m++) {
+    for (b = 0; b < job->nout; b++) {
+      emb_write(job->out[b], o->ids[m], o->rows + ((unsigned long)m * job->nout + b) * job->k);
+    }
+  }
+}
+
+static void emit(treejob *job, taskout *o, unsigned long u, double ah, const double *base, double *scratch) {
+  unsigned long stride = (unsigned long)job->nout * job->k;
+  double *rows = scratch;
+  if (!o->direct) {
+    if (o->n == o->cap) {
+      o->cap = (o->cap == 0) ? NREC : 2 * o->cap;
+      o->ids = realloc(o->ids, o->cap * sizeof(unsigned long));
+      o->rows = realloc(o->rows, o->cap * stride * sizeof(double));
+    }
+    rows = o->rows + o->n * stride;
+    o->ids[o->n] = u;
+  }
+  o->n++;
+  if (job->fn == NULL) {
+    memcpy(rows, base, job->k * sizeof(double));
+  } else {
+    job->fn(job->ctx, u, ah, base, rows);
+  }
+  if (o->direct) {
+    unsigned b;
+    for (b = 0; b < job->nout; b++) {
+      emb_write(job->out[b], u, rows + (unsigned long)b * job->k);
+    }
+  }
+}
+
+/* Node r's vector is at vec + depth[r]*k; returns the record after its subtree. */
+static unsigned long walk(treejob *job, unsigned long r, uint64_t key, double *vec, double *scratch, taskout *o) {
+  hiertree *t = job->t;
+  unsigned k = job->k;
+  unsigned long i, j, c = t->children[r];
+  double ah = pow(job->a, t->depth[r]);
+  const double *cur = vec + (unsigned long)t->depth[r] * k;
+
+  if (c == 1) {
+    double *base = vec + (unsigned long)(t->depth[r] + 1) * k;
+    for (i = 0; i < t->size[r]; i++) {
+      unsigned long u = t->ids[t->first[r] + i];
+      uint64_t mk = tree_key(key, u);
+      for (j = 0; j < k; j++) {
+        base[j] = cur[j] + tree_uniform(mk, j) * ah;
+      }
+      emit(job, o, u, ah, base, scratch);
+    }
+    return r + 1;
+  }
+
+  unsigned long next = r + 1;
+  for (i = 0; i < c; i++) {
+    uint64_t ck = tree_key(key, i);
+    double *child = vec + (unsigned long)t->depth[next] * k;
+    for (j = 0; j < k; j++) {
+      child[j] = cur[j] + tree_uniform(ck, j) * ah;
+    }
+    next = walk(job, next, ck, vec, scratch, o);
+  }
+  return next;
+}
+
+static void run_task(treejob *job, unsigned long i, double *vec, double *scratch, taskout *o) {
+  hiertree *t = job->t;
+  unsigned k = job->k;
+  unsigned long j, s = job->start[i];
+  double *root = vec + (unsigned long)t->depth[0] * k;
+
+  memset(root, 0, k * sizeof(double));
+  if (job->child) {
+    double ah = pow(job->a, t->depth[0]);
+    double *v = vec + (unsigned long)t->depth[s] * k;
+    for (j = 0; j < k; j++) {
+      v[j] = root[j] + tree_uniform(job->key[i], j) * ah;
+    }
+  }
+  walk(job, s, job->key[i], vec, scratch, o);
+}
+
+static void *worker(void *arg) {
+  treejob *job = arg;
+  unsigned long i;
+  double *vec = malloc((unsigned long)(job->t->maxdepth + 2) * job->k * sizeof(double));
+  double *scratch = malloc((unsigned long)job->nout * job->k * sizeof(double));
+
+  for (;;) {
+    pthread_mutex_lock(&job->lock);
+    i = job->next_task++;
+    pthread_mutex_unlock(&job->lock);
+    if (i >= job->ntask) {
+      break;
+    }
+
+    run_task(job, i, vec, scratch, job->res + i);
+
+    pthread_mutex_lock(&job->lock);
+    job->done[i] = 1;
+    while (job->next_write < job->ntask && job->done[job->next_write]) {
+      taskout *o = job->res + job->next_write;
+      flush_task(job, o);
+      free(o->ids);
+      free(o->rows);
+      o->ids = NULL;
+      o->rows = NULL;
+      job->next_write++;
+    }
+    pthread_mutex_unlock(&job->lock);
+  }
+
+  free(vec);
+  free(scratch);
+  return NULL;
+}
+
+int hiertree_embed(hiertree *t, unsigned k, double a, uint64_t seed, unsigned threads,
+                   unsigned nout, leaf_fn fn, void *ctx, embwriter **out) {
+  treejob job;
+  unsigned long i, r;
+  unsigned w;
+
+  if (t->nrec == 0) {
+    return 1;
+  }
+  if (threads < 1) {
+    threads = 1;
+  }
+
+  job.t = t;
+  job.k = k;
+  job.a = a;
+  job.nout = nout;
+  job.fn = fn;
+  job.ctx = ctx;
+  job.out = out;
+  job.rootkey = tree_mix(seed);
+
+  /* One task per top-level subtree, or the whole tree when the root is a leaf. */
+  job.child = (t->children[0] != 1);
+  job.ntask = job.child ? t->children[0] : 1;
+  job.start = malloc(job.ntask * sizeof(unsigned long));
+  job.key = malloc(job.ntask * sizeof(uint64_t));
+  if (job.child) {
+    r = 1;
+    for (i = 0; i < job.ntask; i++) {
+      job.start[i] = r;
+      job.key[i] = tree_key(job.rootkey, i);
+      r = skip_subtree(t, r);
+    }
+  } else {
+    job.start[0] = 0;
+    job.key[0] = job.rootkey;
+  }
+
+  job.res = calloc(job.ntask, sizeof(taskout));
+  job.done = calloc(job.ntask, 1);
+  job.next_task = 0;
+  job.next_write = 0;
+  pthread_mutex_init(&job.lock, NULL);
+
+  if (threads == 1) {
+    /* Sequential: rows go straight to the writers, in the same order. */
+    for (i = 0; i < job.ntask; i++) {
+      job.res[i].direct = 1;
+    }
+    job.next_write = job.ntask;
+    worker(&job);
+  } else {
+    pthread_t *tid = malloc(threads * sizeof(pthread_t));
+    for (w = 0; w < threads; w++) {
+      pthread_create(tid + w, NULL, worker, &job);
+    }
+    for (w = 0; w < threads; w++) {
+      pthread_join(tid[w], NULL);
+    }
+    free(tid);
+  }
+
+  pthread_mutex_destroy(&job.lock);
+  free(job.start);
+  free(job.key);
+  free(job.res);
+  free(job.done);
+  return 1;
+}
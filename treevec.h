@@ -0,0 +1,55 @@
+#ifndef TREEVEC_H
+#define TREEVEC_H
+
+#include <stdint.h>
+
+#include "embio.h"
+
+/*
+  In-memory hierarchy and the shared hi2vec/hi2vec_attr walk.
+
+  Random offsets come from a counter-based generator: every tree node gets a
+  64-bit key derived from its parent's key and its child index (the root is
+  keyed by the seed), and a leaf member's key is derived from its leaf's key
+  and its node id. Coordinate j of an offset is tree_uniform(key, j), so the
+  vectors only depend on (seed, path, coordinate) and not on the order in
+  which subtrees are processed.
+*/
+
+typedef struct {
+  unsigned long nrec;
+  unsigned *depth;
+  unsigned long *children;
+  unsigned long long *first;
+  unsigned long *size;
+  unsigned long *ids;
+  unsigned maxdepth;
+} hiertree;
+
+/* Writes the nout output rows of leaf member u into rows (nout x k), given its
+   structural vector base at depth h (ah = a^h). */
+typedef void (*leaf_fn)(void *ctx, unsigned long u, double ah, const double *base, double *rows);
+
+static inline uint64_t tree_mix(uint64_t x) {
+  x += 0x9e3779b97f4a7c15ULL;
+  x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9ULL;
+  x = (x ^ (x >> 27)) * 0x94d049bb133111ebULL;
+  return x ^ (x >> 31);
+}
+
+static inline uint64_t tree_key(uint64_t parent, uint64_t child) {
+  return tree_mix(parent ^ tree_mix(child));
+}
+
+/* Uniform in (-1, 1], the range of the former rand1(). */
+static inline double tree_uniform(uint64_t key, unsigned long j) {
+  uint64_t r = tree_mix(key + (uint64_t)(j + 1) * 0xd1b54a32d192ed03ULL);
+  return 2 * (((r >> 11) + 1.0) / 9007199254740992.0) - 1;
+}
+
+hiertree *hiertree_load(const char *path);
+void hiertree_free(hiertree *t);
+int hiertree_embed(hiertree *t, unsigned k, double a, uint64_t seed, unsigned threads,
+                   unsigned nout, leaf_fn fn, void *ctx, embwriter **out);
+
+#endif